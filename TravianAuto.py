@@ -5,14 +5,25 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.proxy import Proxy, ProxyType
-from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException, TimeoutException, WebDriverException, StaleElementReferenceException
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.file_detector import UselessFileDetector
+from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException, SessionNotCreatedException, TimeoutException, WebDriverException, StaleElementReferenceException
+from selenium.webdriver.support.ui import WebDriverWait as SeleniumWebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from webdriver_manager.chrome import ChromeDriverManager
 
+from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, \
+    EVENT_JOB_MISSED, EVENT_JOB_MODIFIED, EVENT_JOB_REMOVED, EVENT_JOB_SUBMITTED
+from apscheduler.executors.base import BaseExecutor, run_job
+from apscheduler.executors.base_py3 import run_coroutine_job
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.util import iscoroutinefunction_partial
 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from collections import deque, namedtuple
 from contextlib import contextmanager
 
 from rich.console import Console
@@ -22,16 +33,38 @@ from rich.live import Live
 from rich import box
 
 from getpass import getpass
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from datetime import datetime, timedelta, timezone
 import ipywidgets as widgets
 from IPython.display import display
+import numpy as np
 import pandas as pd
+import asyncio
+import bisect
+import contextvars
+import csv
+import fcntl
+import functools
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import psutil
+import queue
 import re
 import random
 import requests
+import select
+import signal
+from requests.adapters import HTTPAdapter
 import subprocess
+import sys
+import threading
 import time
+from urllib.parse import parse_qs, quote, unquote, urljoin, urlparse
 
 console = Console()
 
@@ -46,7 +79,7 @@ TRAIN_TROOPS = 'train_troops'
 CHECK_FOR_INCOMING_ATTACKS = 'attack_check'
 SPEND_ALL_RESOURCES = 'spend_all'
 RAIDS = 'raids'
-logs = {}
+RECYCLE_DRIVER = 'recycle_driver'
 
 WOOD = 1
 CLAY = 2
@@ -62,11 +95,86 @@ def calc_new_interval_between(x, y):
     return random.uniform(x, y)
 
 
+# jobs and the navigation helpers are written once for both modes, as generators that yield every blocking step
+# instead of making it. thread mode makes each step in place on the job's thread, async mode awaits it on the bridge
+# pool and sleeps on the event loop between a wait's polls. a step's result (or exception) is sent back into the body
+Call = namedtuple('Call', ['func', 'args']) # one blocking call, usually a single WebDriver round trip
+Wait = namedtuple('Wait', ['driver', 'condition', 'replaces_sleep', 'timeout']) # no timeout means the adaptive one
+
+
+def call(func, *args):
+    return Call(func, args)
+
+
+def wait(driver, condition, replaces_sleep=0, timeout=None):
+    return Wait(driver, condition, replaces_sleep, timeout)
+
+
+def make_step(step):
+    if isinstance(step, Wait):
+        if step.timeout is None:
+            return wait_until(step.driver, step.condition, step.replaces_sleep)
+        return WebDriverWait(step.driver, step.timeout).until(step.condition)
+    return step.func(*step.args)
+
+
+async def make_step_async(step):
+    if isinstance(step, Wait):
+        return await AsyncDriver(step.driver).wait_until(step.condition, step.replaces_sleep, step.timeout)
+    return await bridge(step.func, *step.args)
+
+
+def run_steps(steps):
+    result = error = None
+    while True:
+        try:
+            step = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result = error = None
+        try:
+            result = make_step(step)
+        except Exception as e: # raised inside the body, where the job can catch it
+            error = e
+
+
+async def run_steps_async(steps):
+    result = error = None
+    while True:
+        try:
+            step = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result = error = None
+        try:
+            result = await make_step_async(step)
+        except Exception as e:
+            error = e
+
+
+def driver_steps(body):
+    # calling the decorated function runs the body in thread mode. .run_async is its coroutine for async mode and
+    # .steps the body itself, for other bodies to `yield from`
+    @functools.wraps(body)
+    def run(*args, **kwargs):
+        return run_steps(body(*args, **kwargs))
+
+    async def run_async(*args, **kwargs):
+        return await run_steps_async(body(*args, **kwargs))
+
+    run_async.__name__ = 'run_async'
+    run_async.__qualname__ = f'{body.__qualname__}.run_async' # so the scheduler can name it and look it up again
+    run.steps = body
+    run.run_async = run_async
+    return run
+
+
+@driver_steps
 def refresh_page(drivers_info, driver, scheduler=None):
-    driver.refresh()
+    yield call(driver.refresh)
 
     if scheduler:
-        scheduler.add_job(refresh_page, 'interval', seconds=calc_new_interval_between(698, 722),
+        scheduler.add_job(job_func_for(scheduler, REFRESH), 'interval', seconds=calc_new_interval_between(698, 722),
                           id=f"{drivers_info[driver]['Username']}_{REFRESH}",
                           args=[drivers_info, driver, scheduler], replace_existing=True)
 
@@ -80,46 +188,156 @@ def run_command_in_background(command):
 def run_command_in_background_and_wait_for_output(command, expected_output, timeout=30):
     process = run_command_in_background(command)
 
+    output = ''
     end_time = time.time() + timeout
     while time.time() < end_time:
-        output = process.stdout.read(1024).decode('utf-8')
+        # block until the process writes something instead of polling on a fixed sleep
+        ready, _, _ = select.select([process.stdout], [], [], max(end_time - time.time(), 0))
+        if not ready:
+            break
+
+        chunk = process.stdout.read(1024)
+        if not chunk: # process exited
+            break
+        output += chunk.decode('utf-8', errors='replace')
 
         if expected_output in output:
             print("Expected output received.")
             return True
 
-        time.sleep(1)
-
     print("Timeout or process ended without producing expected output.")
     return False
 
 
-def init_webdriver(proxy_port=None):
+CHROMEDRIVER_PATH_CACHE = os.path.expanduser('~/.travianauto/chromedriver_path')
+PROXY_MANAGER_URL = 'http://127.0.0.1:22999'
+
+chromedriver_path_lock = threading.Lock()
+resolved_chromedriver_path = None
+proxy_manager_lock = threading.Lock()
+proxy_manager_ready = None
+
+
+def chromedriver_path(refresh=False):
+    # ChromeDriverManager checks for new releases over the network on every install(), only do that once per
+    # process and remember the result on disk for the next run
+    global resolved_chromedriver_path
+
+    with chromedriver_path_lock:
+        if resolved_chromedriver_path and not refresh:
+            return resolved_chromedriver_path
+
+        cached_path = None
+        if not refresh:
+            try:
+                with open(CHROMEDRIVER_PATH_CACHE) as f:
+                    cached_path = f.read().strip()
+            except OSError:
+                pass
+
+        if cached_path and os.path.exists(cached_path):
+            resolved_chromedriver_path = cached_path
+        else:
+            resolved_chromedriver_path = ChromeDriverManager().install()
+            os.makedirs(os.path.dirname(CHROMEDRIVER_PATH_CACHE), exist_ok=True)
+            with open(CHROMEDRIVER_PATH_CACHE, 'w') as f:
+                f.write(resolved_chromedriver_path)
+
+        return resolved_chromedriver_path
+
+
+def proxy_manager_running():
+    try:
+        requests.get(f'{PROXY_MANAGER_URL}/api/version', timeout=2)
+        return True
+    except requests.RequestException:
+        return False
+
+
+def ensure_proxy_manager():
+    # one shared health check for every driver instead of a probe page load per driver
+    global proxy_manager_ready
+
+    with proxy_manager_lock:
+        if not proxy_manager_ready:
+            proxy_manager_ready = proxy_manager_running() or \
+                run_command_in_background_and_wait_for_output('proxy-manager', 'Proxy Manager is running')
+
+        return proxy_manager_ready
+
+
+driver_proxy_ports = {}
+driver_started_at = {} # driver -> when its browser was launched, old browsers get recycled
+
+# lean profile: headless, small fixed window, no images/fonts/animations, capped renderer processes
+LEAN_PROFILE = False
+LEAN_WINDOW_SIZE = '1280,900'
+LEAN_RENDERER_PROCESS_LIMIT = 2
+LEAN_BLOCKED_URLS = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg']
+
+JS_DISABLE_ANIMATIONS = """
+document.addEventListener('DOMContentLoaded', () => {
+    const style = document.createElement('style');
+    style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';
+    document.head.appendChild(style);
+});
+"""
+
+
+def add_lean_profile_options(options):
+    options.add_argument('--headless=new')
+    options.add_argument(f'--window-size={LEAN_WINDOW_SIZE}')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-remote-fonts')
+    options.add_argument('--force-prefers-reduced-motion')
+    options.add_argument(f'--renderer-process-limit={LEAN_RENDERER_PROCESS_LIMIT}')
+
+    # headless tabs count as backgrounded, don't let chrome throttle their timers and rendering
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-backgrounding-occluded-windows')
+    options.add_argument('--disable-renderer-backgrounding')
+
+    # Disable image loading
+    prefs = {"profile.managed_default_content_settings.images": 2}
+    options.add_experimental_option("prefs", prefs)
+
+
+def apply_lean_profile(driver):
+    # block whatever the flags above can't (css background images, web fonts) and freeze css animations
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': JS_DISABLE_ANIMATIONS})
+
+
+def init_webdriver(proxy_port=None, lean=LEAN_PROFILE):
     options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
     options.add_argument("--ignore-certificate-errors")
 
-    # Disable image loading
-    #prefs = {"profile.managed_default_content_settings.images": 2}
-    #options.add_experimental_option("prefs", prefs)
+    if lean:
+        add_lean_profile_options(options)
+    else:
+        options.add_argument("--start-maximized")
 
     if proxy_port:
         proxy_address = f'localhost:{proxy_port}'
         options.add_argument(f'--proxy-server=http://{proxy_address};https://{proxy_address}')
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    if proxy_port and not ensure_proxy_manager():
+        return None
 
     try:
-        driver.get('https://httpbin.org/ip')
-        return driver
-    except WebDriverException:
-        run_command_in_background_and_wait_for_output('proxy-manager', 'Proxy Manager is running')
-        
-        try:
-            driver.refresh()         
-            return driver
-        except WebDriverException:
-            return None
+        driver = webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    except SessionNotCreatedException: # cached driver no longer matches the installed chrome, resolve it again
+        driver = webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+    driver_proxy_ports[driver] = proxy_port # http sessions for this driver must go out through the same proxy
+    driver_started_at[driver] = time.time()
+
+    if lean:
+        apply_lean_profile(driver)
+
+    instrument_commands(driver)
+    return driver
         
 # Context manager for Selenium Web Driver
 @contextmanager
@@ -131,6 +349,69 @@ def managed_webdriver(proxy_port=None):
         print("Shutting down web driver...")
         driver.quit()
 
+# %%
+''' browser resource usage '''
+
+def driver_processes(driver):
+    # chromedriver service process plus every chrome process it spawned
+    try:
+        service_process = psutil.Process(driver.service.process.pid)
+        return [service_process] + service_process.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return []
+
+
+def driver_resource_usage(driver, sample_seconds=0.5):
+    processes = driver_processes(driver)
+    for process in processes:
+        try:
+            process.cpu_percent(None) # first call only primes the counter
+        except psutil.Error:
+            pass
+
+    time.sleep(sample_seconds) # cpu usage is measured over this window
+
+    rss = cpu = 0
+    alive = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+            cpu += process.cpu_percent(None)
+            alive += 1
+        except psutil.Error: # renderer processes come and go
+            continue
+
+    return {'processes': alive, 'rss_mb': rss / 2**20, 'cpu_percent': cpu}
+
+
+def print_resource_usage_report(drivers_info, sample_seconds=0.5):
+    table = Table(title="Browser Resource Usage", box=box.DOUBLE, safe_box=False)
+    table.add_column("Account", style="cyan", no_wrap=True)
+    table.add_column("Processes", style="magenta")
+    table.add_column("RSS (MB)", style="green")
+    table.add_column("CPU %", style="blue")
+
+    usages = []
+    for driver in drivers_info.keys():
+        usage = driver_resource_usage(driver, sample_seconds)
+        usages.append(usage)
+        table.add_row(str(drivers_info[driver]['Username']), str(usage['processes']),
+                      f"{usage['rss_mb']:.0f}", f"{usage['cpu_percent']:.1f}")
+
+    if usages:
+        total_rss = sum(usage['rss_mb'] for usage in usages)
+        total_cpu = sum(usage['cpu_percent'] for usage in usages)
+        table.add_row("Total", str(sum(usage['processes'] for usage in usages)), f"{total_rss:.0f}", f"{total_cpu:.1f}")
+
+        # size how many more accounts this box can take from the average footprint of the current ones
+        available_mb = psutil.virtual_memory().available / 2**20
+        average_rss = total_rss / len(usages)
+        if average_rss:
+            console.print(f"~{int(available_mb // average_rss)} more accounts fit in {available_mb:.0f} MB of free memory.")
+
+    console.print(table)
+    return usages
+
 # %%
 ''' scheduler init. '''
 
@@ -141,39 +422,535 @@ def cleanup_scheduler(scheduler):
     else:
         print("Scheduler already stopped.")
 
+# lower values run first when several jobs for the same driver are waiting on its queue
+JOB_PRIORITIES = {
+    RECYCLE_DRIVER: -1, # nothing else can run on a dead browser anyway
+    SPEND_ALL_RESOURCES: 0,
+    CHECK_FOR_INCOMING_ATTACKS: 1,
+    REFRESH: 2,
+    RAIDS: 3,
+    TRAIN_TROOPS: 4,
+    RESOURCE_FIELDS: 5,
+    ADVENTURES: 6,
+    HERO_UPGRADE: 7,
+    GOLD_CLUB_CHECK: 8,
+    COLLECT_MISSION_RESOURCES: 9,
+    COLLECT_DAILY_QUEST_REWARDS: 10,
+}
+DEFAULT_JOB_PRIORITY = 99
+
+# page each job works on. due jobs of one driver that share a page are run back to back as a single visit so the
+# page is only loaded once, jobs that read everything over http or only use the top bar don't need a particular page
+JOB_PAGES = {
+    RESOURCE_FIELDS: 'dorf1.php',
+    CHECK_FOR_INCOMING_ATTACKS: 'dorf1.php',
+    RAIDS: 'Rally Point',
+    GOLD_CLUB_CHECK: 'Rally Point',
+    HERO_UPGRADE: 'hero/inventory',
+}
+# a queued job at least this urgent ends a visit early when it needs a different page
+VISIT_PREEMPT_PRIORITY = JOB_PRIORITIES[CHECK_FOR_INCOMING_ATTACKS]
+VISIT_HISTORY = 500
+
+
+def job_type_of(job_id):
+    # job ids are built as f'{username}_{job_type}' and usernames may contain underscores themselves
+    for job_type in JOB_PRIORITIES:
+        if job_id.endswith(f'_{job_type}'):
+            return job_type
+    return None
+
+
+def job_priority_of(job_id):
+    return JOB_PRIORITIES.get(job_type_of(job_id), DEFAULT_JOB_PRIORITY)
+
+
+def driver_of(job):
+    # every per-account job is registered with args=[drivers_info, driver, ...]
+    if len(job.args) > 1 and isinstance(job.args[0], dict):
+        return job.args[1]
+    return None
+
+
+def job_page_of(job):
+    job_type = job_type_of(job.id)
+    if job_type == TRAIN_TROOPS: # args=[drivers_info, driver, building, troop_name, ...]
+        return job.args[2]
+    if job_type == SPEND_ALL_RESOURCES:
+        return job.args[0][job.args[1]].get('Troop Building')
+    return JOB_PAGES.get(job_type)
+
+
+# id of the job running on the current thread, lets helpers attribute their measurements to a job
+current_job = threading.local()
+# navigation counts of the page visit running on the current thread
+current_visit = threading.local()
+# the same for coroutine jobs, which all share the event loop's thread
+async_visit_counts = contextvars.ContextVar('async_visit_counts', default=None)
+
+Visit = namedtuple('Visit', ['finished_at', 'page', 'jobs', 'navigated', 'skipped'])
+visits = deque(maxlen=VISIT_HISTORY)
+visits_lock = threading.Lock()
+
+# driver -> (job id, time it has to start by) for deadline jobs like spending resources before an attack lands. while
+# a reservation is pending the driver's queue won't start another job that's expected to still be running by then
+driver_reservations = {}
+driver_reservations_lock = threading.Lock()
+DEFAULT_EXPECTED_JOB_SECONDS = 30
+
+# running driver queue executors, so a recycled browser's queue can be handed over to its replacement
+driver_queue_executors = []
+
+
+def reserve_driver(driver, job_id, run_at):
+    with driver_reservations_lock:
+        driver_reservations[driver] = (job_id, run_at)
+
+
+def release_driver(driver, job_id=None):
+    with driver_reservations_lock:
+        if job_id is None or driver_reservations.get(driver, (None,))[0] == job_id:
+            driver_reservations.pop(driver, None)
+
+
+def expected_job_seconds(job_id):
+    stats = job_timing_stats(job_id)
+    return stats['p95'] if stats else DEFAULT_EXPECTED_JOB_SECONDS
+
+
+class DriverQueueExecutor(BaseExecutor):
+    '''
+    Runs at most one job at a time per driver so jobs never fight over the same tab. Each driver has its own
+    priority queue, different drivers still run in parallel across a shared thread pool. A driver with a pending
+    reservation holds back jobs that wouldn't finish before the reserved job is due.
+    '''
+    thread_name_prefix = 'driver_queue'
+
+    def __init__(self, max_workers=10):
+        super().__init__()
+        self._max_workers = int(max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=self.thread_name_prefix)
+        self._outgrown_pools = [] # pools replaced by a bigger one, finishing off what was already handed to them
+        self._pool_lock = threading.Lock()
+        self._queues = {} # driver -> heap of (priority, sequence, job, run_times)
+        self._parked = set() # drivers whose queue is waiting on a reservation instead of draining
+        self._replaced = {} # recycled driver -> the driver that took over its queue
+        self._queue_lock = threading.Lock()
+        self._sequence = itertools.count() # keeps jobs of equal priority in submission order
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        driver_queue_executors.append(self)
+
+    def ensure_workers(self, workers):
+        # the pool is sized to the accounts at startup, accounts added while running swap in a bigger one so they get
+        # workers of their own instead of competing with the others for the startup size. the old pool still runs
+        # what it was given, the drains it's running go on to the new one when they go to the back of the pool
+        with self._pool_lock:
+            if workers <= self._max_workers:
+                return
+            self._max_workers = workers
+            self._outgrown_pools.append(self._pool)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.thread_name_prefix)
+            self._outgrown_pools[-1].shutdown(wait=False)
+
+    def _submit(self, func, *args):
+        # under the pool lock, so nothing is handed to a pool ensure_workers has just shut down
+        with self._pool_lock:
+            return self._pool.submit(func, *args)
+
+    def _current(self, driver):
+        # call with the queue lock held
+        while driver in self._replaced:
+            driver = self._replaced[driver]
+        return driver
+
+    def replace_driver(self, old_driver, new_driver):
+        # the old driver's queue, and the drain running it, carry on under the new driver. jobs still submitted with
+        # the old driver in their args line up behind them instead of starting a second queue on the new browser
+        with self._queue_lock:
+            self._replaced[old_driver] = new_driver
+            if old_driver in self._queues: # nothing can be queued on the new driver yet, no job points at it
+                self._queues[new_driver] = self._queues.pop(old_driver)
+            if old_driver in self._parked:
+                self._parked.discard(old_driver)
+                self._parked.add(new_driver)
+
+    def drop_driver(self, driver):
+        # the account was removed, its queued jobs are dropped. a parked queue has no drain running, otherwise
+        # the running drain finds the queue empty once its job is done and stops
+        with self._queue_lock:
+            driver = self._current(driver)
+            if driver in self._parked:
+                self._parked.discard(driver)
+                self._queues.pop(driver, None)
+            elif driver in self._queues:
+                self._queues[driver].clear()
+
+    def _do_submit_job(self, job, run_times):
+        driver = driver_of(job)
+        if driver is None: # job isn't tied to a browser tab, nothing to serialize against
+            self._submit(self._run, job, run_times)
+            return
+
+        with self._queue_lock:
+            driver = self._current(driver)
+            start_draining = driver not in self._queues or driver in self._parked
+            self._parked.discard(driver)
+            heapq.heappush(self._queues.setdefault(driver, []),
+                           (job_priority_of(job.id), next(self._sequence), job, run_times))
+
+        if start_draining:
+            self._submit(self._drain, driver)
+
+    def _hold_seconds(self, driver, job):
+        # how long the job at the head of the queue has to wait so it doesn't overlap the driver's reserved job
+        with driver_reservations_lock:
+            reservation = driver_reservations.get(driver)
+        if reservation is None or reservation[0] == job.id:
+            return 0
+
+        seconds_left = (reservation[1] - datetime.now(timezone.utc)).total_seconds()
+        if seconds_left <= 0 or seconds_left > expected_job_seconds(job.id):
+            return 0
+        return seconds_left
+
+    def _wake(self, driver):
+        with self._queue_lock:
+            driver = self._current(driver)
+            if driver not in self._parked:
+                return # something was submitted in the meantime and restarted the queue
+            self._parked.discard(driver)
+        self._submit(self._drain, driver)
+
+    def _drain(self, driver):
+        with self._queue_lock:
+            driver = self._current(driver)
+            if not self._queues.get(driver): # dropped before this drain got a worker
+                self._queues.pop(driver, None)
+                return
+            job = self._queues[driver][0][2]
+            hold = self._hold_seconds(driver, job)
+            if hold:
+                self._parked.add(driver)
+            else:
+                _, _, job, run_times = heapq.heappop(self._queues[driver])
+
+        if hold: # the reserved job will restart the queue when it's submitted, the timer is a fallback
+            timer = threading.Timer(hold + 1, self._wake, [driver])
+            timer.daemon = True
+            timer.start()
+            return
+
+        # run every other due job that needs the same page while we're on it
+        page = job_page_of(job)
+        current_visit.counts = {'navigated': 0, 'skipped': 0}
+        jobs_run = 0
+        while job is not None:
+            release_driver(driver, job.id)
+            self._run(job, run_times)
+            jobs_run += 1
+            job, run_times = self._next_on_page(driver, page) if page else (None, None)
+        record_visit(page, jobs_run, current_visit.counts)
+        current_visit.counts = None
+
+        with self._queue_lock:
+            driver = self._current(driver) # a recycle job may have just handed this queue to a new browser
+            if not self._queues[driver]:
+                del self._queues[driver]
+                return
+
+        try: # go to the back of the pool so one busy account can't hog a worker from the others
+            self._submit(self._drain, driver)
+        except RuntimeError: # pool already shut down, drop whatever is left
+            with self._queue_lock:
+                self._queues.pop(self._current(driver), None)
+
+    def _next_on_page(self, driver, page):
+        with self._queue_lock:
+            driver = self._current(driver)
+            queue = self._queues[driver]
+            if queue and queue[0][0] <= VISIT_PREEMPT_PRIORITY and job_page_of(queue[0][2]) != page:
+                return None, None # something urgent is waiting elsewhere
+
+            same_page = [entry for entry in queue
+                         if job_page_of(entry[2]) == page and not self._hold_seconds(driver, entry[2])]
+            if not same_page:
+                return None, None
+
+            entry = min(same_page)
+            queue.remove(entry)
+            heapq.heapify(queue)
+            return entry[2], entry[3]
+
+    def _run(self, job, run_times):
+        current_job.id = job.id
+        current_job.round_trips = 0
+        current_job.wait_seconds = 0.0
+        lateness = (datetime.now(timezone.utc) - run_times[-1]).total_seconds() # how far behind schedule it started
+        start = time.perf_counter()
+        events = []
+        exc = tb = None
+        try:
+            events = run_job(job, job._jobstore_alias, run_times, self._logger.name)
+        except BaseException:
+            exc, tb = sys.exc_info()[1:]
+
+        # record the timing before the outcome events go out so listeners can read this run's duration
+        error = type(exc).__name__ if exc is not None else \
+            next((type(event.exception).__name__ for event in events if event.code == EVENT_JOB_ERROR), None)
+        record_job_timing(job.id, time.perf_counter() - start, current_job.wait_seconds, current_job.round_trips,
+                          error, lateness)
+        current_job.id = None
+        current_job.round_trips = None
+        current_job.wait_seconds = None
+
+        if exc is not None:
+            self._run_job_error(job.id, exc, tb)
+        else:
+            self._run_job_success(job.id, events)
+
+    def queued_job_ids(self, driver):
+        with self._queue_lock:
+            return [entry[2].id for entry in sorted(self._queues.get(self._current(driver), []))]
+
+    def shutdown(self, wait=True):
+        if self in driver_queue_executors:
+            driver_queue_executors.remove(self)
+        with self._pool_lock:
+            pools = self._outgrown_pools + [self._pool]
+        for pool in pools:
+            pool.shutdown(wait)
+
+
+def record_visit(page, jobs, counts):
+    with visits_lock:
+        visits.append(Visit(time.time(), page, jobs, counts['navigated'], counts['skipped']))
+
+
+def print_visit_report():
+    # navigations saved are page loads skipped because an earlier job in the same visit already had the page open
+    per_page = {}
+    with visits_lock:
+        for visit in visits:
+            totals = per_page.setdefault(visit.page or '(any)', [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += visit.jobs
+            totals[2] += visit.navigated
+            totals[3] += visit.skipped
+
+    table = Table(title="Page Visits", box=box.DOUBLE, safe_box=False)
+    table.add_column("Page", style="cyan", no_wrap=True)
+    table.add_column("Visits", style="magenta")
+    table.add_column("Jobs / Visit", style="green")
+    table.add_column("Navigations", style="blue")
+    table.add_column("Saved", style="yellow")
+    table.add_column("Saved / Visit", style="yellow")
+    for page, (visit_count, jobs, navigated, skipped) in sorted(per_page.items()):
+        table.add_row(page, str(visit_count), f"{jobs / visit_count:.2f}", str(navigated), str(skipped),
+                      f"{skipped / visit_count:.2f}")
+    console.print(table)
+
+    return per_page
+
+
 # Context manager for BackgroundScheduler
 @contextmanager
 def managed_scheduler(*args, **kwargs):
+    kwargs.setdefault('executors', {'default': DriverQueueExecutor()})
+    # jobs can sit in a driver's queue behind others, don't let that count as a missed run
+    kwargs.setdefault('job_defaults', {'coalesce': True, 'misfire_grace_time': None})
+
     scheduler = BackgroundScheduler(*args, **kwargs)
+    job_states.attach(scheduler)
     scheduler.start()
     try:
         yield scheduler
     finally:
         cleanup_scheduler(scheduler)
 
+# %%
+''' locator registry '''
+
+# every selector the jobs use, in one place. CSS is preferred since chrome resolves id/class selectors much faster
+# than deep positional XPath, XPath is kept only where CSS can't express the lookup (text matching, parents).
+# selectors hang off the game's own ids and classes, positional chains break as soon as a wrapper div moves.
+# bump a locator's version whenever its value changes so benchmark results and logs can be told apart
+Locator = namedtuple('Locator', ['by', 'value', 'version', 'example'], defaults=[None])
+
+LOCATORS = {
+    # navigation
+    'hero_inventory_button': Locator(By.CSS_SELECTOR, '#heroImageButton', 1),
+    'resource_fields_button': Locator(By.CSS_SELECTOR, '.village.resourceView', 1),
+    'buildings_button': Locator(By.CSS_SELECTOR, '.village.buildingView', 1),
+    'building': Locator(By.CSS_SELECTOR, '[data-name="{building}"]', 1, {'building': 'Rally Point'}),
+    'options_link': Locator(By.CSS_SELECTOR, 'a[href*="/options"]', 2),
+    'reports_button': Locator(By.CSS_SELECTOR, '#navigation a.reports', 3),
+    'daily_quests_button': Locator(By.CSS_SELECTOR, '#navigation a.dailyQuests', 3),
+
+    # popups and dialogs
+    'hide_contextual_help_checkbox': Locator(By.CSS_SELECTOR, '#hideContextualHelp', 2),
+    'contextual_help_next_button': Locator(By.CSS_SELECTOR, '#contextualHelp nav button', 3),
+    'one_time_offer': Locator(By.CSS_SELECTOR, '[id^="oneTimeOfferAnnouncement"]', 2),
+    'green_button': Locator(By.CSS_SELECTOR, '.textButtonV1.green', 1),
+
+    # login
+    'login_username_input': Locator(By.CSS_SELECTOR, '#loginForm input[name="name"]', 3),
+    'login_password_input': Locator(By.CSS_SELECTOR, '#loginForm input[name="password"]', 3),
+    'login_button': Locator(By.CSS_SELECTOR, 'button[type="submit"][value="Login"].textButtonV1.green', 1),
+
+    # buildings and fields
+    'building_header': Locator(By.XPATH, "//h2[text()='{building}']", 1, {'building': 'Cranny'}),
+    'parent': Locator(By.XPATH, '..', 1),
+    'new_building_button': Locator(By.CSS_SELECTOR, '.textButtonV1.green.new', 1),
+    'upgrade_button': Locator(By.CSS_SELECTOR, '.textButtonV1.green.build', 1),
+    'building_slot': Locator(By.CSS_SELECTOR, 'a[href*="/build.php?id={slot}"]', 2, {'slot': 5}),
+    'building_category_tab': Locator(By.CSS_SELECTOR, 'a[href*="/build.php?id={slot}&category={category}"]', 2,
+                                     {'slot': 30, 'category': 1}),
+    'wall_slot': Locator(By.CSS_SELECTOR, '#villageContent .buildingSlot.a40', 3), # slot 40 only ever holds the wall
+    'resource_field': Locator(By.CSS_SELECTOR, '#resourceFieldContainer a.buildingSlot{slot}', 3, {'slot': 1}),
+    'building_queue_items': Locator(By.CSS_SELECTOR, '.buildingList li', 2),
+
+    # hero
+    'hero_status_icon': Locator(By.CSS_SELECTOR, '#topBarHero .heroStatus i', 3),
+    'adventures_button': Locator(By.CSS_SELECTOR, 'a[href="/hero/adventures"]', 2),
+    'first_adventure_button': Locator(By.CSS_SELECTOR, '#heroAdventure tbody tr:first-child button', 3),
+    'adventure_continue_button': Locator(By.CSS_SELECTOR, '#heroAdventure > div > button', 2),
+    'hero_attributes_tab': Locator(By.CSS_SELECTOR, '#heroV2 .tabBar a[href*="/hero/attributes"]', 3),
+    'hero_attribute_input': Locator(By.NAME, '{attribute}', 1, {'attribute': 'resourceProduction'}),
+    'save_points_button': Locator(By.ID, 'savePoints', 1),
+    'hero_item': Locator(By.CSS_SELECTOR, '.heroItems.filter_all > div:nth-child({n})', 1, {'n': 1}),
+    'hero_item_icon': Locator(By.CSS_SELECTOR, ':scope > div:nth-of-type(1)', 2),
+    'hero_item_amount_input': Locator(By.CSS_SELECTOR, '#consumableHeroItem > label > input', 2),
+    'hero_transfer_button': Locator(By.CSS_SELECTOR, '.textButtonV2.buttonFramed.rectangle.withText.green', 1),
+
+    # troops
+    'troop_name_link': Locator(By.XPATH, "//a[contains(text(), '{troop_name}')]", 1, {'troop_name': 'Clubswinger'}),
+    'troop_container': Locator(By.XPATH, '../../..', 1),
+    'troop_amount_input': Locator(By.CSS_SELECTOR, ':scope .cta input', 3),
+    'troop_max_trainable_link': Locator(By.CSS_SELECTOR, ':scope .cta a', 3),
+    'exchange_resources_button': Locator(By.XPATH, '//button[contains(text(), "Exchange resources")]', 1),
+    'distribute_resources_button': Locator(By.XPATH, '//button[contains(text(), "Distribute remaining resources")]', 1),
+    'redeem_button': Locator(By.XPATH, '//button[contains(text(), "Redeem")]', 1),
+    'start_training_button': Locator(By.ID, 's1', 1),
+
+    # farm lists
+    'farm_list_link': Locator(By.CSS_SELECTOR, 'a[href*="/build.php?id=39&gid=16&tt=99"]', 2),
+    'farm_lists_wrapper': Locator(By.CSS_SELECTOR, '.villageWrapper', 1),
+    'farm_list_containers': Locator(By.CSS_SELECTOR, '.dropContainer', 1),
+    'farm_list': Locator(By.CSS_SELECTOR, '#rallyPointFarmList .villageWrapper > .dropContainer:nth-child({n})', 3,
+                         {'n': 1}),
+    'farm_list_name': Locator(By.CSS_SELECTOR, ':scope .farmListName .name', 3),
+    'farm_list_start_button': Locator(By.CSS_SELECTOR, ':scope .farmListHeader .startButton', 3),
+
+    # missions and daily quests
+    'quest_master_button': Locator(By.ID, 'questmasterButton', 1),
+    'task_overview': Locator(By.CSS_SELECTOR, '.taskOverview', 1),
+    'tasks': Locator(By.CSS_SELECTOR, ':scope > div', 2),
+    'button': Locator(By.TAG_NAME, 'button', 1),
+    'indicator': Locator(By.CSS_SELECTOR, ':scope > div', 2),
+    'achievement_reward_list': Locator(By.ID, 'achievementRewardList', 1),
+    'achievements': Locator(By.CSS_SELECTOR, '.achievement', 1),
+    'reward_ready_icon': Locator(By.CSS_SELECTOR, '.bigSpeechBubble.rewardReady', 1),
+    'gain_reward_button': Locator(By.CSS_SELECTOR, '.textButtonV1.green.questButtonGainReward', 1),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_locator(name, params):
+    entry = LOCATORS[name]
+    return entry.by, entry.value.format(**dict(params)) if params else entry.value
+
+
+def locator(name, **params):
+    # (by, value) tuple ready for find_element(*...) or expected conditions, built once per name and params
+    return _compiled_locator(name, tuple(sorted(params.items())))
+
+
+def is_relative_locator(name):
+    value = LOCATORS[name].value
+    return value.startswith(':scope') or (LOCATORS[name].by == By.XPATH and value.startswith('.'))
+
+
+# times each lookup inside the page itself, separating selector engine cost from the WebDriver round-trip
+JS_TIME_LOCATOR = """
+const [by, value, repeat] = arguments;
+const query = {
+    'css selector': () => document.querySelectorAll(value).length,
+    'xpath': () => document.evaluate(value, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength,
+    'id': () => document.querySelectorAll(`[id="${value}"]`).length,
+    'name': () => document.querySelectorAll(`[name="${value}"]`).length,
+    'tag name': () => document.getElementsByTagName(value).length,
+}[by];
+let matches = 0;
+const start = performance.now();
+for (let i = 0; i < repeat; i++) matches = query();
+return [(performance.now() - start) / repeat, matches];
+"""
+
+
+def benchmark_locators(driver, pages, repeat=20):
+    # pages is {path: html}, e.g. load_captured_pages('tests/pages'), served locally and loaded into the driver one by
+    # one. required rather than defaulted so the benchmark doesn't depend on which directory it's started from
+    server, base_url = serve_stub_pages(pages)
+    results = []
+    try:
+        for path in pages:
+            driver.get(urljoin(base_url, path))
+
+            for name, entry in LOCATORS.items():
+                if is_relative_locator(name): # needs a parent element, nothing to time at page level
+                    continue
+
+                by, value = locator(name, **(entry.example or {}))
+                in_page_ms, matches = driver.execute_script(JS_TIME_LOCATOR, by, value, repeat * 10)
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    driver.find_elements(by, value)
+                round_trip_ms = (time.perf_counter() - start) / repeat * 1000
+
+                results.append({'page': path, 'locator': name, 'version': entry.version, 'matches': matches,
+                                'in_page_ms': in_page_ms, 'round_trip_ms': round_trip_ms})
+    finally:
+        server.shutdown()
+
+    table = Table(title="Locator Benchmark", box=box.DOUBLE, safe_box=False)
+    table.add_column("Page", style="cyan", no_wrap=True)
+    table.add_column("Locator", style="cyan", no_wrap=True)
+    table.add_column("Matches", style="magenta")
+    table.add_column("In Page (ms)", style="green")
+    table.add_column("Round Trip (ms)", style="blue")
+    for result in sorted(results, key=lambda result: result['in_page_ms'], reverse=True):
+        table.add_row(result['page'], f"{result['locator']} v{result['version']}", str(result['matches']),
+                      f"{result['in_page_ms']:.4f}", f"{result['round_trip_ms']:.2f}")
+    console.print(table)
+
+    return results
+
 # %%
 ''' contextual help (dialog) helpers'''
 
 def disable_contextual_help(driver):
-    button_options = driver.find_element(By.XPATH, '//a[contains(@href, "/options")]')
+    button_options = driver.find_element(*locator('options_link'))
     driver.execute_script(JS_CLICK, button_options) # use js to get around helper popup
 
-    checkbox_contextual_help = driver.find_element(By.XPATH, '//*[@id="hideContextualHelp"]')
+    checkbox_contextual_help = driver.find_element(*locator('hide_contextual_help_checkbox'))
     checkbox_contextual_help.click()
     
-    save_button = driver.find_element(By.CSS_SELECTOR, '.textButtonV1.green')
+    save_button = driver.find_element(*locator('green_button'))
     driver.execute_script(JS_SCROLL_INTO_VIEW, save_button)
     save_button.click()
 
 
 def dismiss_report_helper_popup(driver):
-    button_reports = driver.find_element(By.XPATH, '//*[@id="navigation"]/a[5]')
+    button_reports = driver.find_element(*locator('reports_button'))
     driver.execute_script(JS_CLICK, button_reports) # use js to get around helper popup
 
 
 def dismiss_ok_popup(driver):
     try:
-        button_ok = driver.find_element(By.XPATH, '//*[@id="contextualHelp"]/div/div[2]/nav/button')
+        button_ok = driver.find_element(*locator('contextual_help_next_button'))
         driver.execute_script(JS_CLICK, button_ok) # use js to get around helper popup
     except NoSuchElementException:
         pass
@@ -182,11 +959,112 @@ def dismiss_ok_popup(driver):
 def dismiss_deal(driver):
     try:
         #TODO: FINISH TESTING THIS
-        button_dismiss = driver.find_element(By.XPATH, '//*[starts-with(@id, "oneTimeOfferAnnouncement")]')
+        button_dismiss = driver.find_element(*locator('one_time_offer'))
         button_dismiss.click()
     except NoSuchElementException:
         pass
 
+# %%
+''' account records '''
+
+# accounts come from a csv, json or xlsx file, one row per account. each row becomes an AccountRecord, which keeps
+# the sheet's column names for lookups (account['Username']) so the jobs read it the same way they read a sheet row
+ACCOUNTS_PATH = os.path.expanduser('~/Dropbox/TravianAccounts.xlsx')
+
+ACCOUNT_COLUMNS = { # sheet column -> AccountRecord attribute
+    'Username': 'username',
+    'Password': 'password',
+    'Type': 'type',
+    'Port': 'port',
+    'Gold Club': 'gold_club',
+    'Upgrade Fields': 'upgrade_fields',
+    'Train Troops': 'train_troops',
+    'Raid': 'raid',
+    'Troop Building': 'troop_building',
+    'Troop Name': 'troop_name',
+    'Upgrade Policy': 'upgrade_policy',
+}
+FLAG_COLUMNS = {'Gold Club', 'Upgrade Fields', 'Train Troops', 'Raid'}
+RUNTIME_COLUMNS = {'Gold Club'} # found out from the game once running, a change in the file doesn't restart the account
+FLAG_TRUE_VALUES = {'true', 'yes', 'y', '1', 'x'}
+
+
+class AccountRecord:
+    __slots__ = tuple(ACCOUNT_COLUMNS.values())
+
+    def __init__(self, **values):
+        for attribute in ACCOUNT_COLUMNS.values():
+            setattr(self, attribute, values.get(attribute))
+
+    @classmethod
+    def from_row(cls, row):
+        # raw row from any of the file formats, blank cells come through as None, '' or NaN depending on the reader
+        values = {}
+        for column, attribute in ACCOUNT_COLUMNS.items():
+            value = row.get(column)
+            if isinstance(value, float) and value != value: # NaN
+                value = None
+            if isinstance(value, str):
+                value = value.strip() or None
+
+            if column in FLAG_COLUMNS:
+                value = value.lower() in FLAG_TRUE_VALUES if isinstance(value, str) else bool(value)
+            elif column == 'Port':
+                value = int(float(value)) if value is not None else None
+            elif value is not None:
+                value = str(value)
+            values[attribute] = value
+        return cls(**values)
+
+    def __getitem__(self, column):
+        try:
+            return getattr(self, ACCOUNT_COLUMNS[column])
+        except KeyError:
+            raise KeyError(column) from None
+
+    def __setitem__(self, column, value):
+        try:
+            setattr(self, ACCOUNT_COLUMNS[column], value)
+        except KeyError:
+            raise KeyError(column) from None
+
+    def get(self, column, default=None):
+        return getattr(self, ACCOUNT_COLUMNS[column]) if column in ACCOUNT_COLUMNS else default
+
+    def settings(self):
+        # everything the file decides, two records with the same settings run the account the same way
+        return tuple(getattr(self, attribute) for column, attribute in ACCOUNT_COLUMNS.items()
+                     if column not in RUNTIME_COLUMNS)
+
+    def __repr__(self):
+        return f'AccountRecord(username={self.username!r}, type={self.type!r}, port={self.port!r})'
+
+
+def iter_account_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+    elif extension == '.json': # a list of accounts, or {"accounts": [...]}
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        yield from data.get('accounts', []) if isinstance(data, dict) else data
+    else:
+        yield from pd.read_excel(path).to_dict('records')
+
+
+def read_accounts(path=ACCOUNTS_PATH):
+    # rows without a username are skipped, a username listed twice only counts the first time
+    accounts = {}
+    for row in iter_account_rows(path):
+        account = AccountRecord.from_row(row)
+        if account.username is None:
+            continue
+        if account.username in accounts:
+            print(f"{account.username} is listed more than once in {path}, using the first row.")
+            continue
+        accounts[account.username] = account
+    return list(accounts.values())
 
 # %%
 ''' Open Travian International 2 server and login if not already '''
@@ -195,9 +1073,9 @@ def attempt_login(site, username, password, driver, retry=True):
     driver.get(site)
 
     try:
-        input_username = driver.find_element(By.XPATH, '//*[@id="loginForm"]/tbody/tr[1]/td[2]/input')
-        input_pwd = driver.find_element(By.XPATH, '//*[@id="loginForm"]/tbody/tr[2]/td[2]/input')
-        button_login = driver.find_element(By.CSS_SELECTOR, 'button[type="submit"][value="Login"].textButtonV1.green')
+        input_username = driver.find_element(*locator('login_username_input'))
+        input_pwd = driver.find_element(*locator('login_password_input'))
+        button_login = driver.find_element(*locator('login_button'))
 
         input_username.send_keys(username)
         input_pwd.send_keys(password)
@@ -211,53 +1089,1419 @@ def attempt_login(site, username, password, driver, retry=True):
             attempt_login(site, username, password, driver)
     
     dismiss_deal(driver) # TODO: TESTING NOW
+    start_http_session(driver, site)
+
+
+def start_account(site, account):
+    driver = init_webdriver(account['Port'])
+    if driver is None:
+        print(f"Unable to start web driver for {account['Username']}.")
+        return None
+
+    driver_accounts[driver] = account['Username']
+    attempt_login(site, account['Username'], account['Password'], driver)
+
+    # !!! STILL IN TESTING, will fail without restarting once building queue is full
+    #if not wall_built(driver):
+    #    run_missions_and_disable_contextual_helpers(driver)
+
+    return driver
+
+
+def start_accounts(site, accounts, max_workers=8):
+    # resolve shared dependencies once up front so the workers don't all race to do it
+    chromedriver_path()
+    if any(account['Port'] for account in accounts):
+        ensure_proxy_manager()
+
+    drivers_info = {}
+    with ThreadPoolExecutor(max_workers=max(min(max_workers, len(accounts)), 1)) as pool:
+        futures = [(pool.submit(start_account, site, account), account) for account in accounts]
+
+        for future, account in futures: # collect in file order so the dashboard order stays stable
+            try:
+                driver = future.result()
+            except WebDriverException as e:
+                print(f"Unable to start {account['Username']}: {e}")
+                continue
+
+            if driver:
+                drivers_info[driver] = account
+
+    return drivers_info
 
 # %%
-''' navigation helpers '''
+''' http session helpers '''
+
+# read-only page fetches can share the browser's login through a plain requests.Session, which is far cheaper
+# than driving the tab and never disturbs whatever page the tab is on
+http_sessions = {}
+http_base_urls = {}
+http_sessions_lock = threading.Lock()
+
+
+def http_session_for(driver):
+    with http_sessions_lock:
+        session = http_sessions.get(driver)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent;")
+
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=1) # keep-alive across polls
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            proxy_port = driver_proxy_ports.get(driver)
+            if proxy_port:
+                proxy_address = f'http://localhost:{proxy_port}'
+                session.proxies = {'http': proxy_address, 'https': proxy_address}
+                session.verify = False # proxy manager re-signs traffic, same as --ignore-certificate-errors
+
+            http_sessions[driver] = session
+
+    return session
+
+
+def sync_http_session_cookies(driver):
+    session = http_session_for(driver)
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+    return session
+
+
+def start_http_session(driver, site):
+    parsed_site = urlparse(site)
+    http_base_urls[driver] = f'{parsed_site.scheme}://{parsed_site.netloc}/'
+    sync_http_session_cookies(driver)
+
+
+def fetch_page_snapshot(driver, path):
+    base_url = http_base_urls.get(driver)
+    if base_url is None: # no session started for this driver, caller should fall back to the browser
+        return None
 
-def navigate_to_page(driver, page_css_selector, url_check):
-    if not url_check or url_check not in driver.current_url:
+    session = http_session_for(driver)
+    for attempt in range(2):
         try:
-            button_hero_overview = WebDriverWait(driver, 7).until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, page_css_selector))
-            )
-        except TimeoutException:
-            driver.refresh()
-            button_hero_overview = WebDriverWait(driver, 7).until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, page_css_selector))
-            )
-        
-        if button_hero_overview:
+            response = session.get(urljoin(base_url, path), timeout=10)
+            response.raise_for_status()
+        except requests.RequestException:
+            return None
+
+        snapshot = parse_snapshot(response.text)
+        if snapshot.find(id='loginForm') is None:
+            observe_snapshot(driver, snapshot)
+            return snapshot
+
+        # logged out, browser may have rotated its session cookies since our last copy
+        sync_http_session_cookies(driver)
+
+    return None
+
+
+def read_snapshot(driver, path, navigate=None):
+    # prefer the http fast path, only touch the tab when it fails
+    snapshot = fetch_page_snapshot(driver, path)
+    if snapshot is None:
+        if navigate:
+            navigate(driver)
+        snapshot = take_snapshot(driver)
+    return snapshot
+
+
+def capture_pages(driver, paths, directory='captured_pages'):
+    # save live pages so they can be served back by serve_stub_pages
+    os.makedirs(directory, exist_ok=True)
+    session = sync_http_session_cookies(driver)
+    for path in paths:
+        response = session.get(urljoin(http_base_urls[driver], path), timeout=10)
+        with open(os.path.join(directory, quote(path, safe='')), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+
+
+def load_captured_pages(directory='captured_pages'):
+    pages = {}
+    for file_name in os.listdir(directory):
+        with open(os.path.join(directory, file_name), encoding='utf-8') as f:
+            pages[unquote(file_name)] = f.read()
+    return pages
+
+
+def serve_stub_pages(pages, port=0):
+    # serves {path: html} from a local thread so the http read path can be exercised without the live game
+    class StubPageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            html = pages.get(self.path, pages.get(urlparse(self.path).path))
+            if html is None:
+                self.send_error(404)
+                return
+
+            body = html.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+# %%
+''' wait helpers '''
+
+# waits end as soon as the page is ready instead of sleeping a fixed amount, timeouts scale with how slow each
+# account's proxy has been observed to be
+WAIT_POLL_FREQUENCY = 0.05
+WAIT_TIMEOUT_MIN = 3
+WAIT_TIMEOUT_MAX = 20
+WAIT_TIMEOUT_FACTOR = 5 # timeout is this many times the account's typical wait
+
+wait_latencies = {} # driver -> moving average of observed wait time in seconds
+wait_savings = {} # job id -> [waits, seconds waited, seconds the replaced sleeps would have taken]
+wait_stats_lock = threading.Lock()
+
+JS_IS_CLICKABLE = """
+const element = arguments[0];
+if (element.disabled || element.classList.contains('disabled')) return false;
+element.scrollIntoView({block: 'center'});
+const rect = element.getBoundingClientRect();
+if (!rect.width || !rect.height) return false;
+const topElement = document.elementFromPoint(rect.left + rect.width / 2, rect.top + rect.height / 2);
+return !!topElement && (topElement === element || element.contains(topElement));
+"""
+
+JS_MS_SINCE_LAST_MUTATION = """
+if (document.readyState !== 'complete') return 0;
+if (!window.travianAutoMutations) {
+    window.travianAutoMutations = {last: performance.now()};
+    new MutationObserver(() => { window.travianAutoMutations.last = performance.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+}
+return performance.now() - window.travianAutoMutations.last;
+"""
+
+
+class input_value_populated:
+    # returns the input's value once the page has filled it in
+    def __init__(self, element):
+        self.element = element
+
+    def __call__(self, driver):
+        value = driver.execute_script("return arguments[0].value;", self.element)
+        return value if value not in (None, '') else False
+
+
+class element_clickable_and_uncovered:
+    # enabled, visible and not hidden under a popup or overlay
+    def __init__(self, element):
+        self.element = element
+
+    def __call__(self, driver):
+        return self.element if driver.execute_script(JS_IS_CLICKABLE, self.element) else False
+
+
+class dom_settled:
+    # page has finished loading and nothing in the DOM has changed for quiet_ms
+    def __init__(self, quiet_ms=300):
+        self.quiet_ms = quiet_ms
+
+    def __call__(self, driver):
+        return driver.execute_script(JS_MS_SINCE_LAST_MUTATION) >= self.quiet_ms
+
+
+def adaptive_timeout(driver):
+    observed = wait_latencies.get(driver)
+    if observed is None:
+        return WAIT_TIMEOUT_MAX / 2
+    return min(max(observed * WAIT_TIMEOUT_FACTOR, WAIT_TIMEOUT_MIN), WAIT_TIMEOUT_MAX)
+
+
+def record_wait(driver, waited, replaces_sleep, job_id=None):
+    # coroutine jobs pass their job id, they share the loop thread so current_job can't tell them apart
+    with wait_stats_lock:
+        previous = wait_latencies.get(driver, waited)
+        wait_latencies[driver] = previous * 0.8 + waited * 0.2
+
+        stats = wait_savings.setdefault(job_id or getattr(current_job, 'id', None) or 'unscheduled', [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] += replaces_sleep
+
+
+def wait_until(driver, condition, replaces_sleep=0):
+    timeout = adaptive_timeout(driver)
+    start = time.perf_counter()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_FREQUENCY).until(condition)
+    except TimeoutException:
+        record_wait(driver, timeout, replaces_sleep) # slow account, let its timeouts grow
+        raise
+
+    record_wait(driver, time.perf_counter() - start, replaces_sleep)
+    return result
+
+
+def print_wait_savings_report():
+    table = Table(title="Time Saved By Event-Driven Waits", box=box.DOUBLE, safe_box=False)
+    table.add_column("Job ID", style="cyan", no_wrap=True)
+    table.add_column("Waits", style="magenta")
+    table.add_column("Waited (s)", style="green")
+    table.add_column("Saved (s)", style="blue")
+
+    with wait_stats_lock:
+        for job_id, (waits, waited, replaced) in sorted(wait_savings.items()):
+            table.add_row(job_id, str(waits), f"{waited:.2f}", f"{replaced - waited:.2f}")
+
+    console.print(table)
+
+# %%
+''' job timing '''
+
+# each job run is timed and broken down into time spent waiting on the page vs. everything else, along with how
+# many WebDriver round-trips it made. the last JOB_TIMING_HISTORY runs of every job id are kept
+JOB_TIMING_HISTORY = 200
+
+JobTiming = namedtuple('JobTiming', ['finished_at', 'duration', 'wait', 'active', 'round_trips', 'error', 'lateness'],
+                       defaults=[None])
+
+job_timings = {} # job id -> deque of JobTiming
+job_timings_lock = threading.Lock()
+
+
+class WebDriverWait(SeleniumWebDriverWait):
+    # attributes time spent blocked on the page to whichever job is running on this thread
+
+    def until(self, method, message=''):
+        start = time.perf_counter()
+        try:
+            return super().until(method, message)
+        finally:
+            add_job_wait_time(time.perf_counter() - start)
+
+    def until_not(self, method, message=''):
+        start = time.perf_counter()
+        try:
+            return super().until_not(method, message)
+        finally:
+            add_job_wait_time(time.perf_counter() - start)
+
+
+def add_job_wait_time(seconds):
+    if getattr(current_job, 'wait_seconds', None) is not None:
+        current_job.wait_seconds += seconds
+
+
+def record_job_timing(job_id, duration, wait, round_trips, error=None, lateness=None):
+    timing = JobTiming(time.time(), duration, wait, max(duration - wait, 0), round_trips, error, lateness)
+    with job_timings_lock:
+        job_timings.setdefault(job_id, deque(maxlen=JOB_TIMING_HISTORY)).append(timing)
+
+
+def percentile(sorted_values, fraction):
+    # nearest-rank percentile, sorted_values must be non-empty
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def job_timing_stats(job_id):
+    with job_timings_lock:
+        timings = list(job_timings.get(job_id, ()))
+    if not timings:
+        return None
+
+    durations = sorted(timing.duration for timing in timings)
+    lateness = sorted(timing.lateness for timing in timings if timing.lateness is not None)
+    return {
+        'job_id': job_id,
+        'runs': len(timings),
+        'p50': percentile(durations, 0.5),
+        'p95': percentile(durations, 0.95),
+        'max': durations[-1],
+        'wait_share': sum(timing.wait for timing in timings) / (sum(durations) or 1),
+        'round_trips_p50': percentile(sorted(timing.round_trips for timing in timings), 0.5),
+        'errors': sum(1 for timing in timings if timing.error),
+        'last_error': next((timing.error for timing in reversed(timings) if timing.error), None),
+        'lateness_p50': percentile(lateness, 0.5) if lateness else None,
+        'lateness_p95': percentile(lateness, 0.95) if lateness else None,
+        'lateness_max': lateness[-1] if lateness else None,
+    }
+
+
+def export_job_timings(path):
+    # .json gets every recorded run along with the summary, anything else is written as a csv summary
+    with job_timings_lock:
+        job_ids = sorted(job_timings.keys())
+    summaries = [job_timing_stats(job_id) for job_id in job_ids]
+
+    if path.endswith('.json'):
+        with job_timings_lock:
+            runs = {job_id: [timing._asdict() for timing in job_timings[job_id]] for job_id in job_ids}
+        with open(path, 'w') as f:
+            json.dump({'summary': summaries, 'runs': runs}, f, indent=2)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(summaries[0].keys()) if summaries else ['job_id'])
+            writer.writeheader()
+            writer.writerows(summaries)
+
+
+def format_job_timing(job_id):
+    stats = job_timing_stats(job_id)
+    if stats is None:
+        return '', ''
+    return f"{stats['p50']:.1f}/{stats['p95']:.1f}/{stats['max']:.1f}", \
+           f"{stats['round_trips_p50']} ({stats['wait_share']:.0%} wait)"
+
+
+def last_job_duration(job_id):
+    with job_timings_lock:
+        timings = job_timings.get(job_id)
+        return timings[-1].duration if timings else None
+
+# %%
+''' webdriver command instrumentation '''
+
+# every WebDriver command is a round-trip to chromedriver and that, not python, is where the time goes. each
+# driver's command_executor is wrapped so every command is counted and timed against the running job and the
+# account. optionally commands are also tallied by the line of this file that issued them so a job making hundreds
+# of calls can be traced back to the loop responsible. that means walking the stack, which costs more python time
+# than the rest of the instrumentation put together and grows with the depth of the call chain (around 10us a command
+# walking frames directly, a few hundred through traceback), so it's off by default and when on only every
+# CALL_SITE_SAMPLE_RATE-th command is walked
+COMMAND_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5) # upper bounds in seconds
+COMMAND_CALL_SITES = False # turn on while hunting for chatty loops
+CALL_SITE_SAMPLE_RATE = 10 # 1 walks every command
+CALL_SITE_DEPTH = 2 # own frames kept per call site, the issuing line and the line that called into it
+CALL_SITE_FILE = sys._getframe().f_code.co_filename # as the code objects of this file have it, no need to resolve it
+CALL_SITE_SKIPPED = ('instrumented_execute', 'sample_call_site', 'command_call_site', 'make_step', 'run_steps', 'run')
+
+call_site_samples = itertools.count() # commands seen while call sites are on, picks which ones get walked
+
+driver_accounts = {} # driver -> username, so commands can be tallied per account
+command_stats = {} # ('job', job id) or ('account', username) -> {command: CommandStats}
+command_call_sites = {} # call site -> {command: CommandStats}
+command_stats_lock = threading.Lock()
+
+
+class CommandStats:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(COMMAND_LATENCY_BUCKETS) + 1) # last bucket is everything past the largest bound
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.buckets[bisect.bisect_left(COMMAND_LATENCY_BUCKETS, latency)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile(self, fraction):
+        # upper bound of the bucket the percentile falls in, the histogram doesn't know any finer than that
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(COMMAND_LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def command_call_site():
+    # innermost frames of this file that led to the command, skipping the instrumentation itself. walks the frame
+    # objects directly and stops once it has enough, traceback.extract_stack would build and look up every frame
+    site = []
+    frame = sys._getframe()
+    while frame is not None and len(site) < CALL_SITE_DEPTH:
+        code = frame.f_code
+        if code.co_filename == CALL_SITE_FILE and code.co_name == 'run_steps':
+            site.extend(f'{step_frame.f_code.co_name}:{step_frame.f_lineno}'
+                        for step_frame in suspended_step_frames(frame.f_locals['steps']))
+        elif code.co_filename == CALL_SITE_FILE and code.co_name not in CALL_SITE_SKIPPED:
+            site.append(f'{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return tuple(site[:CALL_SITE_DEPTH])
+
+
+def suspended_step_frames(steps):
+    # a driver steps body sits suspended at its yield while the step runs, so it's off the stack. innermost first,
+    # through any `yield from` into a helper's steps
+    frames = []
+    while steps is not None and steps.gi_frame is not None:
+        frames.append(steps.gi_frame)
+        steps = steps.gi_yieldfrom
+    return reversed(frames)
+
+
+def sample_call_site():
+    if not COMMAND_CALL_SITES or next(call_site_samples) % CALL_SITE_SAMPLE_RATE:
+        return None
+    return command_call_site()
+
+
+def record_driver_command(driver, command, latency, call_site):
+    job_id = getattr(current_job, 'id', None) or '-' # '-' is anything outside a job, logins, health probes
+    with command_stats_lock:
+        for key in (('job', job_id), ('account', driver_accounts.get(driver, '-'))):
+            command_stats.setdefault(key, {}).setdefault(command, CommandStats()).add(latency)
+        if call_site:
+            command_call_sites.setdefault(call_site, {}).setdefault(command, CommandStats()).add(latency)
+
+
+def instrument_commands(driver):
+    # counts the command against the running job's round trips too, that's what the job timing table reports
+    execute = driver.command_executor.execute
+
+    def instrumented_execute(command, params=None):
+        if getattr(current_job, 'round_trips', None) is not None:
+            current_job.round_trips += 1
+        call_site = sample_call_site()
+        start = time.perf_counter()
+        try:
+            return execute(command, params)
+        finally:
+            record_driver_command(driver, command, time.perf_counter() - start, call_site)
+
+    driver.command_executor.execute = instrumented_execute
+
+
+def merged_command_stats(scope, key=None):
+    # command -> CommandStats summed over every job id or account of the scope, or just the one given
+    merged = {}
+    with command_stats_lock:
+        for (stats_scope, stats_key), by_command in command_stats.items():
+            if stats_scope != scope or (key is not None and stats_key != key):
+                continue
+            for command, stats in by_command.items():
+                merged.setdefault(command, CommandStats()).merge(stats)
+    return merged
+
+
+def top_call_sites(n=15):
+    # call sites by total time spent in their commands, with the commands each one issued most
+    with command_stats_lock:
+        sites = []
+        for call_site, by_command in command_call_sites.items():
+            total = CommandStats()
+            for stats in by_command.values():
+                total.merge(stats)
+            top_commands = sorted(by_command.items(), key=lambda item: item[1].count, reverse=True)[:3]
+            sites.append((call_site, total, [(command, stats.count) for command, stats in top_commands]))
+    return sorted(sites, key=lambda site: site[1].total, reverse=True)[:n]
+
+
+def reset_command_stats():
+    with command_stats_lock:
+        command_stats.clear()
+        command_call_sites.clear()
+
+
+def command_histogram_text(stats):
+    # counts per latency bucket, empty buckets at either end left out
+    labels = [f'<{bound * 1000:g}ms' for bound in COMMAND_LATENCY_BUCKETS] + [f'>{COMMAND_LATENCY_BUCKETS[-1]:g}s']
+    filled = [i for i, count in enumerate(stats.buckets) if count]
+    if not filled:
+        return ''
+    return ' '.join(f'{labels[i]}:{stats.buckets[i]}' for i in range(filled[0], filled[-1] + 1))
+
+
+def print_command_report(scope='job', top=15):
+    # scope is 'job' or 'account'
+    with command_stats_lock:
+        keys = sorted(key for stats_scope, key in command_stats if stats_scope == scope)
+
+    table = Table(title=f"WebDriver Commands by {scope.title()}", box=box.DOUBLE, safe_box=False)
+    table.add_column(scope.title(), style="cyan", no_wrap=True)
+    table.add_column("Command", style="magenta")
+    table.add_column("Calls", style="yellow")
+    table.add_column("Total (s)", style="green")
+    table.add_column("p50/p95/max (ms)", style="green")
+    table.add_column("Latency Histogram", style="blue")
+    for key in keys:
+        by_command = merged_command_stats(scope, key)
+        for command, stats in sorted(by_command.items(), key=lambda item: item[1].total, reverse=True):
+            table.add_row(str(key), command, str(stats.count), f"{stats.total:.2f}",
+                          f"{stats.percentile(0.5) * 1000:.0f}/{stats.percentile(0.95) * 1000:.0f}/{stats.max * 1000:.0f}",
+                          command_histogram_text(stats))
+    console.print(table)
+
+    # call sites only see the sampled commands, their counts are a 1 in CALL_SITE_SAMPLE_RATE share of the real ones
+    table = Table(title=f"Top WebDriver Call Sites (1 in {CALL_SITE_SAMPLE_RATE} commands)", box=box.DOUBLE,
+                  safe_box=False)
+    table.add_column("Call Site", style="cyan")
+    table.add_column("Calls", style="yellow")
+    table.add_column("Total (s)", style="green")
+    table.add_column("Commands", style="magenta")
+    for call_site, stats, commands in top_call_sites(top):
+        table.add_row(' < '.join(call_site), str(stats.count), f"{stats.total:.2f}",
+                      ', '.join(f'{command} x{count}' for command, count in commands))
+    console.print(table)
+
+# %%
+''' job state store '''
+
+# scheduler listeners push job progress in here, so the dashboard and anything else interested is told what changed
+# instead of re-reading the job store. the last JOB_STATE_HISTORY outcomes of every job id are kept
+JOB_STATE_HISTORY = 50
+
+JOB_OUTCOMES = {
+    EVENT_JOB_EXECUTED: 'executed',
+    EVENT_JOB_ERROR: 'error',
+    EVENT_JOB_MISSED: 'missed',
+    EVENT_JOB_MAX_INSTANCES: 'max_instances',
+}
+JOB_SCHEDULE_EVENTS = EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_REMOVED | EVENT_JOB_SUBMITTED
+
+JobOutcome = namedtuple('JobOutcome', ['finished_at', 'outcome', 'duration', 'message'])
+JobState = namedtuple('JobState', ['job_id', 'scheduled', 'next_run_time', 'message', 'generation', 'outcomes'])
+
+
+class JobRecord:
+    __slots__ = ('scheduled', 'next_run_time', 'message', 'generation', 'outcomes')
+
+    def __init__(self, history):
+        self.scheduled = False
+        self.next_run_time = None
+        self.message = ''
+        self.generation = 0 # bumped on every change, lets consumers skip jobs they've already seen
+        self.outcomes = deque(maxlen=history)
+
+
+class JobStateStore:
+    '''
+    Thread-safe record of every job's next run time, latest log message and recent outcomes. Scheduler events and
+    log() calls from the jobs update it, subscribers are called with the job id of whatever changed.
+    '''
+
+    def __init__(self, history=JOB_STATE_HISTORY):
+        self.history = history
+        self._records = {} # job id -> JobRecord
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._scheduler = None
+
+    def attach(self, scheduler):
+        self._scheduler = scheduler
+        mask = JOB_SCHEDULE_EVENTS
+        for code in JOB_OUTCOMES:
+            mask |= code
+        scheduler.add_listener(self._on_event, mask)
+
+    def subscribe(self, callback):
+        # callback(job_id) runs on whichever thread made the change, keep it short
+        with self._lock:
+            self._subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _record(self, job_id):
+        # caller holds the lock
+        if job_id not in self._records:
+            self._records[job_id] = JobRecord(self.history)
+        return self._records[job_id]
+
+    def _changed(self, job_id, record):
+        # caller holds the lock, hands back the subscribers to notify once it's released
+        record.generation += 1
+        return list(self._subscribers)
+
+    def _notify(self, subscribers, job_id):
+        for callback in subscribers:
             try:
-                button_hero_overview.click()
-            except ElementClickInterceptedException:
-                driver.execute_script(JS_CLICK, button_hero_overview)       
+                callback(job_id)
+            except Exception as e:
+                print(f"Job state subscriber failed for {job_id}: {e}")
+
+    def log(self, job_id, message):
+        with self._lock:
+            record = self._record(job_id)
+            if record.message == message:
+                return
+            record.message = message
+            subscribers = self._changed(job_id, record)
+        self._notify(subscribers, job_id)
+
+    def job_scheduled(self, job_id, next_run_time):
+        with self._lock:
+            record = self._record(job_id)
+            if record.scheduled and record.next_run_time == next_run_time:
+                return
+            record.scheduled = True
+            record.next_run_time = next_run_time
+            subscribers = self._changed(job_id, record)
+        self._notify(subscribers, job_id)
+
+    def job_removed(self, job_id):
+        # history is kept, a job that removes itself is usually added straight back under the same id
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None or not record.scheduled:
+                return
+            record.scheduled = False
+            record.next_run_time = None
+            subscribers = self._changed(job_id, record)
+        self._notify(subscribers, job_id)
+
+    def record_outcome(self, job_id, outcome, duration=None, next_run_time=None):
+        with self._lock:
+            record = self._record(job_id)
+            record.outcomes.append(JobOutcome(time.time(), outcome, duration, record.message))
+            if next_run_time is not None:
+                record.scheduled = True
+                record.next_run_time = next_run_time
+            subscribers = self._changed(job_id, record)
+        self._notify(subscribers, job_id)
+
+    def mirror(self, job_id, scheduled, next_run_time, message, outcomes):
+        # takes over a job's whole state from another process's store, e.g. a shard worker's
+        with self._lock:
+            record = self._record(job_id)
+            record.scheduled = scheduled
+            record.next_run_time = next_run_time
+            record.message = message
+            record.outcomes.clear()
+            record.outcomes.extend(outcomes)
+            subscribers = self._changed(job_id, record)
+        self._notify(subscribers, job_id)
+
+    def _on_event(self, event):
+        if event.code == EVENT_JOB_REMOVED:
+            self.job_removed(event.job_id)
+            return
+
+        job = self._scheduler.get_job(event.job_id) if self._scheduler else None
+        next_run_time = job.next_run_time if job else None
+        if event.code in JOB_OUTCOMES:
+            duration = last_job_duration(event.job_id) if event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR) else None
+            self.record_outcome(event.job_id, JOB_OUTCOMES[event.code], duration, next_run_time)
+        elif job is not None:
+            self.job_scheduled(event.job_id, next_run_time)
+
+    def message(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            return record.message if record else ''
+
+    def get(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None:
+                return None
+            return JobState(job_id, record.scheduled, record.next_run_time, record.message, record.generation,
+                            tuple(record.outcomes))
+
+    def job_ids(self):
+        with self._lock:
+            return list(self._records.keys())
+
+
+job_states = JobStateStore()
+
+# %%
+''' navigation helpers '''
+
+building_urls = {} # (driver, building) -> 'build.php?id=..' the building was last entered at
+
+
+def count_navigation(skipped):
+    counts = async_visit_counts.get() or getattr(current_visit, 'counts', None)
+    if counts is not None:
+        counts['skipped' if skipped else 'navigated'] += 1
+
+
+@driver_steps
+def navigate_to_page(driver, page_locator, url_check):
+    if url_check and url_check in (yield call(getattr, driver, 'current_url')):
+        count_navigation(skipped=True)
+        return
+
+    count_navigation(skipped=False)
+    try:
+        button_hero_overview = yield wait(driver, EC.presence_of_element_located(page_locator), timeout=7)
+    except TimeoutException:
+        yield call(driver.refresh)
+        button_hero_overview = yield wait(driver, EC.presence_of_element_located(page_locator), timeout=7)
+    
+    if button_hero_overview:
+        try:
+            yield call(button_hero_overview.click)
+        except ElementClickInterceptedException:
+            yield call(driver.execute_script, JS_CLICK, button_hero_overview)
 
 
+@driver_steps
 def navigate_to_hero_inventory(driver):
-    selector = '#heroImageButton'
+    selector = locator('hero_inventory_button')
     url_check = 'hero/inventory'
-    navigate_to_page(driver, selector, url_check)
+    yield from navigate_to_page.steps(driver, selector, url_check)
 
 
+@driver_steps
 def navigate_to_resource_fields(driver):
-    selector = '.village.resourceView'
+    selector = locator('resource_fields_button')
     url_check = 'dorf1.php'
-    navigate_to_page(driver, selector, url_check)
+    yield from navigate_to_page.steps(driver, selector, url_check)
 
 
+@driver_steps
 def navigate_to_buildings(driver):
-    selector = '.village.buildingView'
+    selector = locator('buildings_button')
     url_check = 'dorf2.php'
-    navigate_to_page(driver, selector, url_check)
+    yield from navigate_to_page.steps(driver, selector, url_check)
 
 
+@driver_steps
 def enter_building(driver, building):
-    navigate_to_buildings(driver)
+    # already inside the building, e.g. an earlier job in this visit left the tab there
+    building_url = building_urls.get((driver, building))
+    if building_url and re.search(re.escape(building_url) + r'(?!\d)', (yield call(getattr, driver, 'current_url'))):
+        count_navigation(skipped=True)
+        return
+
+    yield from navigate_to_buildings.steps(driver)
 
-    selector = f'[data-name="{building}"]'
+    selector = locator('building', building=building)
     url_check = None
-    navigate_to_page(driver, selector, url_check)
+    yield from navigate_to_page.steps(driver, selector, url_check)
+
+    match = re.search(r'build\.php\?id=\d+', (yield call(getattr, driver, 'current_url')))
+    if match:
+        building_urls[(driver, building)] = match.group(0)
+
+# %%
+''' page snapshot parsing '''
+
+# pulling page_source once and parsing it locally costs a single WebDriver round-trip, whereas reading the same
+# data with find_element/get_attribute/.text costs one round-trip per call
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+RAW_TEXT_TAGS = {'script', 'style'}
+
+FarmList = namedtuple('FarmList', ['index', 'name', 'rows', 'troops_used', 'troops_available'])
+FarmListRow = namedtuple('FarmListRow', ['row_index', 'checkbox_id', 'attacking', 'distance', 'troops',
+                                         'target_href', 'last_raid_had_losses'])
+ResourceField = namedtuple('ResourceField', ['position', 'slot', 'gid', 'level', 'upgradable', 'under_construction'])
+TroopMovement = namedtuple('TroopMovement', ['direction', 'kind', 'count', 'seconds_left'])
+HeroStatus = namedtuple('HeroStatus', ['home', 'running', 'adventures', 'level_up'])
+IncomingAttack = namedtuple('IncomingAttack', ['kind', 'seconds_left'])
+VillageResources = namedtuple('VillageResources', ['stock', 'capacity', 'production']) # each keyed by resource id
+FieldIndex = namedtuple('FieldIndex', ['fields', 'by_gid', 'resources'])
+
+
+class SnapshotNode:
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.children = [] # mix of SnapshotNode and str
+        self.parent = parent
+
+    @property
+    def classes(self):
+        return (self.attrs.get('class') or '').split()
+
+    @property
+    def elements(self):
+        return [child for child in self.children if isinstance(child, SnapshotNode)]
+
+    @property
+    def text(self):
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ' '.join(''.join(parts).split()) # collapse whitespace the way WebElement.text does
+
+    def iter(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.elements))
+
+    def find_all(self, tag=None, cls=None, id=None):
+        return [node for node in self.iter() if node is not self and
+                (tag is None or node.tag == tag) and
+                (cls is None or cls in node.classes) and
+                (id is None or node.attrs.get('id') == id)]
+
+    def find(self, tag=None, cls=None, id=None):
+        for node in self.iter():
+            if node is not self and (tag is None or node.tag == tag) and \
+               (cls is None or cls in node.classes) and (id is None or node.attrs.get('id') == id):
+                return node
+        return None
+
+    def path(self, path):
+        ''' follows a relative positional path such as 'div/div[1]/div[2]', mirroring the XPaths used elsewhere '''
+        node = self
+        for step in path.split('/'):
+            match = re.fullmatch(r'([\w-]+)(?:\[(\d+)\])?', step)
+            tag, n = match.group(1), int(match.group(2) or 1)
+            candidates = [child for child in node.elements if child.tag == tag]
+            if len(candidates) < n:
+                return None
+            node = candidates[n - 1]
+        return node
+
+
+class _SnapshotBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = SnapshotNode('#document', {})
+        self._current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = SnapshotNode(tag, attrs, self._current)
+        self._current.children.append(node)
+        if tag not in VOID_TAGS:
+            self._current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self._current.children.append(SnapshotNode(tag, attrs, self._current))
+
+    def handle_endtag(self, tag):
+        # walk up to the matching open tag, tolerating unclosed elements the way browsers do
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent
+
+    def handle_data(self, data):
+        if self._current.tag not in RAW_TEXT_TAGS:
+            self._current.children.append(data)
+
+
+def parse_snapshot(html):
+    builder = _SnapshotBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def take_snapshot(driver):
+    snapshot = parse_snapshot(driver.page_source)
+    observe_snapshot(driver, snapshot)
+    return snapshot
+
+
+def int_from_text(text, default=None):
+    digits = re.sub(r'[^\d]', '', text or '')
+    return int(digits) if digits else default
+
+
+def signed_int_from_text(text, default=None):
+    # crop production goes negative, travian writes the sign as a unicode minus wrapped in direction marks
+    value = int_from_text(text)
+    if value is None:
+        return default
+    sign = re.split(r'\d', text, maxsplit=1)[0]
+    return -value if '-' in sign or '\u2212' in sign else value
+
+
+def timer_seconds(timer):
+    # timers carry the remaining seconds in their value attribute, fall back to parsing the H:MM:SS text
+    if timer.attrs.get('value', '').isdigit():
+        return int(timer.attrs['value'])
+
+    seconds = 0
+    for part in timer.text.split(':'):
+        seconds = seconds * 60 + int_from_text(part, 0)
+    return seconds
+
+
+def parse_farm_lists(snapshot):
+    container = snapshot.find(id='rallyPointFarmList')
+    if container is None:
+        return []
+
+    farm_lists = []
+    for list_element in container.find_all(cls='dropContainer'):
+        list_name = list_element.find(cls='farmListName')
+        name_element = list_name.find(cls='name') if list_name else None
+        table = list_element.find(tag='table', cls='slots')
+        table_body = table.find(tag='tbody') if table else None
+
+        troops_summary = table.find(cls='troopsSummary') if table else None
+        troop_totals = troops_summary.find(cls='value') if troops_summary else None
+        troops_used, troops_available = parse_troop_totals(troop_totals.text if troop_totals else '')
+
+        farm_lists.append(FarmList(
+            index=list_element.parent.elements.index(list_element),
+            name=name_element.text if name_element else '',
+            rows=parse_farm_list_rows(table_body) if table_body else [],
+            troops_used=troops_used,
+            troops_available=troops_available,
+        ))
+    return farm_lists
+
+
+def parse_troop_totals(text):
+    # farm list footer reads "<troops used>/<troops available>"
+    numbers = [int_from_text(number) for number in re.findall(r'[\d,.]+', text)]
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    return None, None
+
+
+def make_farm_list_row(row_index, checkbox_id, state_class, distance_text, troops_text, target_href, last_raid_class):
+    return FarmListRow(
+        row_index=row_index,
+        checkbox_id=checkbox_id,
+        attacking='attack_small' in (state_class or ''),
+        distance=float(re.sub(r'[^\d.]', '', distance_text) or 'inf') if distance_text else float('inf'),
+        troops=int_from_text(troops_text, 0),
+        target_href=target_href,
+        last_raid_had_losses=last_raid_class is not None and 'attack_won_withoutLosses_small' not in last_raid_class,
+    )
+
+
+def parse_farm_list_rows(table_body):
+    rows = []
+    for row_index, row in enumerate(table_body.elements, start=1):
+        selection = row.find(cls='selection')
+        checkbox_label = selection.find(cls='checkbox') if selection else None
+        checkbox = checkbox_label.find(tag='input') if checkbox_label else None
+        if checkbox is None: # "Add target" row and similar
+            continue
+
+        state = row.find(cls='state')
+        state_icon = state.find(tag='i') if state else None
+        distance = row.find(cls='distance')
+        distance_value = distance.find(cls='value') if distance else None
+        troops = row.find(cls='troops')
+        troops_count = troops.find(cls='value') if troops else None
+        target = row.find(cls='target')
+        target_link = target.find(tag='a') if target else None
+        last_raid = row.find(cls='lastRaid')
+        last_raid_icon = last_raid.find(tag='i') if last_raid else None
+
+        rows.append(make_farm_list_row(
+            row_index,
+            checkbox.attrs.get('id'),
+            state_icon.attrs.get('class', '') if state_icon else None,
+            distance_value.text if distance_value else None,
+            troops_count.text if troops_count else None,
+            target_link.attrs.get('href') if target_link else None,
+            last_raid_icon.attrs.get('class', '') if last_raid_icon else None,
+        ))
+    return rows
+
+
+def parse_resource_fields(snapshot):
+    container = snapshot.find(id='resourceFieldContainer')
+    if container is None:
+        return []
+
+    fields = []
+    links = [child for child in container.elements if child.tag == 'a']
+    for position, link in enumerate(links[1:], start=2): # start at 2 to skip village center
+        gid = next((int(cls[3:]) for cls in link.classes if re.fullmatch(r'gid\d+', cls)), None)
+        slot = re.search(r'id=(\d+)', link.attrs.get('href', ''))
+        level = link.find(tag='div')
+
+        fields.append(ResourceField(
+            position=position,
+            slot=int(slot.group(1)) if slot else None,
+            gid=gid,
+            level=int_from_text(level.text, 0) if level else 0,
+            upgradable='good' in link.classes,
+            under_construction='underConstruction' in link.classes,
+        ))
+    return fields
+
+
+def parse_village_resources(snapshot):
+    # stock bar and production table on dorf1, None when the page didn't have them
+    stock = {}
+    for resource_id in resource_ids:
+        value = snapshot.find(id=f'l{resource_id}')
+        if value is None:
+            return None
+        stock[resource_id] = int_from_text(value.text, 0)
+
+    capacity = {}
+    for cls, resources in (('warehouse', (WOOD, CLAY, IRON)), ('granary', (WHEAT,))):
+        store = snapshot.find(cls=cls)
+        value = store.find(cls='capacity') if store else None
+        value = value.find(cls='value') if value else None
+        for resource_id in resources:
+            capacity[resource_id] = int_from_text(value.text, 0) if value else None
+
+    production = {}
+    table = snapshot.find(id='production')
+    amounts = table.find_all(tag='td', cls='num') if table else []
+    for resource_id, amount in zip(resource_ids, amounts):
+        production[resource_id] = signed_int_from_text(amount.text, 0)
+
+    return VillageResources(stock, capacity, production)
+
+
+def index_resource_fields(snapshot):
+    # every field read once, grouped by resource type with the lowest level first
+    fields = parse_resource_fields(snapshot)
+    by_gid = {}
+    for field in sorted(fields, key=lambda field: (field.level, field.position)):
+        by_gid.setdefault(field.gid, []).append(field)
+    return FieldIndex(fields, {gid: tuple(group) for gid, group in by_gid.items()}, parse_village_resources(snapshot))
+
+
+def parse_troop_movements(snapshot):
+    container = snapshot.find(id='movements')
+    if container is None:
+        return None # no movements table at all, as opposed to an empty one
+
+    movements = []
+    direction = None
+    for row in container.find_all(tag='tr'):
+        th = row.find(tag='th')
+        if th is not None:
+            if 'Incoming' in th.text:
+                direction = 'incoming'
+            elif 'Outgoing' in th.text:
+                direction = 'outgoing'
+            continue
+
+        img = row.path('td/a/img')
+        if img is None:
+            continue
+
+        kind = next((cls for cls in img.classes if re.fullmatch(r'[a-z]+\d+|adventure', cls)), None)
+        movement = row.find(cls='mov')
+        timer = row.find(cls='timer')
+        movements.append(TroopMovement(
+            direction=direction,
+            kind=kind,
+            count=int_from_text(movement.text.split()[0] if movement and movement.text else '', 1),
+            seconds_left=timer_seconds(timer) if timer else None,
+        ))
+    return movements
+
+
+def parse_incoming_attacks(snapshot):
+    # rally point overview, one troop_details table per movement so every attack gets its own timer
+    attacks = []
+    for table in snapshot.find_all(tag='table', cls='troop_details'):
+        kind = next((cls for cls in ('inAttack', 'inRaid') if cls in table.classes), None)
+        timer = table.find(cls='timer')
+        if kind and timer is not None:
+            attacks.append(IncomingAttack(kind, timer_seconds(timer)))
+    return attacks
+
+
+def parse_build_queue(snapshot):
+    # seconds left on every building in the construction queue, soonest first
+    queue = snapshot.find(cls='buildingList')
+    if queue is None:
+        return []
+    timers = [item.find(cls='timer') for item in queue.find_all(tag='li')]
+    return sorted(timer_seconds(timer) for timer in timers if timer is not None)
+
+
+def parse_training_queue(snapshot):
+    # seconds left on every batch training in the building currently open, soonest first
+    queue = snapshot.find(tag='table', cls='under_progress')
+    if queue is None:
+        return []
+    return sorted(timer_seconds(timer) for timer in queue.find_all(cls='timer'))
+
+
+def hero_return_seconds(troop_movements):
+    # the hero shows up in the movements table while out on an adventure, nothing to wait on when it's home
+    timers = [movement.seconds_left for movement in troop_movements or ()
+              if movement.kind == 'adventure' and movement.seconds_left is not None]
+    return max(timers) if timers else None
+
+
+def parse_hero_status(snapshot):
+    top_bar_hero = snapshot.find(id='topBarHero')
+    hero_status = top_bar_hero.find(cls='heroStatus') if top_bar_hero else None
+    status_icon = hero_status.find(tag='i') if hero_status else None
+    level_up_icon = top_bar_hero.find(tag='i', cls='levelUp') if top_bar_hero else None
+
+    adventures = 0
+    for link in snapshot.find_all(tag='a', cls='adventure'):
+        if link.attrs.get('href') == '/hero/adventures':
+            counter = link.find(cls='content')
+            adventures = int_from_text(counter.text, 0) if counter else 0
+            break
+
+    return HeroStatus(
+        home=bool(status_icon and 'heroHome' in status_icon.classes),
+        running=bool(status_icon and 'heroRunning' in status_icon.classes),
+        adventures=adventures,
+        level_up=bool(level_up_icon and 'show' in level_up_icon.classes),
+    )
+
+# %%
+''' village state '''
+
+# what we last saw of each account's village. every snapshot any job takes is fed through observe_snapshot, so a job
+# can use what another job saw a moment ago instead of loading the page again. timers are kept as absolute times so
+# they stay correct as they age, each value is only trusted for up to its VILLAGE_MAX_AGE seconds
+VILLAGE_STATE_PATH = os.path.expanduser('~/.travianauto/village_state.json')
+VILLAGE_STATE_SAVE_DELAY = 30 # seconds, one job's snapshots come in a burst and are written out together
+
+VILLAGE_MAX_AGE = {
+    'resources': 300,
+    'fields': 300,
+    'build_queue': 1800, # only changes when we build something, which re-reads dorf1 anyway
+    'troop_movements': 45,
+    'hero': 120,
+    'gold_club': 86400,
+}
+
+# json turns namedtuples into lists and int keys into strings, these put them back
+VILLAGE_LOADERS = {
+    'resources': lambda value: VillageResources(*({int(key): amount for key, amount in part.items()} for part in value)),
+    'fields': lambda value: [ResourceField(*field) for field in value],
+    'build_queue': list,
+    'troop_movements': lambda value: None if value is None else [tuple(movement) for movement in value],
+    'hero': lambda value: HeroStatus(*value),
+    'gold_club': bool,
+}
+
+
+class VillageState:
+    def __init__(self):
+        self.values = {} # name -> value
+        self.updated = {} # name -> time.time() it was seen
+        self.hits = 0 # reads served from here instead of a page load
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def update(self, name, value, seen_at=None):
+        with self.lock:
+            self.values[name] = value
+            self.updated[name] = seen_at or time.time()
+        village_state_changed()
+
+    def invalidate(self, *names):
+        with self.lock:
+            for name in names:
+                self.updated.pop(name, None)
+        village_state_changed()
+
+    def age(self, name):
+        with self.lock:
+            return time.time() - self.updated[name] if name in self.updated else None
+
+    def current(self, name, max_age=None):
+        # value as of now if it was seen recently enough, otherwise None and the caller loads the page
+        max_age = VILLAGE_MAX_AGE[name] if max_age is None else max_age
+        with self.lock:
+            if name not in self.updated or time.time() - self.updated[name] > max_age:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value = self.values[name]
+
+        now = time.time()
+        if name == 'build_queue':
+            return [finishes_at - now for finishes_at in value if finishes_at > now]
+        if name == 'troop_movements':
+            return None if value is None else \
+                [TroopMovement(direction, kind, count, int(lands_at - now) if lands_at is not None else None)
+                 for direction, kind, count, lands_at in value if lands_at is None or lands_at > now]
+        return value
+
+    def estimated_stock(self):
+        # stock extrapolated from the last read with the production rates, capped at what storage holds
+        with self.lock:
+            resources = self.values.get('resources')
+            seen_at = self.updated.get('resources')
+        if resources is None or seen_at is None:
+            return None
+
+        hours = (time.time() - seen_at) / 3600
+        stock = {}
+        for resource_id, amount in resources.stock.items():
+            estimate = amount + resources.production.get(resource_id, 0) * hours
+            capacity = resources.capacity.get(resource_id)
+            stock[resource_id] = int(min(estimate, capacity) if capacity else estimate)
+        return stock
+
+    def to_dict(self):
+        with self.lock:
+            return {'values': dict(self.values), 'updated': dict(self.updated)}
+
+    @classmethod
+    def from_dict(cls, data):
+        village = cls()
+        for name, value in data.get('values', {}).items():
+            if name in VILLAGE_LOADERS and name in data.get('updated', {}):
+                village.update(name, VILLAGE_LOADERS[name](value), data['updated'][name])
+        return village
+
+
+village_states = {} # driver -> VillageState
+village_states_lock = threading.Lock()
+
+
+def village_of(driver):
+    with village_states_lock:
+        if driver not in village_states:
+            village_states[driver] = VillageState()
+        return village_states[driver]
+
+
+def observe_snapshot(driver, snapshot):
+    village = village_of(driver)
+    now = time.time()
+
+    resources = parse_village_resources(snapshot)
+    if resources is not None:
+        if not resources.production: # production table is only on dorf1, keep the rates we last saw
+            with village.lock:
+                previous = village.values.get('resources')
+            resources = resources._replace(production=previous.production if previous else {})
+        village.update('resources', resources, now)
+
+    if snapshot.find(id='topBarHero') is not None:
+        village.update('hero', parse_hero_status(snapshot), now)
+
+    # on dorf1 a missing build queue or movements table means there's nothing in it, elsewhere it means nothing
+    if snapshot.find(id='resourceFieldContainer') is not None:
+        village.update('fields', parse_resource_fields(snapshot), now)
+        village.update('build_queue', [now + seconds for seconds in parse_build_queue(snapshot)], now)
+
+        movements = parse_troop_movements(snapshot)
+        village.update('troop_movements', None if movements is None else
+                       [(movement.direction, movement.kind, movement.count,
+                         now + movement.seconds_left if movement.seconds_left is not None else None)
+                        for movement in movements], now)
+
+
+@contextmanager
+def locked_json_file(path, default):
+    # shard workers share the state files, each one only rewrites its own accounts' entries under the lock
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = default
+
+        yield data
+
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+
+def save_village_states(drivers_info, path=VILLAGE_STATE_PATH):
+    # keyed by username since drivers don't survive a restart
+    with village_states_lock:
+        villages = dict(village_states)
+    with locked_json_file(path, {}) as data:
+        data.update({str(account['Username']): villages[driver].to_dict()
+                     for driver, account in list(drivers_info.items()) if driver in villages})
+
+
+class VillageStateSaver:
+    '''
+    Writes a set of accounts' village states to the state file shortly after any of them change, so a crash or a
+    killed shard worker only loses what the jobs saw in the last VILLAGE_STATE_SAVE_DELAY seconds.
+    '''
+
+    def __init__(self, drivers_info, path=VILLAGE_STATE_PATH):
+        self.drivers_info = drivers_info
+        self.path = path
+        self.flush_timer = None
+        self.lock = threading.Lock()
+
+    def attach(self):
+        with village_state_savers_lock:
+            village_state_savers.append(self)
+
+    def detach(self):
+        with village_state_savers_lock:
+            if self in village_state_savers:
+                village_state_savers.remove(self)
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+
+    def changed(self):
+        with self.lock:
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(VILLAGE_STATE_SAVE_DELAY, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.flush_timer = None
+        try:
+            save_village_states(self.drivers_info, self.path)
+        except (OSError, TypeError, ValueError) as e: # a failed save is retried on the next change
+            print(f"Unable to save village state to {self.path}: {e}")
+
+
+village_state_savers = []
+village_state_savers_lock = threading.Lock()
+
+
+def village_state_changed():
+    with village_state_savers_lock:
+        savers = list(village_state_savers)
+    for saver in savers:
+        saver.changed()
+
+
+def load_village_states(drivers_info, path=VILLAGE_STATE_PATH):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+
+    for driver in drivers_info.keys():
+        username = str(drivers_info[driver]['Username'])
+        if username in data:
+            with village_states_lock:
+                village_states[driver] = VillageState.from_dict(data[username])
+
+
+def print_village_report(drivers_info):
+    table = Table(title="Village State", box=box.DOUBLE, safe_box=False)
+    table.add_column("Account", style="cyan", no_wrap=True)
+    table.add_column("Served From State", style="green")
+    table.add_column("Page Loads", style="red")
+    for name in VILLAGE_MAX_AGE:
+        table.add_column(f"{name} age (s)", style="yellow")
+
+    for driver in drivers_info.keys():
+        village = village_of(driver)
+        ages = [village.age(name) for name in VILLAGE_MAX_AGE]
+        table.add_row(str(drivers_info[driver]['Username']), str(village.hits), str(village.misses),
+                      *['' if age is None else f"{age:.0f}" for age in ages])
+    console.print(table)
 
 # %%
 ''' building construction funcs '''
@@ -271,15 +2515,13 @@ def can_build(building_slot):
 
 def press_construct_building_button_for(driver, building):
     try:
-        header = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-            (By.XPATH, f"//h2[text()='{building}']"))
-        )
+        header = WebDriverWait(driver, 5).until(EC.presence_of_element_located(locator('building_header', building=building)))
     except TimeoutException:
         print("Unable to find building! Has it already been constructed or are you on the wrong building tab?")
         return False
 
-    building_wrapper = header.find_element(By.XPATH, '..')
-    build_button = building_wrapper.find_element(By.CSS_SELECTOR, '.textButtonV1.green.new')
+    building_wrapper = header.find_element(*locator('parent'))
+    build_button = building_wrapper.find_element(*locator('new_building_button'))
     build_button.click()
 
     return True
@@ -287,24 +2529,24 @@ def press_construct_building_button_for(driver, building):
 def construct_building_in_slot(driver, building, building_slot):
     navigate_to_buildings(driver)
 
-    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, f"//a[contains(@href, '/build.php?id={building_slot}')]"))
+    building_slot_link = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
+        locator('building_slot', slot=building_slot))
     )
-    if not can_build(building_slot):
+    if not can_build(building_slot_link):
         return
 
-    driver.execute_script(JS_CLICK, building_slot) # use javascript to get around helper popup
+    driver.execute_script(JS_CLICK, building_slot_link) # use javascript to get around helper popup
 
     for i in range(1, 4): # check all building tabs for building
         try:
             infrastructure_tab = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-                (By.XPATH, f"//a[contains(@href, '/build.php?id={building_slot}&category={i}')]"))
+                locator('building_category_tab', slot=building_slot, category=i))
             )
 
             infrastructure_tab.click()
         except TimeoutException: # if tab not found we have another helper popup, dismiss it then retry
             popup_next_button = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-                (By.XPATH, "//*[@id='contextualHelp']/div/div[2]/nav/button"))
+                locator('contextual_help_next_button'))
             )
 
             # dismiss initial helper dialog
@@ -321,9 +2563,7 @@ def construct_building_in_slot(driver, building, building_slot):
 def wall_built(driver):
     navigate_to_buildings(driver)
 
-    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, "//*[@id='villageContent']/div[22]"))
-    )
+    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(locator('wall_slot')))
 
     if building_slot.get_attribute('data-name'):
         return True
@@ -333,9 +2573,7 @@ def wall_built(driver):
 def construct_wall(driver):
     navigate_to_buildings(driver)
 
-    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, "//*[@id='villageContent']/div[22]"))
-    )
+    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(locator('wall_slot')))
 
     if not can_build(building_slot):
         return
@@ -344,7 +2582,7 @@ def construct_wall(driver):
 
     # wall is the only building allowed in slot 40, build button for it will be the only one that exists on the page
     try:
-        build_button = driver.find_element(By.CSS_SELECTOR, '.textButtonV1.green.new')
+        build_button = driver.find_element(*locator('new_building_button'))
         build_button.click()
     except NoSuchElementException:
         print("Wall has already been constructed!")
@@ -353,16 +2591,14 @@ def construct_wall(driver):
 def upgrade_mission_clay_field(driver):
     navigate_to_resource_fields(driver)
 
-    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, "//a[contains(@href, '/build.php?id=5')]"))
-    )
+    building_slot = WebDriverWait(driver, 5).until(EC.presence_of_element_located(locator('building_slot', slot=5)))
 
     if not can_build(building_slot):
         return
 
     driver.execute_script(JS_CLICK, building_slot) # use javascript to get around helper popup
 
-    button_upgrade = driver.find_element(By.CSS_SELECTOR, '.textButtonV1.green.build')
+    button_upgrade = driver.find_element(*locator('upgrade_button'))
     if '2' in button_upgrade.text:
         button_upgrade.click()
     else:
@@ -391,8 +2627,8 @@ def get_resources_from_hero(driver, resource_type=-1):
 
         # if we have all res types, max res index will be iron at position 4, no need to go beyond this
         for i in range(1, 5):
-            item = driver.find_element(By.CSS_SELECTOR, f'.heroItems.filter_all > div:nth-child({i})')
-            item_type = item.find_element(By.XPATH, './div[1]').get_attribute('class')
+            item = driver.find_element(*locator('hero_item', n=i))
+            item_type = item.find_element(*locator('hero_item_icon')).get_attribute('class')
 
             id_str = ''.join(filter(str.isdigit, item_type))
             item_id = int(id_str) if id_str else -1
@@ -403,10 +2639,9 @@ def get_resources_from_hero(driver, resource_type=-1):
 
                 try:
                     input_amount = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-                        (By.XPATH, '//*[@id="consumableHeroItem"]/label/input'))
+                        locator('hero_item_amount_input'))
                     )
-                    time.sleep(0.3) # wait to allow time for value to load
-                    amount = driver.execute_script("return arguments[0].value;", input_amount)
+                    amount = wait_until(driver, input_value_populated(input_amount), replaces_sleep=0.3)
                     #amount = input_amount.get_attribute('value')
                 except StaleElementReferenceException:
                     continue
@@ -418,11 +2653,9 @@ def get_resources_from_hero(driver, resource_type=-1):
                 #input_amount.send_keys(str(amount_to_collect))
 
                 
-                button_transfer = driver.find_element(
-                    By.CSS_SELECTOR, '.textButtonV2.buttonFramed.rectangle.withText.green'
-                )
+                button_transfer = driver.find_element(*locator('hero_transfer_button'))
 
-                time.sleep(1) # wait to allow time for value to load
+                wait_until(driver, element_clickable_and_uncovered(button_transfer), replaces_sleep=1)
                 driver.execute_script(JS_CLICK, button_transfer)
 
                 print(f"Successfully collected resource {resource_id} (amount={amount_to_collect}) from hero.")
@@ -430,6 +2663,183 @@ def get_resources_from_hero(driver, resource_type=-1):
 
         print(f"Unable to collect resource {resource_id} from hero.")
 
+# %%
+''' adaptive intervals '''
+
+# jobs check back just after the timer they're waiting on runs out (build queue, training, hero coming back) instead
+# of at a random point in a fixed range. the fixed ranges are still used when the page had no timer to go on
+EVENT_JITTER = (5, 40) # seconds after the event, so we don't act the instant a timer hits zero
+MIN_CHECK_SECONDS = 30
+
+CHECK_INTERVALS = {
+    RESOURCE_FIELDS: (343, 907),
+    TRAIN_TROOPS: (1720, 3835),
+    ADVENTURES: (307, 902),
+    HERO_UPGRADE: (12542, 24333),
+}
+CANNOT_AFFORD_TROOPS_INTERVAL = (10720, 13835)
+# longest a job will wait on a timer. troops are trained with whatever resources have come in by the time we check,
+# waiting hours on a long queue would let the warehouse overflow
+MAX_EVENT_WAIT = {
+    TRAIN_TROOPS: 3835,
+}
+
+interval_sources = {} # job type -> {'timer': n, 'fallback': n}, how often a page timer decided the next check
+interval_sources_lock = threading.Lock()
+
+
+def next_check_in(job_type, event_seconds=None, interval=None):
+    low, high = interval or CHECK_INTERVALS[job_type]
+    source = 'fallback' if event_seconds is None else 'timer'
+    with interval_sources_lock:
+        counts = interval_sources.setdefault(job_type, {'timer': 0, 'fallback': 0})
+        counts[source] += 1
+
+    if event_seconds is None:
+        return calc_new_interval_between(low, high)
+    seconds = max(event_seconds + calc_new_interval_between(*EVENT_JITTER), MIN_CHECK_SECONDS)
+    return min(seconds, MAX_EVENT_WAIT.get(job_type, seconds))
+
+# %%
+''' production simulator '''
+
+# works out when a field upgrade becomes affordable from the last stock, production and storage we saw, so the
+# field job can wake up at that moment instead of polling. all accounts' fields are projected together as arrays
+
+# what the game charges for each level of a resource field as (wood, clay, iron, crop), levels 1-20
+FIELD_COSTS_BY_LEVEL = {
+    WOOD: [(40, 100, 50, 60), (65, 165, 85, 100), (110, 280, 140, 165), (185, 465, 235, 280), (310, 780, 390, 465),
+           (520, 1300, 650, 780), (870, 2170, 1085, 1300), (1450, 3625, 1810, 2175), (2420, 6050, 3025, 3630),
+           (4040, 10105, 5050, 6060), (6750, 16870, 8435, 10125), (11270, 28175, 14090, 16905),
+           (18820, 47055, 23525, 28230), (31430, 78580, 39290, 47150), (52490, 131230, 65615, 78740),
+           (87660, 219155, 109575, 131490), (146395, 365985, 182995, 219590), (244480, 611195, 305600, 366715),
+           (408280, 1020695, 510350, 612420), (681825, 1704565, 852280, 1022740)],
+    CLAY: [(80, 40, 80, 50), (135, 65, 135, 85), (225, 110, 225, 140), (375, 185, 375, 235), (620, 310, 620, 390),
+           (1040, 520, 1040, 650), (1735, 870, 1735, 1085), (2900, 1450, 2900, 1810), (4840, 2420, 4840, 3025),
+           (8080, 4040, 8080, 5050), (13500, 6750, 13500, 8435), (22540, 11270, 22540, 14090),
+           (37645, 18820, 37645, 23525), (62865, 31430, 62865, 39290), (104985, 52490, 104985, 65615),
+           (175320, 87660, 175320, 109575), (292790, 146395, 292790, 182995), (488955, 244480, 488955, 305600),
+           (816555, 408280, 816555, 510350), (1363650, 681825, 1363650, 852280)],
+    IRON: [(100, 80, 30, 60), (165, 135, 50, 100), (280, 225, 85, 165), (465, 375, 140, 280), (780, 620, 235, 465),
+           (1300, 1040, 390, 780), (2170, 1735, 650, 1300), (3625, 2900, 1085, 2175), (6050, 4840, 1815, 3630),
+           (10105, 8080, 3030, 6060), (16870, 13500, 5060, 10125), (28175, 22540, 8455, 16905),
+           (47055, 37645, 14115, 28230), (78580, 62865, 23575, 47150), (131230, 104985, 39370, 78740),
+           (219155, 175320, 65745, 131490), (365985, 292790, 109795, 219590), (611195, 488955, 183360, 366715),
+           (1020695, 816555, 306210, 612420), (1704565, 1363650, 511370, 1022740)],
+    WHEAT: [(70, 90, 70, 20), (115, 150, 115, 35), (195, 250, 195, 55), (325, 420, 325, 95), (545, 700, 545, 155),
+            (910, 1170, 910, 260), (1520, 1950, 1520, 435), (2535, 3260, 2535, 725), (4235, 5445, 4235, 1210),
+            (7070, 9095, 7070, 2020), (11810, 15185, 11810, 3375), (19725, 25360, 19725, 5635),
+            (32940, 42350, 32940, 9410), (55005, 70720, 55005, 15715), (91860, 118105, 91860, 26245),
+            (153405, 197240, 153405, 43830), (256190, 329385, 256190, 73195), (427835, 550075, 427835, 122240),
+            (714485, 918625, 714485, 204140), (1193195, 1534105, 1193195, 340915)],
+}
+MAX_FIELD_LEVEL = 20
+FIELD_NAMES = {WOOD: 'Woodcutter', CLAY: 'Clay Pit', IRON: 'Iron Mine', WHEAT: 'Cropland'}
+
+
+def build_field_cost_table():
+    # indexed [gid, level, resource], level 0 and gid 0 are left at zero so lookups need no offsets
+    costs = np.zeros((max(FIELD_COSTS_BY_LEVEL) + 1, MAX_FIELD_LEVEL + 1, len(resource_ids)))
+    for gid, levels in FIELD_COSTS_BY_LEVEL.items():
+        costs[gid, 1:] = levels
+    return costs
+
+
+FIELD_COSTS = build_field_cost_table()
+
+
+def field_upgrade_frame(villages, now=None):
+    '''
+    One row per field that could be upgraded next, across every village passed in as
+    {account: (fields, VillageResources, seen_at)}. Stock is projected forward from seen_at to now.
+    '''
+    now = time.time() if now is None else now
+    rows = []
+    for account, (fields, resources, seen_at) in villages.items():
+        if resources is None:
+            continue
+        for field in fields:
+            if field.gid in FIELD_COSTS_BY_LEVEL and not field.under_construction:
+                rows.append((account, field.position, field.slot, field.gid, field.level, now - seen_at,
+                             *(resources.stock.get(resource_id, 0) for resource_id in resource_ids),
+                             *(resources.production.get(resource_id, 0) for resource_id in resource_ids),
+                             *(resources.capacity.get(resource_id) or np.inf for resource_id in resource_ids)))
+
+    columns = ['account', 'position', 'slot', 'gid', 'level', 'elapsed'] + \
+              [f'{kind}_{resource_id}' for kind in ('stock', 'production', 'capacity') for resource_id in resource_ids]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def predict_affordable_seconds(frame):
+    # seconds from now until each row's next level is affordable, inf when it never will be at current production
+    if frame.empty:
+        return frame.assign(seconds=pd.Series(dtype=float))
+
+    stock = frame[[f'stock_{resource_id}' for resource_id in resource_ids]].to_numpy(float)
+    production = frame[[f'production_{resource_id}' for resource_id in resource_ids]].to_numpy(float)
+    capacity = frame[[f'capacity_{resource_id}' for resource_id in resource_ids]].to_numpy(float)
+    next_level = frame['level'].to_numpy() + 1
+
+    costs = FIELD_COSTS[frame['gid'].to_numpy(), np.minimum(next_level, MAX_FIELD_LEVEL)]
+    stock = np.minimum(stock + production * frame['elapsed'].to_numpy(float)[:, None] / 3600, capacity)
+    missing = np.clip(costs - stock, 0, None)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        seconds = np.where(missing > 0, np.where(production > 0, missing / production * 3600, np.inf), 0).max(axis=1)
+    seconds[(costs > capacity).any(axis=1) | (next_level > MAX_FIELD_LEVEL)] = np.inf # storage too small or maxed
+
+    return frame.assign(seconds=seconds)
+
+
+def next_affordable_field_seconds(index, seen_at=None):
+    # soonest any field of this village can be upgraded, None when nothing will be affordable without a change
+    predictions = predict_affordable_seconds(field_upgrade_frame({None: (index.fields, index.resources,
+                                                                         seen_at or time.time())}))
+    if predictions.empty or not np.isfinite(predictions['seconds'].min()):
+        return None
+    return float(predictions['seconds'].min())
+
+
+def project_all_villages(drivers_info):
+    # affordability of every field of every account from what the village state last saw, without loading a page
+    villages = {}
+    for driver in drivers_info.keys():
+        village = village_of(driver)
+        with village.lock:
+            fields = village.values.get('fields')
+            resources = village.values.get('resources')
+            seen_at = village.updated.get('resources')
+        if fields and resources and seen_at:
+            villages[str(drivers_info[driver]['Username'])] = (fields, resources, seen_at)
+    return predict_affordable_seconds(field_upgrade_frame(villages))
+
+
+def print_upgrade_projection_report(drivers_info, per_account=3):
+    # the next few field upgrades each account can afford and when, straight from project_all_villages
+    projection = project_all_villages(drivers_info)
+    projection = projection[projection['level'] < MAX_FIELD_LEVEL].sort_values(['account', 'seconds', 'level'])
+
+    table = Table(title="Field Upgrade Projection", box=box.DOUBLE, safe_box=False)
+    table.add_column("Account", style="cyan", no_wrap=True)
+    table.add_column("Field", style="magenta")
+    table.add_column("Level", style="yellow")
+    table.add_column("Cost (wood/clay/iron/crop)", style="blue", no_wrap=True)
+    table.add_column("Affordable In", style="green")
+    for account, rows in projection.groupby('account', sort=False):
+        for row in rows.head(per_account).itertuples():
+            cost = FIELD_COSTS[row.gid, min(row.level + 1, MAX_FIELD_LEVEL)]
+            if row.seconds == 0:
+                affordable_in = "now"
+            elif np.isfinite(row.seconds):
+                affordable_in = str(timedelta(seconds=int(row.seconds)))
+            else:
+                affordable_in = "not at current production/storage"
+            table.add_row(account, f"{FIELD_NAMES[row.gid]} (slot {row.slot})", f"{row.level} -> {row.level + 1}",
+                          '/'.join(f"{amount:,.0f}" for amount in cost), affordable_in)
+    console.print(table)
+
+    return projection
+
 # %%
 ''' resource field upgrade job '''
 
@@ -488,89 +2898,132 @@ def can_afford_resource_field_upgrade(driver):
 '''
 
 
-def find_lowest_level_field_of_type(driver, gid):
-    navigate_to_resource_fields(driver)
+# base hourly production of a resource field by level, used to weigh what an upgrade is worth
+FIELD_PRODUCTION_BY_LEVEL = [2, 5, 9, 15, 22, 33, 50, 70, 100, 145, 200, 280, 375, 495, 635, 800, 1000, 1300, 1600,
+                             2000, 2450, 3050]
+DEFAULT_UPGRADE_POLICY = 'lowest_first'
 
-    resource_field_container = driver.find_element(By.CSS_SELECTOR, '#resourceFieldContainer')
-    resource_field_links = resource_field_container.find_elements(By.TAG_NAME, 'a')
-    num_res_fields = len(resource_field_links)
 
-    target_fields = []
-    for i in range(2, num_res_fields + 1): # start at 2 to skip village center
-        link = driver.find_element(By.XPATH, f'//*[@id="resourceFieldContainer"]/a[{i}]')
-        if 'good' in link.get_attribute('class') and f'gid{gid}' in link.get_attribute('class'):
-            target_fields.append(link)
+def upgradable_fields(index, gid=None):
+    groups = [index.by_gid.get(gid, ())] if gid is not None else index.by_gid.values()
+    return [field for group in groups for field in group if field.upgradable and not field.under_construction]
 
-    lowest_level_field = None
-    lowest_level = 999
 
-    for field in target_fields:
-        if 'underConstruction' in field.get_attribute('class'):
-            continue
+def lowest_first(index):
+    candidates = upgradable_fields(index)
+    return min(candidates, key=lambda field: (field.level, field.gid, field.position)) if candidates else None
 
-        curr_level = int(field.find_element(By.XPATH, './div').text.strip() or 0)
-        if curr_level < lowest_level:
-            lowest_level_field = field
-            lowest_level = curr_level
 
-    return lowest_level_field
+def production_weighted_roi(index):
+    # production gained per unit of cost, boosted for resources we produce less of than the others
+    candidates = upgradable_fields(index)
+    if not candidates:
+        return None
 
+    production = index.resources.production if index.resources else {}
+    mean_production = sum(max(amount, 1) for amount in production.values()) / len(production) if production else 1
 
-def attempt_to_upgrade_lowest_level_field(drivers_info, driver, scheduler=None, retry_attempts=1):
-    navigate_to_resource_fields(driver)
+    def roi(field):
+        level = min(field.level, len(FIELD_PRODUCTION_BY_LEVEL) - 2)
+        gain = FIELD_PRODUCTION_BY_LEVEL[level + 1] - FIELD_PRODUCTION_BY_LEVEL[level]
+        demand = mean_production / max(production.get(field.gid, mean_production), 1)
+        return gain / FIELD_COSTS[field.gid, min(field.level + 1, MAX_FIELD_LEVEL)].sum() * demand
 
-    try: # check if building queue is full before attempting field upgrade, skip if queue full
-        building_list = driver.find_element(By.CSS_SELECTOR, '.buildingList')
-        buildings_being_built = building_list.find_elements(By.TAG_NAME, 'li')
+    return max(candidates, key=lambda field: (roi(field), -field.position))
 
-        if (not drivers_info[driver]['Gold Club'] and len(buildings_being_built) >= 1) or \
-           (    drivers_info[driver]['Gold Club'] and len(buildings_being_built) >= 2):
-            logs[f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}'] = \
-                "Unable to upgrade resource field! Building queue full, skipping upgrade attempt."
-            
-            if scheduler:
-                scheduler.add_job(attempt_to_upgrade_lowest_level_field, 'interval',
-                                  seconds=calc_new_interval_between(343, 907),
-                                  id=f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}',
-                                  args=[drivers_info, driver, scheduler], replace_existing=True)
 
-            return
+def balanced_by_warehouse(index):
+    # upgrade whichever resource is furthest from filling its warehouse/granary, the others are already piling up
+    resources = index.resources
+    if resources is None or None in resources.capacity.values():
+        return lowest_first(index)
 
-    except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}'] = "Nothing currently being built, proceeding."
+    for gid in sorted(resource_ids, key=lambda gid: resources.stock[gid] / max(resources.capacity[gid], 1)):
+        candidates = upgradable_fields(index, gid)
+        if candidates:
+            return candidates[0] # groups are already lowest level first
+    return None
 
-    lowest_level_field = None
-    lowest_level = 999
-    gid_types = [WOOD, CLAY, IRON, WHEAT]  # List of gid types you want to check
 
-    for gid in gid_types:
-        field = find_lowest_level_field_of_type(driver, gid)
-        if field:
-            curr_level = int(field.find_element(By.XPATH, './div').text.strip() or 0)
-            if curr_level < lowest_level:
-                lowest_level_field = field
-                lowest_level = curr_level
+UPGRADE_POLICIES = {
+    'lowest_first': lowest_first,
+    'roi': production_weighted_roi,
+    'balanced': balanced_by_warehouse,
+}
 
-    if lowest_level_field:
-        lowest_level_field.click()
 
-        button_upgrade = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-            (By.CSS_SELECTOR, '.textButtonV1.green.build'))
-        )
-        button_upgrade.click()
+def upgrade_policy_for(drivers_info, driver):
+    # per-account 'Upgrade Policy' column in the accounts sheet, blank means the default
+    name = drivers_info[driver].get('Upgrade Policy')
+    return UPGRADE_POLICIES.get(name if isinstance(name, str) else DEFAULT_UPGRADE_POLICY, lowest_first)
+
+
+def find_lowest_level_field_of_type(driver, gid, index=None):
+    if index is None:
+        navigate_to_resource_fields(driver)
+        index = index_resource_fields(take_snapshot(driver))
+
+    target_fields = upgradable_fields(index, gid)
+    if not target_fields:
+        return None
+    return driver.find_element(*locator('resource_field', slot=target_fields[0].slot))
+
+
+@driver_steps
+def attempt_to_upgrade_lowest_level_field(drivers_info, driver, scheduler=None, retry_attempts=1):
+    # check if building queue is full before attempting field upgrade, skip if queue full. a queue we already know
+    # is full doesn't need the page at all
+    queue_size = 2 if drivers_info[driver]['Gold Club'] else 1
+    buildings_being_built = village_of(driver).current('build_queue')
+    if buildings_being_built is None or len(buildings_being_built) < queue_size:
+        yield from navigate_to_resource_fields.steps(driver)
+
+        # one read of dorf1 has both the building queue and every field
+        snapshot = yield call(take_snapshot, driver)
+        buildings_being_built = parse_build_queue(snapshot)
+
+    if len(buildings_being_built) >= queue_size:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}',
+            "Unable to upgrade resource field! Building queue full, skipping upgrade attempt.")
+        
+        if scheduler: # a slot frees up when the first building in the queue finishes
+            scheduler.add_job(job_func_for(scheduler, RESOURCE_FIELDS), 'interval',
+                              seconds=next_check_in(RESOURCE_FIELDS, buildings_being_built[0]),
+                              id=f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}',
+                              args=[drivers_info, driver, scheduler], replace_existing=True)
+
+        return
+
+    if not buildings_being_built:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}', "Nothing currently being built, proceeding.")
+
+    index = index_resource_fields(snapshot)
+    field_to_upgrade = upgrade_policy_for(drivers_info, driver)(index)
+    affordable_in = None
+
+    if field_to_upgrade:
+        field = yield call(driver.find_element, *locator('resource_field', slot=field_to_upgrade.slot))
+        yield call(field.click)
 
-        logs[f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}'] = "Began upgrading resource field."
+        button_upgrade = yield wait(driver, EC.presence_of_element_located(locator('upgrade_button')), timeout=5)
+        yield call(button_upgrade.click)
+
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}', "Began upgrading resource field.")
+        buildings_being_built = parse_build_queue((yield call(read_snapshot, driver, '/dorf1.php')))
     else: # if no available fields to upgrade, none can be afforded
         #if not can_afford_resource_field_upgrade(driver):
         #if retry_attempts > 0:
-        logs[f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}'] = "Not enough resources to upgrade!"
-        #logs[f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}'] = "Not enough resources to upgrade! Refilling resources and trying again."
+        affordable_in = next_affordable_field_seconds(index)
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}', "Not enough resources to upgrade!" +
+                       (f" Next upgrade affordable in {int(affordable_in)}s." if affordable_in is not None else ""))
+        #job_states.log(f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}', "Not enough resources to upgrade! Refilling resources and trying again.")
         #get_resources_from_hero(driver)
         #attempt_to_upgrade_lowest_level_field(drivers_info, driver, scheduler, retry_attempts - 1)
 
-    if scheduler:
-        scheduler.add_job(attempt_to_upgrade_lowest_level_field, 'interval',
-                          seconds=calc_new_interval_between(343, 907),
+    if scheduler: # wait on the queue once it's full, otherwise on resources coming in for the next upgrade
+        queue_full = len(buildings_being_built) >= queue_size
+        scheduler.add_job(job_func_for(scheduler, RESOURCE_FIELDS), 'interval',
+                          seconds=next_check_in(RESOURCE_FIELDS, buildings_being_built[0] if queue_full else affordable_in),
                           id=f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}',
                           args=[drivers_info, driver, scheduler], replace_existing=True)
 
@@ -588,100 +3041,133 @@ def convert_timer_time_to_seconds(time_str): # in format of HH:MM:SS
 
 
 
-def incoming_attack(drivers_info, driver, scheduler):
+# the dorf1 movements table only shows when the next attack lands, when it counts more than one the rally point is
+# read for every landing time. the poll tightens as the earliest landing gets close and a spend job is reserved on
+# the driver's queue so raids can't push it past the margin
+HOSTILE_MOVEMENT_KINDS = ('att1',)
+RALLY_POINT_INCOMING = '/build.php?id=39&gid=16&tt=1'
+SPEND_MARGIN = 120 # seconds before landing to spend everything
+ATTACK_POLL_INTERVAL = (678, 876)
+MIN_ATTACK_POLL_SECONDS = 20
+LANDING_TOLERANCE = 5 # landing times this close together are the same attack seen twice
 
-    navigate_to_resource_fields(driver)
+attack_deadlines = {} # username -> sorted landing times of every known incoming attack
+spends_scheduled = {} # username -> landing times a spend job has already been scheduled for
+attack_deadlines_lock = threading.Lock()
 
-    try:
-        troop_movements_container = driver.find_element(By.ID, 'movements')
-    except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}'] = "No troop movements found."
-        
-        scheduler.add_job(incoming_attack, 'interval',
-                          seconds=calc_new_interval_between(678, 876),
-                          id=f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}',
-                          args=[drivers_info, driver, scheduler], replace_existing=True)
-        
-        return
-    
-    try:
-        incoming_troops_row = troop_movements_container.find_element(By.XPATH, ".//th[contains(text(), 'Incoming')]")
-    except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}'] = "No incoming troops found."
 
-        scheduler.add_job(incoming_attack, 'interval',
-                          seconds=calc_new_interval_between(678, 876),
-                          id=f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}',
-                          args=[drivers_info, driver, scheduler], replace_existing=True)
-
-        return
-
-    troop_movements_rows = troop_movements_container.find_elements(By.TAG_NAME, 'tr')
-    for troop_movement in troop_movements_rows:
-        try:
-            th = troop_movement.find_element(By.TAG_NAME, 'th')
-            if 'Outgoing' in th.text: # if we've hit the Outgoing Troops row/section, we're done
-                break
-            else: # else this is the Incoming Troops row, skip it
-                continue
-        except NoSuchElementException: # if no th element found, this is a troop movement
-            pass
+def incoming_landing_times(driver, troop_movements, now):
+    hostile = [movement for movement in troop_movements or ()
+               if movement.direction == 'incoming' and movement.kind in HOSTILE_MOVEMENT_KINDS
+               and movement.seconds_left is not None]
+    seconds_left = [movement.seconds_left for movement in hostile]
+    complete = True
 
+    if sum(movement.count for movement in hostile) > len(hostile):
         try:
-            img = troop_movement.find_element(By.XPATH, './td/a/img')
-        except NoSuchElementException:
-            logs[f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}'] = "No image found."
-            continue
-
-        if 'att1' in img.get_attribute('class'):
-            timer = troop_movement.find_element(By.CSS_SELECTOR, '.timer')
-            seconds_till_attack = convert_timer_time_to_seconds(timer.text)
+            attacks = parse_incoming_attacks(read_snapshot(driver, RALLY_POINT_INCOMING))
+            seconds_left = [attack.seconds_left for attack in attacks] or seconds_left
+            complete = bool(attacks)
+        except Exception as e:
+            print(f"Unable to read rally point, only tracking the earliest attack: {e}")
+            complete = False
+
+    return sorted(now + timedelta(seconds=seconds) for seconds in seconds_left), complete
+
+
+def track_incoming_attacks(username, landings, complete, now):
+    with attack_deadlines_lock:
+        deadlines = [landing for landing in landings if landing > now]
+        if not complete: # keep later attacks seen before that this read couldn't see
+            for known in attack_deadlines.get(username, []):
+                if known > now and known > landings[0] and \
+                   all(abs((known - landing).total_seconds()) > LANDING_TOLERANCE for landing in deadlines):
+                    deadlines.append(known)
+        deadlines.sort()
+        attack_deadlines[username] = deadlines
+        spends_scheduled[username] = [landing for landing in spends_scheduled.get(username, []) if landing > now]
+        return list(deadlines)
+
+
+def attack_poll_seconds(deadlines, now):
+    if not deadlines:
+        return calc_new_interval_between(*ATTACK_POLL_INTERVAL)
+
+    seconds_till_spend = (deadlines[0] - now).total_seconds() - SPEND_MARGIN
+    if seconds_till_spend <= 0: # spend time has passed, look again right after it lands to find the next one
+        seconds_till_landing = (deadlines[0] - now).total_seconds()
+        return max(seconds_till_landing + LANDING_TOLERANCE, MIN_ATTACK_POLL_SECONDS)
+
+    # check back halfway to the spend time so a changed landing time is picked up with room to spare
+    return min(max(seconds_till_spend / 2, MIN_ATTACK_POLL_SECONDS), calc_new_interval_between(*ATTACK_POLL_INTERVAL))
+
+
+def schedule_spend_before(drivers_info, driver, scheduler, landing, now):
+    username = drivers_info[driver]["Username"]
+    with attack_deadlines_lock:
+        if any(abs((landing - scheduled).total_seconds()) <= LANDING_TOLERANCE
+               for scheduled in spends_scheduled.get(username, [])):
+            return False # this attack already has its spend job
+        spends_scheduled.setdefault(username, []).append(landing)
+
+    # a spend job still waiting for an earlier attack gets replaced, that attack has landed or been recalled
+    job_id = f'{username}_{SPEND_ALL_RESOURCES}'
+    run_at = max(landing - timedelta(seconds=SPEND_MARGIN), now)
+    scheduler.add_job(job_func_for(scheduler, SPEND_ALL_RESOURCES), 'date', run_date=run_at, id=job_id,
+                      args=[drivers_info, driver, landing], replace_existing=True)
+    reserve_driver(driver, job_id, run_at)
+    return True
 
-            logs[f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}'] = "Incoming attack found! Setting job to spend all resources before attack lands."
-            
-            scheduler.add_job(spend_all_resources_on_troop_production, 'date',
-                              run_date=datetime.now() + timedelta(seconds=seconds_till_attack - 120),
-                              id=f'{drivers_info[driver]["Username"]}_{SPEND_ALL_RESOURCES}',
-                              args=[drivers_info, driver], replace_existing=True)
 
-            return True, seconds_till_attack
+@driver_steps
+def incoming_attack(drivers_info, driver, scheduler=None):
+    username = drivers_info[driver]["Username"]
+    now = datetime.now(timezone.utc)
 
-    logs[f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}'] = "No incoming attacks!"
+    troop_movements = village_of(driver).current('troop_movements')
+    if troop_movements is None: # stale, or dorf1 had no movements table last time, either way look again
+        troop_movements = parse_troop_movements((yield call(read_snapshot, driver, '/dorf1.php',
+                                                            navigate_to_resource_fields)))
+    landings, complete = yield call(incoming_landing_times, driver, troop_movements, now)
+    deadlines = track_incoming_attacks(username, landings, complete, now)
+
+    if troop_movements is None:
+        job_states.log(f'{username}_{CHECK_FOR_INCOMING_ATTACKS}', "No troop movements found.")
+    elif not deadlines:
+        job_states.log(f'{username}_{CHECK_FOR_INCOMING_ATTACKS}', "No incoming attacks!")
+    else:
+        if not scheduler: # one-shot, nothing to schedule the spend job on
+            log_msg = "Incoming attack found!"
+        elif schedule_spend_before(drivers_info, driver, scheduler, deadlines[0], now):
+            log_msg = "Incoming attack found! Setting job to spend all resources before attack lands."
+        else:
+            log_msg = "Already set to spend all resources before the next attack lands."
+        job_states.log(f'{username}_{CHECK_FOR_INCOMING_ATTACKS}',
+                       f"{log_msg} {len(deadlines)} incoming, next in {int((deadlines[0] - now).total_seconds())}s.")
 
-    scheduler.add_job(incoming_attack, 'interval',
-                      seconds=calc_new_interval_between(678, 876),
-                      id=f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}',
-                      args=[drivers_info, driver, scheduler], replace_existing=True)
+    if scheduler:
+        scheduler.add_job(job_func_for(scheduler, CHECK_FOR_INCOMING_ATTACKS), 'interval',
+                          seconds=attack_poll_seconds(deadlines, now),
+                          id=f'{username}_{CHECK_FOR_INCOMING_ATTACKS}',
+                          args=[drivers_info, driver, scheduler], replace_existing=True)
 
-    return False, -1
+    return bool(deadlines), (deadlines[0] - now).total_seconds() if deadlines else -1
 
 
 def outgoing_attack(drivers_info, driver, scheduler):
-    navigate_to_resource_fields(driver)
-
-    try:
-        troop_movements_container = driver.find_element(By.ID, 'movements')
-    except NoSuchElementException:
+    troop_movements = parse_troop_movements(read_snapshot(driver, '/dorf1.php', navigate=navigate_to_resource_fields))
+    if troop_movements is None:
         print("No troop movements found.")
         return
     
-    try:
-        outgoing_troops_row = troop_movements_container.find_element(By.XPATH, ".//th[contains(text(), 'Outgoing')]")
-    except NoSuchElementException:
+    outgoing_troops = [movement for movement in troop_movements if movement.direction == 'outgoing']
+    if not outgoing_troops:
         print("No outgoing troops found.")
         return
 
-    troop_movements_rows = troop_movements_container.find_elements(By.TAG_NAME, 'tr')
-    outgoing_troops_start_index = next((i for i, element in enumerate(troop_movements_rows) if 'test' in element.text), None)
-    for troop_movement in troop_movements_rows[outgoing_troops_start_index + 1]:    
-        try:
-            img = troop_movement.find_element(By.TAG_NAME, 'img')
-        except NoSuchElementException:
-            continue
-
-        if 'def2' in img.get_attribute('class'):
-            timer = troop_movement.find_element(By.CSS_SELECTOR, '.timer')
-            seconds_till_attack = convert_timer_time_to_seconds(timer.text)
+    for troop_movement in outgoing_troops:
+        if troop_movement.kind == 'def2' and troop_movement.seconds_left is not None:
+            seconds_till_attack = troop_movement.seconds_left
 
             print(f"Reinforcements incoming in {seconds_till_attack} seconds.")
 
@@ -691,68 +3177,81 @@ def outgoing_attack(drivers_info, driver, scheduler):
     return False, -1
 
 
-def spend_all_resources_on_troop_production(drivers_info, driver):
-    train_troops(drivers_info, driver, drivers_info[driver]['Troop Building'], drivers_info[driver]['Troop Name'], True)
+@driver_steps
+def spend_all_resources_on_troop_production(drivers_info, driver, landing=None):
+    yield from train_troops.steps(drivers_info, driver, drivers_info[driver]['Troop Building'],
+                                  drivers_info[driver]['Troop Name'], True)
 
+    if landing is not None: # how much of the margin was left once everything was spent
+        margin = (landing - datetime.now(timezone.utc)).total_seconds()
+        job_states.log(f'{drivers_info[driver]["Username"]}_{SPEND_ALL_RESOURCES}',
+                       f"Spent all resources {int(margin)}s before the attack landed.")
 
+
+@driver_steps
 def train_troops(drivers_info, driver, building, troop_name, incoming_attack_imminent=False, scheduler=None):
-    enter_building(driver, building)
+    yield from enter_building.steps(driver, building)
 
     try:
-        link_troop_name = driver.find_element(By.XPATH, f"//a[contains(text(), '{troop_name}')]")
+        link_troop_name = yield call(driver.find_element, *locator('troop_name_link', troop_name=troop_name))
     except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}'] = \
-            "Troop not found. Please check troop name and spelling."
-    target_troop_container = link_troop_name.find_element(By.XPATH, '../../..')
+        job_states.log(f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}',
+            "Troop not found. Please check troop name and spelling.")
+        return
+    target_troop_container = yield call(link_troop_name.find_element, *locator('troop_container'))
 
     if incoming_attack_imminent:
-        button_exchange_resources = WebDriverWait(driver, 7).until(EC.element_to_be_clickable(
-            (By.XPATH, '//button[contains(text(), "Exchange resources")]'))
+        button_exchange_resources = yield wait(driver, EC.element_to_be_clickable(
+            locator('exchange_resources_button')), timeout=7
         )
-        button_exchange_resources.click()
+        yield call(button_exchange_resources.click)
 
-        button_distribute_remaining_resources = WebDriverWait(driver, 7).until(EC.element_to_be_clickable(
-            (By.XPATH, '//button[contains(text(), "Distribute remaining resources")]'))
+        button_distribute_remaining_resources = yield wait(driver, EC.element_to_be_clickable(
+            locator('distribute_resources_button')), timeout=7
         )
-        button_distribute_remaining_resources.click()
+        yield call(button_distribute_remaining_resources.click)
 
-        button_redeem = WebDriverWait(driver, 7).until(EC.element_to_be_clickable(
-            (By.XPATH, '//button[contains(text(), "Redeem")]'))
-        )
-        button_redeem.click()
+        button_redeem = yield wait(driver, EC.element_to_be_clickable(locator('redeem_button')), timeout=7)
+        yield call(button_redeem.click)
 
-        time.sleep(1) # allow page time to refresh after resource distribution
+        yield wait(driver, dom_settled(), replaces_sleep=1) # allow page time to refresh after resource distribution
 
         try: #re-init troop container to avoid stale references
-            link_troop_name = driver.find_element(By.XPATH, f"//a[contains(text(), '{troop_name}')]")
+            link_troop_name = yield call(driver.find_element, *locator('troop_name_link', troop_name=troop_name))
         except NoSuchElementException:
-            logs[f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}'] = \
-                "Troop not found. Please check troop name and spelling."
-        target_troop_container = link_troop_name.find_element(By.XPATH, '../../..')
+            job_states.log(f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}',
+                "Troop not found. Please check troop name and spelling.")
+            return
+        target_troop_container = yield call(link_troop_name.find_element, *locator('troop_container'))
 
     try: # div container changes when trainable troops is 0
-        input_num_troops_to_train = target_troop_container.find_element(By.XPATH, './div[2]/div[4]/input')
+        input_num_troops_to_train = yield call(target_troop_container.find_element, *locator('troop_amount_input'))
     except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}'] = "Cannot afford to train any troops!"
+        job_states.log(f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}', "Cannot afford to train any troops!")
         if scheduler:
-            scheduler.add_job(train_troops, 'interval', seconds=calc_new_interval_between(10720, 13835),
+            scheduler.add_job(job_func_for(scheduler, TRAIN_TROOPS), 'interval',
+                              seconds=next_check_in(TRAIN_TROOPS, interval=CANNOT_AFFORD_TROOPS_INTERVAL),
                               id=f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}', args=[drivers_info, driver, building, troop_name, False, scheduler],
                               replace_existing=True)
         return
     
-    max_trainable = target_troop_container.find_element(By.XPATH, "./div[2]/div[4]/a").text
+    link_max_trainable = yield call(target_troop_container.find_element, *locator('troop_max_trainable_link'))
+    max_trainable = yield call(getattr, link_max_trainable, 'text')
     max_trainable = int(max_trainable)
 
-    input_num_troops_to_train.clear()
-    input_num_troops_to_train.send_keys(max_trainable)
+    yield call(input_num_troops_to_train.clear)
+    yield call(input_num_troops_to_train.send_keys, max_trainable)
 
-    button_start_training = driver.find_element(By.ID, 's1')
-    button_start_training.click()
+    button_start_training = yield call(driver.find_element, *locator('start_training_button'))
+    yield call(button_start_training.click)
+    village_of(driver).invalidate('resources')
 
-    logs[f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}'] = f"Successfully began training {max_trainable} {troop_name}."
+    job_states.log(f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}', f"Successfully began training {max_trainable} {troop_name}.")
 
-    if scheduler:
-        scheduler.add_job(train_troops, 'interval', seconds=calc_new_interval_between(1720, 3835),
+    if scheduler: # top the queue back up once everything in it has finished training
+        training_queue = parse_training_queue((yield call(take_snapshot, driver)))
+        scheduler.add_job(job_func_for(scheduler, TRAIN_TROOPS), 'interval',
+                          seconds=next_check_in(TRAIN_TROOPS, training_queue[-1] if training_queue else None),
                           id=f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}', args=[drivers_info, driver, building, troop_name, False, scheduler],
                           replace_existing=True)
 
@@ -761,343 +3260,407 @@ def check_total_troop_counts():
     pass
 
 
-def activate_farm_list_raids_for(list_id, driver, distance_limit=float('inf'), ignore_curr_state=False):
-    try: # noob protection will be first div in "rallyPointFarmList" until shield wears off
-        list_element_xpath = f'//*[@id="rallyPointFarmList"]/div[1]/div[{list_id + 1}]'
-        list_element = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, list_element_xpath)))
-    except TimeoutException: # use second div if first is noob protection info.
-        list_element_xpath = f'//*[@id="rallyPointFarmList"]/div[2]/div[{list_id + 1}]'
-        list_element = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, list_element_xpath)))
-
-    name = list_element.find_element(By.XPATH, './div/div[1]/div[2]/div[1]').text
-
-    table = list_element.find_element(By.XPATH, './div/div[2]/table')
-    table_body = table.find_element(By.XPATH, './tbody')
-    table_footer = table.find_element(By.XPATH, './tfoot')
-    table_rows = table_body.find_elements(By.TAG_NAME, 'tr')
-
-    boxes_to_click_ids = []
-    for row_index in range(1, len(table_rows)): # purposefully removed last index to skip "Add target" row
-        row_xpath = f'{list_element_xpath}/div/div[2]/table/tbody/tr[{row_index}]'
-        try:
-            row = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, row_xpath)))
-        except TimeoutException:
-            break
+# position of an element among its parent's children, which is how the farm_list locator counts lists
+JS_CHILD_INDEX = "return Array.prototype.indexOf.call(arguments[0].parentNode.children, arguments[0]);"
+
+# returns every row of a farm list in one round-trip, selectors mirror the class lookups in parse_farm_lists
+JS_READ_FARM_LIST = """
+const list = arguments[0];
+const text = (element) => element ? element.textContent.trim() : null;
+const classOf = (element) => element ? element.getAttribute('class') || '' : null;
+const table = list.querySelector('table.slots');
+const name = list.querySelector('.farmListName .name');
+const totals = table && table.querySelector('tfoot .troopsSummary .value');
+const rows = table ? Array.from(table.querySelectorAll(':scope > tbody > tr')) : [];
+
+return {
+    name: text(name) || '',
+    totals: text(totals) || '',
+    rows: rows.map((row, i) => {
+        const checkbox = row.querySelector('.selection .checkbox input');
+        if (!checkbox) return null;
+        const target = row.querySelector('.target a');
+        return [
+            i + 1,
+            checkbox.id || null,
+            classOf(row.querySelector('.state i')),
+            text(row.querySelector('.distance .value')),
+            text(row.querySelector('.troops .value')),
+            target ? target.getAttribute('href') : null,
+            classOf(row.querySelector('.lastRaid i')),
+        ];
+    }).filter(Boolean),
+};
+"""
+
+# ticks the given (1-based) rows of a farm list in one round-trip, clicks so the page's own handlers still fire
+JS_TICK_FARM_LIST_ROWS = """
+const rows = arguments[0].querySelectorAll('table.slots > tbody > tr');
+for (const index of arguments[1]) {
+    const checkbox = rows[index - 1] && rows[index - 1].querySelector('.selection .checkbox input');
+    if (checkbox && !checkbox.checked) checkbox.click();
+}
+"""
+
+
+def read_farm_list(driver, list_element, list_id):
+    result = driver.execute_script(JS_READ_FARM_LIST, list_element)
+    troops_used, troops_available = parse_troop_totals(result['totals'])
+
+    return FarmList(
+        index=list_id,
+        name=result['name'],
+        rows=[make_farm_list_row(*row) for row in result['rows']],
+        troops_used=troops_used,
+        troops_available=troops_available,
+    )
+
+
+def oasis_hrefs_to_check(farm_list, distance_limit):
+    # oases we lost troops at last time, whether they're still occupied decides if they get raided again
+    return [row.target_href for row in farm_list.rows if row.last_raid_had_losses and row.distance <= distance_limit]
 
-        checkbox_xpath = None
-        try:
-            checkbox = row.find_element(By.XPATH, './td[1]/label/input')
-            checkbox_xpath = row_xpath + '/td[1]/label/input'
-            driver.execute_script(JS_SCROLL_INTO_VIEW, checkbox)
-        except NoSuchElementException:
-            continue
 
-        curr_state_container = row.find_element(By.CSS_SELECTOR, '.state')
-        currently_attacking = False
-        try:
-            curr_state = curr_state_container.find_element(By.TAG_NAME, 'i')
-            if 'attack_small' in curr_state.get_attribute('class'):
-                currently_attacking = True
-        except NoSuchElementException:
-            currently_attacking = False
+def farm_list_rows_to_tick(driver, farm_list, distance_limit=float('inf'), ignore_curr_state=False):
+    nominator, denominator = farm_list.troops_used, farm_list.troops_available
 
-        dist_container = row.find_element(By.CSS_SELECTOR, '.distance')
-        dist = float(dist_container.find_element(By.XPATH, './span').text)
-        if dist > distance_limit:
+    rows_to_tick = []
+    for row in farm_list.rows:
+        if row.distance > distance_limit:
             break
 
-        num_troops_container = row.find_element(By.CSS_SELECTOR, '.troops')
-        num_troops = int(num_troops_container.find_element(By.XPATH, './div[1]/span[1]/span[1]').text)
-
-        try:
-            filthy_nominator = driver.find_element(By.XPATH, f'{list_element_xpath}/div/div[2]/table/tfoot/tr[1]/td[2]/div/div/span/span/span[1]').text
-            filthy_denominator = driver.find_element(By.XPATH, f'{list_element_xpath}/div/div[2]/table/tfoot/tr[1]/td[2]/div/div/span/span/span[1]').text
-            nominator   = int(re.sub(r'[^\d]', '', filthy_nominator))
-            denominator = int(re.sub(r'[^\d]', '', filthy_denominator))
-        except NoSuchElementException:
-            nominator = denominator = None
-        
-        target = row.find_element(By.CSS_SELECTOR, '.target')
-        target_link = target.find_element(By.XPATH, './a')
+        if (not row.attacking or ignore_curr_state) and \
+        (not row.last_raid_had_losses or (farm_list.name.lower() == 'oases' and not oases_has_troops(driver, row.target_href))) and \
+        ((not nominator and not denominator) or nominator + row.troops <= denominator):
+            rows_to_tick.append(row.row_index)
+    return rows_to_tick
 
-        last_raid_state_container = row.find_element(By.CSS_SELECTOR, '.lastRaid')
-        prev_attack_suffered_losses = False
-        try:
-            last_raid_state = last_raid_state_container.find_element(By.TAG_NAME, 'i')
-            if 'attack_won_withoutLosses_small' not in last_raid_state.get_attribute('class'):
-                prev_attack_suffered_losses = True
-        except NoSuchElementException:
-            prev_attack_suffered_losses = False
 
-        if (not currently_attacking or ignore_curr_state) and \
-        (not prev_attack_suffered_losses or (name.lower() == 'oases' and not oases_has_troops(driver, target_link))) and \
-        ((not nominator and not denominator) or nominator + num_troops <= denominator):
-            boxes_to_click_ids.append(checkbox_xpath)
-        
-    for id in boxes_to_click_ids:
-        try:
-            checkbox = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, id)))
-            driver.execute_script(JS_SCROLL_INTO_VIEW, checkbox)
-        except NoSuchElementException:
-            continue
+@driver_steps
+def activate_farm_list_raids_for(list_id, driver, distance_limit=float('inf'), ignore_curr_state=False):
+    # lists sit in the village wrapper whether or not the noob protection notice is shown above it
+    list_element = yield wait(driver, EC.presence_of_element_located(
+        locator('farm_list', n=list_id + 1)), timeout=5
+    )
 
-        checkbox.click()
+    farm_list = yield call(read_farm_list, driver, list_element, list_id)
+    if farm_list.name.lower() == 'oases':
+        yield call(refresh_oasis_troops_cache, driver, oasis_hrefs_to_check(farm_list, distance_limit))
+    rows_to_tick = farm_list_rows_to_tick(driver, farm_list, distance_limit, ignore_curr_state)
 
     # start raids
-    if boxes_to_click_ids:
-        list_element = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, list_element_xpath)))
-        button_start_raids = list_element.find_element(By.XPATH, './div/div[1]/button')
-        driver.execute_script(JS_SCROLL_INTO_VIEW, button_start_raids)
-        button_start_raids.click()
+    if rows_to_tick:
+        yield call(driver.execute_script, JS_TICK_FARM_LIST_ROWS, list_element, rows_to_tick)
+
+        button_start_raids = yield call(list_element.find_element, *locator('farm_list_start_button'))
+        yield call(driver.execute_script, JS_SCROLL_INTO_VIEW, button_start_raids)
+        yield call(button_start_raids.click)
 
 
+@driver_steps
 def has_gold_club_membership(drivers_info, driver, scheduler=None):
-    enter_building(driver, 'Rally Point')
+    yield from enter_building.steps(driver, 'Rally Point')
     
     try:
-        button_farm_list = driver.find_element(By.XPATH, '//a[contains(@href, "/build.php?id=39&gid=16&tt=99")]')
-        button_farm_list.click()
+        button_farm_list = yield call(driver.find_element, *locator('farm_list_link'))
+        yield call(button_farm_list.click)
+        village_of(driver).update('gold_club', True)
 
         if scheduler and scheduler.get_job(f'{drivers_info[driver]["Username"]}_{GOLD_CLUB_CHECK}'):
             scheduler.remove_job(f'{drivers_info[driver]["Username"]}_{GOLD_CLUB_CHECK}')
 
         return True
     except NoSuchElementException:
+        village_of(driver).update('gold_club', False)
         log_msg = "Please activate Travian Gold Club to gain access to farm lists."
-        logs[f'{drivers_info[driver]["Username"]}_{GOLD_CLUB_CHECK}'] = log_msg
-        logs[f'{drivers_info[driver]["Username"]}_{RAIDS}'] = log_msg
+        job_states.log(f'{drivers_info[driver]["Username"]}_{GOLD_CLUB_CHECK}', log_msg)
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RAIDS}', log_msg)
         
         if scheduler:
-            scheduler.add_job(has_gold_club_membership, 'interval', seconds=calc_new_interval_between(604, 932),
+            scheduler.add_job(job_func_for(scheduler, GOLD_CLUB_CHECK), 'interval',
+                              seconds=calc_new_interval_between(604, 932),
                               id=f'{drivers_info[driver]["Username"]}_{GOLD_CLUB_CHECK}',
                               args=[drivers_info, driver, scheduler], replace_existing=True)
         
         return False
 
 
-def oases_has_troops(driver, target):
-    target.click()
+OASIS_TROOPS_TTL = 900 # seconds before an oasis needs to be checked again
+
+oasis_troops_cache = {} # (x, y) -> (has_troops, checked_at)
+oasis_troops_cache_lock = threading.Lock()
+
 
+def coordinates_from_href(href):
+    match = re.search(r'x=(-?\d+)&(?:amp;)?y=(-?\d+)', href or '')
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def parse_oasis_has_troops(snapshot):
+    troop_info = snapshot.find(id='troop_info')
+    first_troop_row = troop_info.path('tbody/tr[1]/td') if troop_info else None
+    if first_troop_row is None:
+        return None
+    return first_troop_row.text != 'none'
+
+
+def fetch_oasis_has_troops(session, url):
     try:
-        first_troop_row = WebDriverWait(driver, 10).until(EC.presence_of_element_located(
-            (By.XPATH, '//*[@id="troop_info"]/tbody/tr[1]/td'))
-        )
-        has_troops = (first_troop_row.text != 'none')
-    except TimeoutException:
-        has_troops = True
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    return parse_oasis_has_troops(parse_snapshot(response.text))
+
+
+def refresh_oasis_troops_cache(driver, target_hrefs):
+    now = time.time()
+    stale_hrefs = {}
+    with oasis_troops_cache_lock:
+        for href in target_hrefs:
+            coordinates = coordinates_from_href(href)
+            if coordinates and now - oasis_troops_cache.get(coordinates, (None, 0))[1] > OASIS_TROOPS_TTL:
+                stale_hrefs[coordinates] = href
+
+    if not stale_hrefs:
+        return
+
+    # fetch every stale oasis in one pass outside the browser so the tab never leaves the farm list page
+    session = sync_http_session_cookies(driver)
+    current_url = driver.current_url
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda href: fetch_oasis_has_troops(session, urljoin(current_url, href)),
+                                stale_hrefs.values()))
 
-    driver.back()
-    return has_troops
+    with oasis_troops_cache_lock:
+        for coordinates, has_troops in zip(stale_hrefs.keys(), results):
+            if has_troops is not None: # failed fetches stay stale so they're retried next pass
+                oasis_troops_cache[coordinates] = (has_troops, now)
+
+
+def oases_has_troops(driver, target_href):
+    with oasis_troops_cache_lock:
+        has_troops, _ = oasis_troops_cache.get(coordinates_from_href(target_href), (None, 0))
+    return has_troops is not False # treat unknown oases as occupied, losing troops costs more than a skipped raid
 
   
 
+@driver_steps
 def send_troops_to_farm(drivers_info, driver, scheduler=None):
-    if 'build.php?id=39&gid=16&tt=99' not in driver.current_url:
-        enter_building(driver, 'Rally Point')
+    if 'build.php?id=39&gid=16&tt=99' not in (yield call(getattr, driver, 'current_url')):
+        yield from enter_building.steps(driver, 'Rally Point')
 
         try:
-            button_farm_list = driver.find_element(By.XPATH, '//a[contains(@href, "/build.php?id=39&gid=16&tt=99")]')
-            button_farm_list.click()
+            button_farm_list = yield call(driver.find_element, *locator('farm_list_link'))
+            yield call(button_farm_list.click)
         except NoSuchElementException:
-            logs[f'{drivers_info[driver]["Username"]}_{RAIDS}'] = "Please activate Travian Gold Club to gain access to farm lists."
+            job_states.log(f'{drivers_info[driver]["Username"]}_{RAIDS}', "Please activate Travian Gold Club to gain access to farm lists.")
             if scheduler:
                 scheduler.pause_job(job_id=f'{drivers_info[driver]["Username"]}_{RAIDS}')
             return
 
 
     try:
-        farm_lists_container = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-            (By.CSS_SELECTOR, '.villageWrapper'))
+        farm_lists_container = yield wait(driver, EC.presence_of_element_located(
+            locator('farm_lists_wrapper')), timeout=5
         )
     except TimeoutException:
-        logs[f'{drivers_info[driver]["Username"]}_{RAIDS}'] = "Please create a farm list to begin raiding!"
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RAIDS}', "Please create a farm list to begin raiding!")
         if scheduler:
             scheduler.pause_job(job_id=f'{drivers_info[driver]["Username"]}_{RAIDS}')
         return
 
-    farm_lists = farm_lists_container.find_elements(By.CSS_SELECTOR, '.dropContainer')
+    farm_lists = yield call(farm_lists_container.find_elements, *locator('farm_list_containers'))
     for farm_list in farm_lists:
-        name = farm_list.find_element(By.XPATH, './div/div[1]/div[2]/div[1]').text
+        name = yield call(getattr, (yield call(farm_list.find_element, *locator('farm_list_name'))), 'text')
 
-        farm_list_index = driver.execute_script("return Array.prototype.indexOf.call(arguments[0].parentNode.children, arguments[0]);", farm_list)
-        activate_farm_list_raids_for(farm_list_index, driver, distance_limit=7, ignore_curr_state=False)
+        farm_list_index = yield call(driver.execute_script, JS_CHILD_INDEX, farm_list)
+        yield from activate_farm_list_raids_for.steps(farm_list_index, driver, distance_limit=7,
+                                                      ignore_curr_state=False)
         
-        logs[f'{drivers_info[driver]["Username"]}_{RAIDS}'] = f'Finished raid logic for {name}'
+        job_states.log(f'{drivers_info[driver]["Username"]}_{RAIDS}', f'Finished raid logic for {name}')
 
 
-    logs[f'{drivers_info[driver]["Username"]}_{RAIDS}'] = "Finished raid attempt."
+    job_states.log(f'{drivers_info[driver]["Username"]}_{RAIDS}', "Finished raid attempt.")
 
     if scheduler:
-        scheduler.add_job(send_troops_to_farm, 'interval', seconds=calc_new_interval_between(548, 878),
+        scheduler.add_job(job_func_for(scheduler, RAIDS), 'interval', seconds=calc_new_interval_between(548, 878),
                           id=f'{drivers_info[driver]["Username"]}_{RAIDS}',
                           args=[drivers_info, driver, scheduler], replace_existing=True)
 
 # %%
 ''' mission/daily rewards collection jobs '''
 
+@driver_steps
 def collect_mission_resources(drivers_info, driver, scheduler=None):
     # button should exist on all pages, if not we've encountered an error. Refresh page and try again
-    try:
-        button_mentor = driver.find_element(By.ID, 'questmasterButton')
-    except NoSuchElementException:
-        driver.refresh()
-        button_mentor = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-            (By.ID, 'questmasterButton'))
-        )
-
-    try:
-        speech_bubble = button_mentor.find_element(By.XPATH, './div')
-    except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}'] = "No mission resources to collect!"
+    snapshot = yield call(read_snapshot, driver, '/dorf1.php')
+    if snapshot.find(id='questmasterButton') is None:
+        yield call(driver.refresh)
+        yield wait(driver, EC.presence_of_element_located(locator('quest_master_button')), timeout=5)
+        snapshot = yield call(take_snapshot, driver)
+
+    speech_bubble = snapshot.find(id='questmasterButton').path('div')
+    if speech_bubble is None:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}', "No mission resources to collect!")
         if scheduler:
-            scheduler.add_job(collect_mission_resources, 'interval', seconds=calc_new_interval_between(343, 907),
+            scheduler.add_job(job_func_for(scheduler, COLLECT_MISSION_RESOURCES), 'interval',
+                              seconds=calc_new_interval_between(343, 907),
                               id=f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}', 
                               args=[drivers_info, driver, scheduler], replace_existing=True)
         return
 
-    button_mentor.click()
+    button_mentor = yield call(driver.find_element, *locator('quest_master_button'))
+    yield call(button_mentor.click)
 
-    task_overview = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, '.taskOverview')))    
+    task_overview = yield wait(driver, EC.presence_of_element_located(locator('task_overview')), timeout=5)
 
-    task_list = task_overview.find_elements(By.XPATH, './div')
+    task_list = yield call(task_overview.find_elements, *locator('tasks'))
     for task in task_list:
-        if 'achieved' in task.get_attribute('class'):
-            button_collect = task.find_element(By.TAG_NAME, 'button')
-            button_collect.click()
+        if 'achieved' in (yield call(task.get_attribute, 'class')):
+            button_collect = yield call(task.find_element, *locator('button'))
+            yield call(button_collect.click)
     
 
-    logs[f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}'] = "Successfully collected mission resources."
+    job_states.log(f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}', "Successfully collected mission resources.")
     if scheduler:
-        scheduler.add_job(collect_mission_resources, 'interval', seconds=calc_new_interval_between(343, 907),
+        scheduler.add_job(job_func_for(scheduler, COLLECT_MISSION_RESOURCES), 'interval',
+                          seconds=calc_new_interval_between(343, 907),
                           id=f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}',
                           args=[drivers_info, driver, scheduler], replace_existing=True)
 
 
+@driver_steps
 def collect_daily_quests_rewards(drivers_info, driver, scheduler=None):
-    button_daily_quests = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, '//*[@id="navigation"]/a[7]'))
-    )
+    button_daily_quests = yield wait(driver, EC.presence_of_element_located(locator('daily_quests_button')), timeout=5)
 
     try:
-        indicator = button_daily_quests.find_element(By.XPATH, './div')
+        indicator = yield call(button_daily_quests.find_element, *locator('indicator'))
     except NoSuchElementException:
-        logs[f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}'] = "No rewards to collect!"
+        job_states.log(f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}', "No rewards to collect!")
         if scheduler:
-            scheduler.add_job(collect_daily_quests_rewards, 'interval',
+            scheduler.add_job(job_func_for(scheduler, COLLECT_DAILY_QUEST_REWARDS), 'interval',
                               seconds=calc_new_interval_between(24112, 43022),
                               id=f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}',
                               args=[drivers_info, driver, scheduler], replace_existing=True)
         return
 
-    button_daily_quests.click()
+    yield call(button_daily_quests.click)
 
-    achievement_reward_list = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.ID, 'achievementRewardList'))
+    achievement_reward_list = yield wait(driver, EC.presence_of_element_located(
+        locator('achievement_reward_list')), timeout=5
     )
-    reward_containers = achievement_reward_list.find_elements(By.CSS_SELECTOR, '.achievement')
+    reward_containers = yield call(achievement_reward_list.find_elements, *locator('achievements'))
     for container in reward_containers:
         try:
-            reward_ready_icon = container.find_element(By.CSS_SELECTOR, '.bigSpeechBubble.rewardReady')
+            reward_ready_icon = yield call(container.find_element, *locator('reward_ready_icon'))
         except NoSuchElementException:
-            logs[f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}'] = "Reward not ready!"
+            job_states.log(f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}', "Reward not ready!")
             continue
 
-        container.click()
+        yield call(container.click)
 
-        button_collect_reward = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, '.textButtonV1.green.questButtonGainReward')))
-        button_collect_reward.click()
+        button_collect_reward = yield wait(driver, EC.presence_of_element_located(locator('gain_reward_button')),
+                                           timeout=5)
+        yield call(button_collect_reward.click)
 
-    logs[f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}'] = "Successfully collected mission resources."
+    job_states.log(f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}', "Successfully collected mission resources.")
     
     if scheduler:
-        scheduler.add_job(collect_daily_quests_rewards, 'interval', seconds=calc_new_interval_between(24112, 43022),
+        scheduler.add_job(job_func_for(scheduler, COLLECT_DAILY_QUEST_REWARDS), 'interval',
+                          seconds=calc_new_interval_between(24112, 43022),
                           id=f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}',
                           args=[drivers_info, driver, scheduler], replace_existing=True)
 
 # %%
 ''' hero jobs '''
 
+@driver_steps
 def attempt_to_start_adventure(drivers_info, driver, scheduler=None):
-    # hero button should exist on all pages, if not we've encountered an error. Refresh page and try again
-    try:
-        button_hero_status = driver.find_element(By.XPATH, '//*[@id="topBarHero"]/div/a/i')
-    except NoSuchElementException:
-        driver.refresh()
-        button_hero_status = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, '//*[@id="topBarHero"]/div/a/i')))
-
-
-    # dynamic ID, using href to reference
-    button_adventures = driver.find_element(By.XPATH, "//a[@href='/hero/adventures']")
-    try:
-        num_adventures = button_adventures.find_element(By.XPATH, "./div")
-    except NoSuchElementException:
-        num_adventures = None
-
-    if num_adventures and 'heroHome' in button_hero_status.get_attribute('class') and int(num_adventures.text) > 0:
-        button_adventures.click()
-
-        button_start_first_adventure = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-            (By.XPATH, '//*[@id="heroAdventure"]/table/tbody/tr[1]/td[5]/button'))
+    hero_status = village_of(driver).current('hero')
+    if hero_status is None:
+        # hero button should exist on all pages, if not we've encountered an error. Refresh page and try again
+        snapshot = yield call(read_snapshot, driver, '/dorf1.php')
+        if snapshot.find(id='topBarHero') is None:
+            yield call(driver.refresh)
+            yield wait(driver, EC.presence_of_element_located(locator('hero_status_icon')), timeout=5)
+            snapshot = yield call(take_snapshot, driver)
+
+        hero_status = parse_hero_status(snapshot)
+
+    if hero_status.adventures > 0 and hero_status.home:
+        # dynamic ID, using href to reference
+        button_adventures = yield call(driver.find_element, *locator('adventures_button'))
+        yield call(button_adventures.click)
+
+        button_start_first_adventure = yield wait(driver, EC.presence_of_element_located(
+            locator('first_adventure_button')), timeout=5
         )
-        button_start_first_adventure.click()
-
-        button_continue = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.XPATH, '//*[@id="heroAdventure"]/div/button')))
-        button_continue.click()
-
-        logs[f'{drivers_info[driver]["Username"]}_{ADVENTURES}'] = "Successfully sent out hero on adventure!"
-    elif num_adventures is None:
-        logs[f'{drivers_info[driver]["Username"]}_{ADVENTURES}'] = "No adventures found."
-    elif 'heroRunning' in button_hero_status.get_attribute('class'):
-        logs[f'{drivers_info[driver]["Username"]}_{ADVENTURES}'] = "Hero is already on an adventure!"
+        yield call(button_start_first_adventure.click)
+
+        button_continue = yield wait(driver, EC.presence_of_element_located(locator('adventure_continue_button')),
+                                     timeout=5)
+        yield call(button_continue.click)
+        village_of(driver).invalidate('hero', 'troop_movements')
+
+        job_states.log(f'{drivers_info[driver]["Username"]}_{ADVENTURES}', "Successfully sent out hero on adventure!")
+    elif not hero_status.adventures:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{ADVENTURES}', "No adventures found.")
+    elif hero_status.running:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{ADVENTURES}', "Hero is already on an adventure!")
     else:
-        logs[f'{drivers_info[driver]["Username"]}_{ADVENTURES}'] = "Error attempting to start adventure."
+        job_states.log(f'{drivers_info[driver]["Username"]}_{ADVENTURES}', "Error attempting to start adventure.")
     
-    if scheduler:
-        scheduler.add_job(attempt_to_start_adventure, 'interval', seconds=calc_new_interval_between(307, 902),
+    if scheduler: # the hero can only set out again once it's back
+        hero_away = None
+        if hero_status.running or (hero_status.adventures > 0 and hero_status.home):
+            troop_movements = village_of(driver).current('troop_movements')
+            if troop_movements is None:
+                troop_movements = parse_troop_movements((yield call(read_snapshot, driver, '/dorf1.php')))
+            hero_away = hero_return_seconds(troop_movements)
+        scheduler.add_job(job_func_for(scheduler, ADVENTURES), 'interval', seconds=next_check_in(ADVENTURES, hero_away),
                           id=f'{drivers_info[driver]["Username"]}_{ADVENTURES}', args=[drivers_info, driver, scheduler],
                           replace_existing=True)
 
 
 # possible options are 'resourceProduction', 'fightingStrength', 'offBonus', 'defBonus
+@driver_steps
 def upgrade_hero(drivers_info, driver, scheduler=None, attribute_to_upgrade='resourceProduction'):
-    level_up_icon = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, '//*[@id="topBarHero"]/i'))
-    )
-    
-    if 'show' not in level_up_icon.get_attribute('class'):
-        logs[f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}'] = "Hero has no points to spend!"
-        if scheduler:
+    hero_status = village_of(driver).current('hero') or parse_hero_status((yield call(read_snapshot, driver, '/dorf1.php')))
+    if not hero_status.level_up:
+        job_states.log(f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}', "Hero has no points to spend!")
+        if scheduler: # levelling takes several adventures, no single timer says when points will be there
             #scheduler.pause_job(job_id=f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}')
-            scheduler.add_job(upgrade_hero, 'interval', seconds=calc_new_interval_between(12542, 24333),
+            scheduler.add_job(job_func_for(scheduler, HERO_UPGRADE), 'interval', seconds=next_check_in(HERO_UPGRADE),
                               id=f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}',
                               args=[drivers_info, driver, scheduler],
                               replace_existing=True)
         return
     
-    navigate_to_hero_inventory(driver)
+    yield from navigate_to_hero_inventory.steps(driver)
 
-    button_attributes = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.XPATH, '//*[@id="heroV2"]/div[1]/div[1]/div/div[2]'))
-    )
-    button_attributes.click()
+    button_attributes = yield wait(driver, EC.presence_of_element_located(locator('hero_attributes_tab')), timeout=5)
+    yield call(button_attributes.click)
 
-    input_points = WebDriverWait(driver, 5).until(EC.presence_of_element_located(
-        (By.NAME, attribute_to_upgrade))
+    input_points = yield wait(driver, EC.presence_of_element_located(
+        locator('hero_attribute_input', attribute=attribute_to_upgrade)), timeout=5
     )
-    curr_num_points = int(input_points.get_attribute('value'))
+    curr_num_points = int((yield call(input_points.get_attribute, 'value')))
     new_num_points = curr_num_points + 4 # hero always gets 4 points to spend after leveling up
     
-    input_points.clear()
-    input_points.send_keys(str(new_num_points))
+    yield call(input_points.clear)
+    yield call(input_points.send_keys, str(new_num_points))
 
-    button_save_changes = driver.find_element(By.ID, 'savePoints')
-    time.sleep(1) # button click doesn't register if we move too fast
-    button_save_changes.click()
+    button_save_changes = yield call(driver.find_element, *locator('save_points_button'))
+    # button click doesn't register if we move too fast
+    yield wait(driver, element_clickable_and_uncovered(button_save_changes), replaces_sleep=1)
+    yield call(button_save_changes.click)
+    village_of(driver).invalidate('hero')
 
-    logs[f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}'] = f"Successfully upgraded hero and spent points on {attribute_to_upgrade}."
+    job_states.log(f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}', f"Successfully upgraded hero and spent points on {attribute_to_upgrade}.")
 
     if scheduler:
-        scheduler.add_job(upgrade_hero, 'interval', seconds=calc_new_interval_between(12542, 24333),
+        scheduler.add_job(job_func_for(scheduler, HERO_UPGRADE), 'interval', seconds=next_check_in(HERO_UPGRADE),
                           id=f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}',
                           args=[drivers_info, driver, scheduler],
                           replace_existing=True)
@@ -1119,7 +3682,7 @@ def generate_job_scheduler_table_from(drivers_info, scheduler):
     for driver in drivers_info.keys():
         drivers_info[driver]['Table'] = Table(title=f"{drivers_info[driver]['Username']}'s Scheduled Jobs",
                                               box=box.DOUBLE, safe_box=False)
-        drivers_info[driver]['Table'].width = 100
+        drivers_info[driver]['Table'].width = 150
 
     layout = Layout()
     layout.split_column(*[drivers_info[driver]['Table'] for driver in drivers_info.keys()])
@@ -1129,44 +3692,2251 @@ def generate_job_scheduler_table_from(drivers_info, scheduler):
         drivers_info[driver]['Table'].add_column("Next Run At", style="magenta")
         drivers_info[driver]['Table'].add_column("Countdown", style="green")
         drivers_info[driver]['Table'].add_column("Log", style="blue")
+        drivers_info[driver]['Table'].add_column("p50/p95/max (s)", style="yellow", no_wrap=True)
+        drivers_info[driver]['Table'].add_column("Calls", style="yellow", no_wrap=True)
 
         for job in sorted_jobs:
             if drivers_info[driver]['Username'] in job.id:
                 next_run = job.next_run_time
                 countdown = 999 if next_run is None else (next_run - now).total_seconds()
-                drivers_info[driver]['Table'].add_row(job.id, str(next_run), str(int(countdown)), logs.get(job.id, ''))
+                drivers_info[driver]['Table'].add_row(job.id, str(next_run), str(int(countdown)), job_states.message(job.id),
+                                                      *format_job_timing(job.id))
         
     return layout
 
 # %%
-''' TESTING BLOCK
-
-driver = init_webdriver()
-drivers_info = {
-    driver: {
-        'Username': 'daniel.doza',
-        'Type': 'Enforcer',
-        'Port': None,
-        'Troop Building': 'Barracks',
-        'Troop Name': 'Clubswinger',
+''' incremental dashboard '''
+
+class Countdown:
+    # seconds until run_time, worked out when rich renders the cell so rows don't need rebuilding every tick
+    __slots__ = ('run_time',)
+
+    def __init__(self, run_time):
+        self.run_time = run_time
+
+    def __rich__(self):
+        if self.run_time is None:
+            return '999'
+        return str(int((self.run_time - datetime.now(timezone.utc)).total_seconds()))
+
+
+class JobDashboard:
+    '''
+    Keeps one table per account and only rebuilds the tables whose rows changed since the last tick. Changes are
+    pushed by the job state store, jobs are mapped to their account once, the first time their id is seen.
+    '''
+
+    def __init__(self, drivers_info, states=None):
+        self.drivers_info = drivers_info
+        self.usernames = [str(drivers_info[driver]['Username']) for driver in drivers_info.keys()]
+        self.job_accounts = {} # job id -> username, None for jobs that don't belong to any account
+        self.rows = {username: {} for username in self.usernames} # username -> {job id: row state}
+        self.dirty = set(self.usernames)
+
+        self.account_layouts = {username: Layout(name=username) for username in self.usernames}
+        self.layout = Layout()
+        self.layout.split_column(*self.account_layouts.values())
+
+        self.states = job_states if states is None else states
+        self.pending = set(self.states.job_ids()) # job ids changed since the last update
+        self.pending_lock = threading.Lock()
+        self.unsubscribe = self.states.subscribe(self.job_changed)
+
+    def job_changed(self, job_id):
+        with self.pending_lock:
+            self.pending.add(job_id)
+
+    def close(self):
+        self.unsubscribe()
+
+    def account_of(self, job_id):
+        if job_id not in self.job_accounts:
+            # longest match wins in case one username is a prefix of another
+            owners = [username for username in self.usernames if job_id.startswith(f'{username}_')]
+            self.job_accounts[job_id] = max(owners, key=len) if owners else None
+        return self.job_accounts[job_id]
+
+    def sync_accounts(self):
+        # accounts hot added or removed since the last tick get their table added or dropped
+        usernames = [str(account['Username']) for account in list(self.drivers_info.values())]
+        if usernames == self.usernames:
+            return
+
+        for username in usernames:
+            if username not in self.rows:
+                self.rows[username] = {}
+                self.account_layouts[username] = Layout(name=username)
+                self.dirty.add(username)
+        for username in set(self.usernames) - set(usernames):
+            self.rows.pop(username, None)
+            self.account_layouts.pop(username, None)
+            self.dirty.discard(username)
+
+        self.usernames = usernames
+        self.job_accounts.clear() # job ids seen before their account was added are mapped again
+        with self.pending_lock:
+            self.pending.update(self.states.job_ids())
+        self.layout.split_column(*[self.account_layouts[username] for username in usernames])
+
+    def update(self):
+        self.sync_accounts()
+        with self.pending_lock:
+            changed, self.pending = self.pending, set()
+
+        for job_id in changed:
+            username = self.account_of(job_id)
+            if username is None:
+                continue
+
+            state = self.states.get(job_id)
+            if state is None or not state.scheduled:
+                if self.rows[username].pop(job_id, None) is not None:
+                    self.dirty.add(username)
+                continue
+
+            row = (state.next_run_time, state.message, state.generation)
+            if self.rows[username].get(job_id) != row:
+                self.rows[username][job_id] = row
+                self.dirty.add(username)
+
+        for username in self.dirty:
+            self.account_layouts[username].update(self.build_table(username))
+        self.dirty.clear()
+
+        return self.layout
+
+    def build_table(self, username):
+        table = Table(title=f"{username}'s Scheduled Jobs", box=box.DOUBLE, safe_box=False)
+        table.width = 150
+        table.add_column("Job ID", style="cyan", no_wrap=True)
+        table.add_column("Next Run At", style="magenta")
+        table.add_column("Countdown", style="green")
+        table.add_column("Log", style="blue")
+        table.add_column("p50/p95/max (s)", style="yellow", no_wrap=True)
+        table.add_column("Calls", style="yellow", no_wrap=True)
+
+        for job_id, (next_run, log, _) in sorted(self.rows[username].items()):
+            table.add_row(job_id, str(next_run), Countdown(next_run), log, *format_job_timing(job_id))
+        return table
+
+
+def benchmark_dashboard(account_counts=(10, 50, 100), jobs_per_account=8, ticks=20):
+    # compares per-tick cost of the full rebuild against JobDashboard, with a few jobs changing every tick
+    FakeJob = namedtuple('FakeJob', ['id', 'next_run_time'])
+
+    class FakeScheduler:
+        def __init__(self, jobs):
+            self.jobs = jobs
+
+        def get_jobs(self):
+            return list(self.jobs)
+
+    results = []
+    for account_count in account_counts:
+        now = datetime.now(timezone.utc)
+        drivers_info = {f'driver{i}': {'Username': f'account{i}'} for i in range(account_count)}
+        jobs = [FakeJob(f'account{i}_{job_type}', now + timedelta(seconds=random.uniform(0, 900)))
+                for i in range(account_count) for job_type in list(JOB_PRIORITIES)[:jobs_per_account]]
+        scheduler = FakeScheduler(jobs)
+        states = JobStateStore()
+        for job in jobs:
+            states.job_scheduled(job.id, job.next_run_time)
+
+        def tick():
+            # a handful of jobs run and reschedule themselves between ticks
+            for _ in range(max(len(jobs) // 50, 1)):
+                index = random.randrange(len(jobs))
+                jobs[index] = jobs[index]._replace(next_run_time=datetime.now(timezone.utc) + timedelta(seconds=600))
+                states.job_scheduled(jobs[index].id, jobs[index].next_run_time)
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            tick()
+            generate_job_scheduler_table_from(drivers_info, scheduler)
+        full_rebuild_ms = (time.perf_counter() - start) / ticks * 1000
+
+        dashboard = JobDashboard(drivers_info, states)
+        dashboard.update() # first tick builds everything, same as the full rebuild
+        start = time.perf_counter()
+        for _ in range(ticks):
+            tick()
+            dashboard.update()
+        incremental_ms = (time.perf_counter() - start) / ticks * 1000
+        dashboard.close()
+
+        results.append({'accounts': account_count, 'jobs': len(jobs),
+                        'full_rebuild_ms': full_rebuild_ms, 'incremental_ms': incremental_ms})
+
+    table = Table(title="Dashboard Per-Tick Cost", box=box.DOUBLE, safe_box=False)
+    table.add_column("Accounts", style="cyan")
+    table.add_column("Jobs", style="magenta")
+    table.add_column("Full Rebuild (ms)", style="red")
+    table.add_column("Incremental (ms)", style="green")
+    for result in results:
+        table.add_row(str(result['accounts']), str(result['jobs']),
+                      f"{result['full_rebuild_ms']:.2f}", f"{result['incremental_ms']:.2f}")
+    console.print(table)
+
+    return results
+
+# %%
+''' persistent jobs and warm start '''
+
+# the scheduler's job store lives in memory and job args hold live drivers, which can't be pickled into apscheduler's
+# sqlalchemy store. instead every job is written to a json file as (account, job type, trigger, next run, args) with
+# drivers/scheduler swapped for placeholders, and rebuilt against the new drivers on the next start
+JOB_STORE_PATH = os.path.expanduser('~/.travianauto/jobs.json')
+JOB_STORE_FLUSH_DELAY = 2 # seconds, batches the burst of events from one job rescheduling itself
+
+WARM_START_ACCOUNT_GAP = 15 # seconds between accounts' first runs
+WARM_START_JOB_GAP = 7 # seconds between one account's first runs, same spacing the startup block always used
+WARM_START_JITTER = (0, 5)
+# jobs the accounts sheet doesn't register, they're only ever created by other jobs and restored as saved
+RUNTIME_JOB_TYPES = (GOLD_CLUB_CHECK, SPEND_ALL_RESOURCES)
+
+
+def job_funcs():
+    # job type -> function that runs it, every job id is f'{username}_{job_type}'
+    return {
+        REFRESH: refresh_page,
+        RESOURCE_FIELDS: attempt_to_upgrade_lowest_level_field,
+        ADVENTURES: attempt_to_start_adventure,
+        HERO_UPGRADE: upgrade_hero,
+        GOLD_CLUB_CHECK: has_gold_club_membership,
+        COLLECT_MISSION_RESOURCES: collect_mission_resources,
+        COLLECT_DAILY_QUEST_REWARDS: collect_daily_quests_rewards,
+        TRAIN_TROOPS: train_troops,
+        CHECK_FOR_INCOMING_ATTACKS: incoming_attack,
+        SPEND_ALL_RESOURCES: spend_all_resources_on_troop_production,
+        RAIDS: send_troops_to_farm,
     }
-}
 
-attempt_login('https://ts2.x1.international.travian.com', drivers_info[driver]['Username'], 'Tomorrow2040!', driver)
 
-with managed_scheduler() as scheduler:
-    # enter function to test here
-    incoming_attack(drivers_info, driver, scheduler) 
+def job_func_for(scheduler, job_type):
+    # jobs scheduled by other jobs run as coroutines when the scheduler is on an event loop
+    funcs = async_job_funcs() if isinstance(scheduler, AsyncIOScheduler) else job_funcs()
+    return funcs[job_type]
+
+
+def encode_job_arg(arg, drivers_info, scheduler):
+    if arg is drivers_info:
+        return {'$': 'drivers_info'}
+    if arg is scheduler:
+        return {'$': 'scheduler'}
+    if any(arg is driver for driver in drivers_info):
+        return {'$': 'driver'}
+    if isinstance(arg, datetime):
+        return {'$datetime': arg.timestamp()}
+    return arg
+
+
+def decode_job_arg(arg, drivers_info, driver, scheduler):
+    if isinstance(arg, dict):
+        if '$datetime' in arg:
+            return datetime.fromtimestamp(arg['$datetime'], timezone.utc)
+        return {'drivers_info': drivers_info, 'driver': driver, 'scheduler': scheduler}.get(arg.get('$'), arg)
+    return arg
+
+
+class JobFileStore:
+    '''
+    Mirrors the scheduler's jobs into a json file shortly after any of them change, written to a temp file and
+    swapped in so a crash mid-write never leaves a half written store behind.
+    '''
+
+    def __init__(self, drivers_info, path=JOB_STORE_PATH):
+        self.drivers_info = drivers_info
+        self.path = path
+        self.scheduler = None
+        self.flush_timer = None
+        self.lock = threading.Lock()
+
+    def attach(self, scheduler):
+        self.scheduler = scheduler
+        scheduler.add_listener(self.job_changed, JOB_SCHEDULE_EVENTS | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+    def job_changed(self, event):
+        with self.lock:
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(JOB_STORE_FLUSH_DELAY, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def serialize(self, job):
+        driver = driver_of(job)
+        if driver not in self.drivers_info or job_type_of(job.id) is None:
+            return None
+
+        trigger = {'type': 'date'} if hasattr(job.trigger, 'run_date') else \
+                  {'type': 'interval', 'seconds': job.trigger.interval.total_seconds()}
+        return {
+            'id': job.id,
+            'username': str(self.drivers_info[driver]['Username']),
+            'job_type': job_type_of(job.id),
+            'trigger': trigger,
+            'next_run_time': job.next_run_time.timestamp() if job.next_run_time else None,
+            'args': [encode_job_arg(arg, self.drivers_info, self.scheduler) for arg in job.args],
+        }
+
+    def flush(self):
+        with self.lock:
+            self.flush_timer = None
+        if self.scheduler is None:
+            return
+
+        jobs = [job for job in map(self.serialize, self.scheduler.get_jobs()) if job is not None]
+        usernames = {str(account['Username']) for account in list(self.drivers_info.values())}
+        try:
+            with locked_json_file(self.path, {}) as data: # other shards' accounts are left as they are
+                data['jobs'] = [job for job in data.get('jobs', []) if job['username'] not in usernames] + jobs
+                data['saved_at'] = time.time()
+        except (OSError, TypeError, ValueError) as e: # an arg json can't hold shouldn't take the scheduler down
+            print(f"Unable to save jobs to {self.path}: {e}")
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('jobs', [])
+        except (OSError, ValueError):
+            return []
+
+
+def startup_jobs(drivers_info, driver, scheduler):
+    # (job type, args, interval until the job reschedules itself) every account starts with
+    jobs = [
+        (ADVENTURES, [drivers_info, driver, scheduler], 7),
+        (HERO_UPGRADE, [drivers_info, driver, scheduler], 14),
+        (COLLECT_MISSION_RESOURCES, [drivers_info, driver, scheduler], 21),
+        (COLLECT_DAILY_QUEST_REWARDS, [drivers_info, driver, scheduler], 28),
+        (CHECK_FOR_INCOMING_ATTACKS, [drivers_info, driver, scheduler], 35),
+    ]
+    if drivers_info[driver]['Upgrade Fields']:
+        jobs.append((RESOURCE_FIELDS, [drivers_info, driver, scheduler], 42))
+    if drivers_info[driver]['Type'].lower() == 'enforcer' and drivers_info[driver]['Train Troops']:
+        jobs.append((TRAIN_TROOPS, [drivers_info, driver, drivers_info[driver]['Troop Building'],
+                                    drivers_info[driver]['Troop Name'], False, scheduler], 70))
+    if drivers_info[driver]['Gold Club'] and drivers_info[driver]['Raid']:
+        jobs.append((RAIDS, [drivers_info, driver, scheduler], 90))
+
+    # for any uncaught server errors, refresh page every hour to ensure continued job executions
+    jobs.append((REFRESH, [drivers_info, driver, scheduler], 600))
+    return jobs
+
+
+def warm_start(scheduler, drivers_info, saved_jobs, now=None, funcs=None, drivers=None):
+    '''
+    Registers every account's jobs, picking up saved intervals and run times where there are any. Jobs that are
+    due (new, or overdue from before the restart) are spread out: accounts start WARM_START_ACCOUNT_GAP apart and
+    each account's jobs WARM_START_JOB_GAP apart, so a restart doesn't load every account's pages at once. Pass
+    drivers to only register those accounts, e.g. one added while the others are already running.
+    '''
+    now = datetime.now(timezone.utc) if now is None else now
+    funcs = job_funcs() if funcs is None else funcs
+    saved_by_id = {job['id']: job for job in saved_jobs}
+    planned = []
+
+    for account_index, driver in enumerate(drivers_info.keys() if drivers is None else drivers):
+        username = str(drivers_info[driver]['Username'])
+        account_start = account_index * WARM_START_ACCOUNT_GAP
+        due_count = 0
+
+        jobs = {f'{username}_{job_type}': (job_type, args, {'type': 'interval', 'seconds': seconds}, None)
+                for job_type, args, seconds in startup_jobs(drivers_info, driver, scheduler)}
+        runtime_types = [job_type for job_type in RUNTIME_JOB_TYPES
+                         if not (job_type == GOLD_CLUB_CHECK and drivers_info[driver]['Gold Club'])]
+
+        # saved interval and run time win. args still come from the sheet for the jobs it registers, in case it
+        # changed, and jobs the sheet no longer turns on are dropped
+        for job in saved_jobs:
+            if job['username'] != username or job['job_type'] not in funcs:
+                continue
+            next_run = datetime.fromtimestamp(job['next_run_time'], timezone.utc) \
+                if job['next_run_time'] is not None else None
+            if job['id'] in jobs:
+                jobs[job['id']] = (job['job_type'], jobs[job['id']][1], job['trigger'], next_run)
+            elif job['job_type'] in runtime_types:
+                args = [decode_job_arg(arg, drivers_info, driver, scheduler) for arg in job['args']]
+                jobs[job['id']] = (job['job_type'], args, job['trigger'], next_run)
+
+        for job_id, (job_type, args, trigger, next_run) in jobs.items():
+            if job_type == SPEND_ALL_RESOURCES:
+                landing = next((arg for arg in args if isinstance(arg, datetime)), None)
+                if landing is None or landing <= now:
+                    continue # that attack has already landed
+                with attack_deadlines_lock:
+                    spends_scheduled.setdefault(username, []).append(landing)
+
+            if next_run is None or next_run <= now:
+                # urgent jobs go first, everything else queues behind the account's start slot
+                offset = 0 if job_priority_of(job_id) == 0 else \
+                    account_start + due_count * WARM_START_JOB_GAP + calc_new_interval_between(*WARM_START_JITTER)
+                due_count += 1
+                next_run = now + timedelta(seconds=offset)
+
+            if trigger['type'] == 'date':
+                scheduler.add_job(funcs[job_type], 'date', run_date=next_run, id=job_id, args=args,
+                                  replace_existing=True)
+            else:
+                scheduler.add_job(funcs[job_type], 'interval', seconds=trigger['seconds'], next_run_time=next_run,
+                                  id=job_id, args=args, replace_existing=True)
+            if job_type == SPEND_ALL_RESOURCES:
+                reserve_driver(driver, job_id, next_run)
+
+            planned.append((job_id, next_run, job_id in saved_by_id))
+
+    return planned
+
+# %%
+''' driver health and recycling '''
+
+# chrome sessions that run for days grow their renderer memory and now and then a tab or chromedriver dies outright.
+# a supervisor thread probes every driver on an interval and swaps dead, bloated or simply old browsers for a fresh
+# logged in one. the swap runs as a job on the driver's own queue so it never pulls the tab out from under a job
+SUPERVISOR_INTERVAL = 60 # seconds between health checks
+PROBE_TIMEOUT = 20 # seconds, a probe shares the session with whatever job is loading a page
+PROBE_FAILURES_TO_RECYCLE = 3 # consecutive failed probes before a driver counts as dead
+MAX_DRIVER_RSS_MB = 1500
+MAX_DRIVER_AGE = 6 * 3600 # seconds, recycled on age alone even if memory still looks fine
+RECYCLE_RETRY_INTERVAL = (60, 120)
+DRIVER_HEALTH_HISTORY = 1440 # checks kept per account, a day at the default interval
+
+DriverHealth = namedtuple('DriverHealth', ['checked_at', 'alive', 'rss_mb', 'age'])
+Recycle = namedtuple('Recycle', ['recycled_at', 'reason', 'rss_mb'])
+
+driver_health = {} # username -> deque of DriverHealth
+driver_recycles = {} # username -> list of Recycle
+driver_health_lock = threading.Lock()
+
+# probes run off the supervisor thread so one hung browser can't stall the checks of every other account
+probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='driver_probe')
+
+
+def probe_driver(driver, timeout=PROBE_TIMEOUT):
+    # cheapest check there is: chromedriver is still running and the page answers a trivial script
+    try:
+        if driver.service.process.poll() is not None:
+            return False
+    except AttributeError:
+        pass
+
+    try:
+        return probe_pool.submit(driver.execute_script, 'return 1;').result(timeout=timeout) == 1
+    except (FuturesTimeoutError, WebDriverException):
+        return False
+
+
+def record_driver_health(username, health):
+    with driver_health_lock:
+        driver_health.setdefault(username, deque(maxlen=DRIVER_HEALTH_HISTORY)).append(health)
+
+
+def recycle_reason(health, failures):
+    if failures >= PROBE_FAILURES_TO_RECYCLE:
+        return 'unresponsive'
+    if health.rss_mb > MAX_DRIVER_RSS_MB:
+        return f'memory {health.rss_mb:.0f} MB'
+    if health.age > MAX_DRIVER_AGE:
+        return f'age {health.age / 3600:.1f}h'
+    return None
+
+
+def quit_driver(driver, graceful=True):
+    # grab the process tree first, once chromedriver is gone its chrome children can't be found anymore
+    processes = driver_processes(driver)
+    if graceful:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    for process in processes: # whatever quit didn't take down, or everything when the browser is hung
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+
+
+def replace_driver(drivers_info, old_driver, new_driver, scheduler):
+    # hand the queue over first so jobs submitted while their args are swapped still wait behind the recycle
+    for executor in list(driver_queue_executors):
+        executor.replace_driver(old_driver, new_driver)
+
+    # dicts can't rename a key, so the accounts after it are moved back behind the new driver to keep the account
+    # order, and with it the dashboard's layout, as it was
+    keys = list(drivers_info)
+    drivers_info[new_driver] = drivers_info[old_driver]
+    del drivers_info[old_driver]
+    for driver in keys[keys.index(old_driver) + 1:]:
+        account = drivers_info.pop(driver, None)
+        if account is not None: # removed by the accounts watcher in the meantime
+            drivers_info[driver] = account
+
+    for job in scheduler.get_jobs():
+        if driver_of(job) is old_driver:
+            scheduler.modify_job(job.id, args=[new_driver if arg is old_driver else arg for arg in job.args])
+
+    # per driver state that's still true of the account carries over, anything tied to the old browser is dropped
+    with village_states_lock:
+        if old_driver in village_states:
+            village_states[new_driver] = village_states.pop(old_driver)
+    with driver_reservations_lock:
+        if old_driver in driver_reservations:
+            driver_reservations[new_driver] = driver_reservations.pop(old_driver)
+    with wait_stats_lock:
+        if old_driver in wait_latencies:
+            wait_latencies[new_driver] = wait_latencies.pop(old_driver)
+    forget_driver(old_driver)
+
+
+def forget_driver(driver):
+    # drops everything kept per driver once its browser is gone
+    with village_states_lock:
+        village_states.pop(driver, None)
+    release_driver(driver)
+    with wait_stats_lock:
+        wait_latencies.pop(driver, None)
+    with http_sessions_lock:
+        session = http_sessions.pop(driver, None)
+        http_base_urls.pop(driver, None)
+    if session is not None:
+        session.close()
+    for key in [key for key in list(building_urls) if key[0] is driver]:
+        building_urls.pop(key, None)
+    driver_proxy_ports.pop(driver, None)
+    driver_started_at.pop(driver, None)
+    driver_accounts.pop(driver, None)
+
+
+def recycle_driver(drivers_info, driver, scheduler, site, reason):
+    if driver not in drivers_info:
+        return # an earlier recycle already replaced this browser
+
+    account = drivers_info[driver]
+    username = str(account['Username'])
+    job_id = f'{username}_{RECYCLE_DRIVER}'
+    rss_mb = driver_resource_usage(driver, sample_seconds=0)['rss_mb']
+
+    save_village_states({driver: account}) # on disk before the browser goes, in case no new one comes up
+    quit_driver(driver, graceful=reason != 'unresponsive')
+    try:
+        new_driver = start_account(site, account)
+    except WebDriverException as e:
+        print(f"Unable to restart browser for {username}: {e}")
+        new_driver = None
+
+    if new_driver is None: # old browser is already gone, keep trying since none of the account's jobs can run
+        job_states.log(job_id, f"Unable to start a new browser ({reason}), retrying.")
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=calc_new_interval_between(*RECYCLE_RETRY_INTERVAL))
+        scheduler.add_job(recycle_driver, 'date', run_date=retry_at, id=job_id,
+                          args=[drivers_info, driver, scheduler, site, reason], replace_existing=True)
+        return
+
+    replace_driver(drivers_info, driver, new_driver, scheduler)
+    with driver_health_lock:
+        driver_recycles.setdefault(username, []).append(Recycle(time.time(), reason, rss_mb))
+    job_states.log(job_id, f"Recycled browser ({reason}), released {rss_mb:.0f} MB.")
+
+
+class DriverSupervisor(threading.Thread):
+    '''
+    Checks every account's browser each interval: a probe round trip plus the RSS of its whole process tree. A
+    driver that failed PROBE_FAILURES_TO_RECYCLE probes in a row, or is over the memory or age limit, gets a
+    recycle job queued on its driver. A browser hung inside a job is only recycled once that job's command times out.
+    '''
+
+    def __init__(self, drivers_info, scheduler, site, interval=SUPERVISOR_INTERVAL):
+        super().__init__(name='driver_supervisor', daemon=True)
+        self.drivers_info = drivers_info
+        self.scheduler = scheduler
+        self.site = site
+        self.interval = interval
+        self.failures = {} # username -> consecutive failed probes
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for driver, account in list(self.drivers_info.items()):
+                try:
+                    self.check(driver, account)
+                except Exception as e: # a bad check for one account shouldn't end supervision of all of them
+                    print(f"Health check failed for {account['Username']}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+    def check(self, driver, account):
+        username = str(account['Username'])
+        job_id = f'{username}_{RECYCLE_DRIVER}'
+        if self.scheduler.get_job(job_id) is not None:
+            return # already waiting to be recycled
+
+        alive = probe_driver(driver)
+        now = time.time()
+        health = DriverHealth(now, alive, driver_resource_usage(driver, sample_seconds=0)['rss_mb'],
+                              now - driver_started_at.get(driver, now))
+        record_driver_health(username, health)
+
+        self.failures[username] = 0 if alive else self.failures.get(username, 0) + 1
+        reason = recycle_reason(health, self.failures[username])
+        if reason is None:
+            return
+
+        self.failures[username] = 0
+        job_states.log(job_id, f"Recycling browser: {reason}.")
+        self.scheduler.add_job(recycle_driver, 'date', run_date=datetime.now(timezone.utc), id=job_id,
+                               args=[self.drivers_info, driver, self.scheduler, self.site, reason],
+                               replace_existing=True)
+
+
+def print_driver_health_report(drivers_info):
+    # memory over time per account: where it is now, how it moved since the last recycle, and what recycling freed
+    table = Table(title="Browser Health", box=box.DOUBLE, safe_box=False)
+    table.add_column("Account", style="cyan", no_wrap=True)
+    table.add_column("Alive", style="magenta")
+    table.add_column("Age (h)", style="blue")
+    table.add_column("RSS (MB)", style="green")
+    table.add_column("Min / Max", style="green")
+    table.add_column("Growth (MB/h)", style="yellow")
+    table.add_column("Recycles", style="red")
+    table.add_column("Last Reason", style="red")
+
+    report = {}
+    for account in drivers_info.values():
+        username = str(account['Username'])
+        with driver_health_lock:
+            history = list(driver_health.get(username, []))
+            recycles = list(driver_recycles.get(username, []))
+        if recycles: # growth is only meaningful within one browser's lifetime
+            history = [health for health in history if health.checked_at > recycles[-1].recycled_at]
+        if not history:
+            table.add_row(username, "-", "-", "-", "-", "-", str(len(recycles)),
+                          recycles[-1].reason if recycles else "-")
+            continue
+
+        latest = history[-1]
+        rss = [health.rss_mb for health in history]
+        hours = (latest.checked_at - history[0].checked_at) / 3600
+        growth = (latest.rss_mb - history[0].rss_mb) / hours if hours else 0.0
+        report[username] = {'rss_mb': latest.rss_mb, 'min_mb': min(rss), 'max_mb': max(rss),
+                            'growth_mb_per_hour': growth, 'recycles': len(recycles),
+                            'released_mb': sum(recycle.rss_mb for recycle in recycles)}
+        table.add_row(username, "yes" if latest.alive else "no", f"{latest.age / 3600:.1f}", f"{latest.rss_mb:.0f}",
+                      f"{min(rss):.0f} / {max(rss):.0f}", f"{growth:+.1f}", str(len(recycles)),
+                      recycles[-1].reason if recycles else "-")
+
+    console.print(table)
+    return report
+
+
+def check_gold_club_memberships(drivers_info):
+    for driver in drivers_info.keys():
+        gold_club = village_of(driver).current('gold_club')
+        drivers_info[driver]['Gold Club'] = gold_club if gold_club is not None else \
+            has_gold_club_membership(drivers_info, driver, scheduler=None)
+
+
+def start_account_jobs(scheduler, drivers_info, job_store, site, funcs=None):
+    # registers or restores every account's jobs, then starts saving them and the village states and watching the
+    # browsers
+    warm_start(scheduler, drivers_info, job_store.load(), funcs=funcs)
+    job_store.attach(scheduler)
+    VillageStateSaver(drivers_info).attach()
+    supervisor = DriverSupervisor(drivers_info, scheduler, site)
+    supervisor.start()
+    return supervisor
+
+
+def stop_accounts(drivers_info):
+    with village_state_savers_lock:
+        savers = [saver for saver in village_state_savers if saver.drivers_info is drivers_info]
+    for saver in savers:
+        saver.detach()
+    save_village_states(drivers_info)
+    for driver in drivers_info.keys():
+        driver.quit()
+
+# %%
+''' account hot reload '''
+
+# the accounts file is watched while running: new accounts get a browser and their jobs, removed accounts are torn
+# down, and an account whose settings changed is restarted, all without touching the other accounts
+ACCOUNTS_POLL_INTERVAL = 10 # seconds between checks of the file's modification time
+
+
+def add_account(drivers_info, account, scheduler, job_store, site, funcs=None):
+    driver = start_account(site, account)
+    if driver is None:
+        return None
 
-    with Live(generate_job_scheduler_table_from(drivers_info, scheduler), refresh_per_second=1, console=console, vertical_overflow='visible', screen=True) as live:
+    load_village_states({driver: account})
+    check_gold_club_memberships({driver: account})
+    drivers_info[driver] = account
+    for executor in list(driver_queue_executors):
+        executor.ensure_workers(len(drivers_info))
+    warm_start(scheduler, drivers_info, job_store.load(), funcs=funcs, drivers=[driver])
+    return driver
+
+
+def remove_account(drivers_info, driver, scheduler):
+    # jobs go first so nothing new gets queued on the browser while it's being shut down
+    account = drivers_info.pop(driver, None)
+    if account is None:
+        return
+
+    for job in scheduler.get_jobs():
+        if driver_of(job) is driver:
+            scheduler.remove_job(job.id)
+    for executor in list(driver_queue_executors):
+        executor.drop_driver(driver)
+
+    save_village_states({driver: account})
+    quit_driver(driver)
+    forget_driver(driver)
+
+
+class AccountWatcher(threading.Thread):
+    '''
+    Polls the accounts file's modification time and brings the running accounts in line with it. A file that
+    can't be read, e.g. one caught half written, is skipped until it changes again. Saved jobs of a removed account
+    stay in the job file so it picks up where it left off if it's added back.
+    '''
+
+    def __init__(self, path, drivers_info, scheduler, job_store, site, funcs=None, interval=ACCOUNTS_POLL_INTERVAL):
+        super().__init__(name='account_watcher', daemon=True)
+        self.path = path
+        self.drivers_info = drivers_info
+        self.scheduler = scheduler
+        self.job_store = job_store
+        self.site = site
+        self.funcs = funcs
+        self.interval = interval
+        self.mtime = self.file_mtime() # accounts already running were read from this version
+        self.stopped = threading.Event()
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            mtime = self.file_mtime()
+            if mtime is None or mtime == self.mtime:
+                continue
+
+            self.mtime = mtime
+            try:
+                accounts = read_accounts(self.path)
+            except Exception as e:
+                print(f"Unable to read accounts from {self.path}: {e}")
+                continue
+            self.sync(accounts)
+
+    def stop(self):
+        # waits out an account that's being added so its browser isn't left running after shutdown
+        self.stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+    def sync(self, accounts):
+        wanted = {account.username: account for account in accounts}
+
+        for driver, account in list(self.drivers_info.items()):
+            username = str(account['Username'])
+            if username in wanted and wanted[username].settings() == account.settings():
+                continue
+            try:
+                remove_account(self.drivers_info, driver, self.scheduler)
+            except Exception as e: # one account failing to shut down cleanly shouldn't stop the rest syncing
+                print(f"Unable to remove {username}: {e}")
+
+        running = {str(account['Username']) for account in list(self.drivers_info.values())}
+        for username, account in wanted.items():
+            if username in running or self.stopped.is_set():
+                continue
+            try:
+                if add_account(self.drivers_info, account, self.scheduler, self.job_store, self.site,
+                               self.funcs) is None:
+                    print(f"Unable to start web driver for {username}.")
+            except Exception as e:
+                print(f"Unable to start {username}: {e}")
+
+
+def watch_accounts(path, drivers_info, scheduler, job_store, site, funcs=None):
+    watcher = AccountWatcher(path, drivers_info, scheduler, job_store, site, funcs)
+    watcher.start()
+    return watcher
+
+# %%
+''' async orchestration '''
+
+# thread mode parks a pool thread on every job for its whole run, waits included, so the pool has to grow with the
+# accounts. in async mode one event loop drives every account: jobs are written once as driver steps (see
+# driver_steps), which thread mode runs directly and async mode awaits one round trip at a time on a small bridge
+# pool, sleeping on the loop between polls, so threads stay flat however many accounts run. only plain functions
+# scheduled on a driver, like a driver recycle, still run whole on the executor's blocking pool
+ASYNC_MODE = False
+ASYNC_BRIDGE_WORKERS = 8 # threads carrying round trips for coroutine jobs, each is only held for one command
+ASYNC_BLOCKING_WORKERS = 2 # threads for the plain functions, whatever the account count
+
+async_bridge = ThreadPoolExecutor(max_workers=ASYNC_BRIDGE_WORKERS, thread_name_prefix='async_bridge')
+# round trips and wait time of the coroutine job running in the current task, the async side of current_job
+async_job_counters = contextvars.ContextVar('async_job_counters', default=None)
+
+
+async def bridge(func, *args):
+    # runs one blocking call on the bridge pool, counting its WebDriver commands and page loads against the awaiting
+    # job. run_in_executor doesn't carry context variables over to the worker thread, so they're handed over here
+    counters = async_job_counters.get()
+    visit_counts = async_visit_counts.get()
+
+    def call():
+        current_job.id = counters['job_id'] if counters is not None else None
+        current_job.round_trips = 0
+        current_visit.counts = visit_counts
+        try:
+            return func(*args)
+        finally:
+            if counters is not None:
+                counters['round_trips'] += current_job.round_trips
+            current_job.id = None
+            current_job.round_trips = None
+            current_visit.counts = None
+
+    return await asyncio.get_running_loop().run_in_executor(async_bridge, call)
+
+
+class AsyncDriver:
+    '''
+    Awaitable face of a WebDriver for coroutine jobs, any driver method or property can be awaited through it
+    (await AsyncDriver(driver).refresh(), await AsyncDriver(driver).current_url). wait_until polls the condition
+    over the bridge and sleeps on the loop in between instead of blocking a thread for the whole wait.
+    '''
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __getattr__(self, name):
+        if isinstance(getattr(type(self.driver), name, None), property): # current_url, page_source.. are commands too
+            return bridge(getattr, self.driver, name)
+
+        attr = getattr(self.driver, name)
+        if not callable(attr):
+            return attr
+
+        async def bridged(*args):
+            return await bridge(attr, *args)
+        return bridged
+
+    async def wait_until(self, condition, replaces_sleep=0, timeout=None):
+        counters = async_job_counters.get()
+        job_id = counters['job_id'] if counters else None
+        adaptive = timeout is None # fixed timeouts are left out of the account's latency, as in thread mode
+        timeout = adaptive_timeout(self.driver) if adaptive else timeout
+        start = time.perf_counter()
+        while True:
+            try:
+                result = await bridge(condition, self.driver)
+            except (NoSuchElementException, StaleElementReferenceException):
+                result = False
+            waited = time.perf_counter() - start
+            if result:
+                break
+            if waited >= timeout:
+                if adaptive:
+                    record_wait(self.driver, timeout, replaces_sleep, job_id) # slow account, let its timeouts grow
+                raise TimeoutException(f"condition not met after {timeout:.1f}s")
+            await asyncio.sleep(WAIT_POLL_FREQUENCY)
+
+        if adaptive:
+            record_wait(self.driver, waited, replaces_sleep, job_id)
+        if counters is not None:
+            counters['wait_seconds'] += waited
+        return result
+
+
+class AsyncDriverQueueExecutor(DriverQueueExecutor):
+    '''
+    DriverQueueExecutor for the AsyncIOScheduler: the same one job at a time per driver in priority order, the same
+    reservation holds and same-page visits, but each driver's queue is drained by a task on the loop. Coroutine jobs
+    run on the loop itself, plain functions like a driver recycle still run whole on the thread pool.
+    '''
+    thread_name_prefix = 'async_blocking'
+
+    def __init__(self, max_workers=10):
+        super().__init__(max_workers)
+        self._eventloop = None
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._eventloop = scheduler._eventloop
+
+    def ensure_workers(self, workers):
+        pass # only plain functions use the blocking pool, it stays the same size however many accounts are added
+
+    def _do_submit_job(self, job, run_times):
+        # the asyncio scheduler processes due jobs on the loop, so this always runs there
+        driver = driver_of(job)
+        if driver is None:
+            self._eventloop.create_task(self._run(job, run_times))
+            return
+
+        with self._queue_lock:
+            driver = self._current(driver)
+            start_draining = driver not in self._queues or driver in self._parked
+            self._parked.discard(driver)
+            heapq.heappush(self._queues.setdefault(driver, []),
+                           (job_priority_of(job.id), next(self._sequence), job, run_times))
+
+        if start_draining:
+            self._eventloop.create_task(self._drain(driver))
+
+    def _wake(self, driver):
+        with self._queue_lock:
+            driver = self._current(driver)
+            if driver not in self._parked:
+                return # something was submitted in the meantime and restarted the queue
+            self._parked.discard(driver)
+        self._eventloop.create_task(self._drain(driver))
+
+    async def _drain(self, driver):
+        while True:
+            with self._queue_lock:
+                driver = self._current(driver)
+                if not self._queues.get(driver): # emptied, or dropped along with its account
+                    self._queues.pop(driver, None)
+                    return
+                job = self._queues[driver][0][2]
+                hold = self._hold_seconds(driver, job)
+                if hold:
+                    self._parked.add(driver)
+                else:
+                    _, _, job, run_times = heapq.heappop(self._queues[driver])
+
+            if hold: # the reserved job will restart the queue when it's submitted, the timer is a fallback
+                self._eventloop.call_later(hold + 1, self._wake, driver)
+                return
+
+            # run every other due job that needs the same page while we're on it
+            page = job_page_of(job)
+            counts = {'navigated': 0, 'skipped': 0}
+            token = async_visit_counts.set(counts)
+            jobs_run = 0
+            try:
+                while job is not None:
+                    release_driver(driver, job.id)
+                    await self._run(job, run_times)
+                    jobs_run += 1
+                    job, run_times = self._next_on_page(driver, page) if page else (None, None)
+            finally:
+                async_visit_counts.reset(token)
+            record_visit(page, jobs_run, counts)
+
+    def _run_blocking(self, job, run_times, visit_counts):
+        current_job.id = job.id
+        current_job.round_trips = 0
+        current_job.wait_seconds = 0.0
+        current_visit.counts = visit_counts
+        try:
+            return run_job(job, job._jobstore_alias, run_times, self._logger.name), \
+                current_job.round_trips, current_job.wait_seconds
+        finally:
+            current_job.id = None
+            current_job.round_trips = None
+            current_job.wait_seconds = None
+            current_visit.counts = None
+
+    async def _run(self, job, run_times):
+        lateness = (datetime.now(timezone.utc) - run_times[-1]).total_seconds()
+        counters = {'job_id': job.id, 'round_trips': 0, 'wait_seconds': 0.0}
+        token = async_job_counters.set(counters)
+        start = time.perf_counter()
+        events = []
+        exc = tb = None
         try:
+            if iscoroutinefunction_partial(job.func):
+                events = await run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+            else:
+                events, counters['round_trips'], counters['wait_seconds'] = await self._eventloop.run_in_executor(
+                    self._pool, self._run_blocking, job, run_times, async_visit_counts.get())
+        except BaseException:
+            exc, tb = sys.exc_info()[1:]
+        finally:
+            async_job_counters.reset(token)
+
+        error = type(exc).__name__ if exc is not None else \
+            next((type(event.exception).__name__ for event in events if event.code == EVENT_JOB_ERROR), None)
+        record_job_timing(job.id, time.perf_counter() - start, counters['wait_seconds'], counters['round_trips'],
+                          error, lateness)
+
+        if exc is not None:
+            self._run_job_error(job.id, exc, tb)
+        else:
+            self._run_job_success(job.id, events)
+
+
+def async_job_funcs():
+    # the same job bodies as thread mode, run as coroutines
+    return {job_type: func.run_async for job_type, func in job_funcs().items()}
+
+
+async def run_accounts_async(drivers_info, job_store, site, accounts_path=None):
+    scheduler = AsyncIOScheduler(event_loop=asyncio.get_running_loop(),
+                                 executors={'default': AsyncDriverQueueExecutor(max_workers=ASYNC_BLOCKING_WORKERS)},
+                                 job_defaults={'coalesce': True, 'misfire_grace_time': None})
+    job_states.attach(scheduler)
+    scheduler.start()
+    supervisor = watcher = None
+    try:
+        supervisor = start_account_jobs(scheduler, drivers_info, job_store, site, funcs=async_job_funcs())
+        if accounts_path:
+            watcher = watch_accounts(accounts_path, drivers_info, scheduler, job_store, site, funcs=async_job_funcs())
+
+        dashboard = JobDashboard(drivers_info)
+        with Live(dashboard.update(), refresh_per_second=1, console=console, vertical_overflow='visible',
+                  screen=True) as live:
             while True:
-                live.update(generate_job_scheduler_table_from(drivers_info, scheduler), refresh=True)
+                live.update(dashboard.update(), refresh=True)
+                await asyncio.sleep(1)
+    finally:
+        if watcher is not None:
+            await asyncio.get_running_loop().run_in_executor(None, watcher.stop)
+        if supervisor is not None:
+            supervisor.stop()
+        print("Shutting down scheduler...")
+        scheduler.shutdown(wait=False)
+        await asyncio.sleep(0) # shutdown is queued onto the loop, let it run before the loop goes away
+        job_store.flush()
 
-                time.sleep(1)
-        except (KeyboardInterrupt, SystemExit):
+# %%
+''' sharded accounts '''
+
+# every account, its driver, the scheduler and the dashboard otherwise share one process and one GIL. with
+# SHARD_COUNT > 1 the accounts sheet is dealt out across that many worker processes, each with its own drivers and
+# scheduler, and they stream job state back over a queue to the one dashboard in this process. workers are spawned,
+# not forked, so sharding needs this file run as a script rather than from the notebook
+SHARD_COUNT = 1
+SHARD_HEARTBEAT_INTERVAL = 5 # seconds
+SHARD_HEARTBEAT_TIMEOUT = 120 # seconds without a heartbeat before a worker counts as wedged and is restarted
+SHARD_STOP_TIMEOUT = 60 # seconds a worker gets to save its state and quit its browsers on shutdown
+MAX_SHARD_RESTARTS = 5
+
+
+class Shard:
+    def __init__(self, index, accounts):
+        self.index = index
+        self.accounts = accounts # AccountRecords this worker runs
+        self.process = None
+        self.stop = None
+        self.status = 'starting'
+        self.running_accounts = 0
+        self.last_heartbeat = None
+        self.restarts = 0
+        self.error = None
+
+
+def shard_accounts(accounts, shard_count):
+    # dealt round robin so a sheet sorted by account type still spreads every type across the workers
+    return [accounts[index::shard_count] for index in range(shard_count) if index < len(accounts)]
+
+
+class ShardForwarder:
+    '''
+    Runs in a worker, sends every job state change, plus the timing of any run it hasn't sent yet, to the
+    coordinating process. Everything is sent as plain tuples so nothing depends on this module being importable
+    under the same name on the other end.
+    '''
+
+    def __init__(self, shard_index, events, states=None):
+        self.shard_index = shard_index
+        self.events = events
+        self.states = job_states if states is None else states
+        self.sent_timings = {} # job id -> finished_at of the last timing sent
+        self.unsubscribe = self.states.subscribe(self.job_changed)
+
+    def job_changed(self, job_id):
+        state = self.states.get(job_id)
+        if state is None:
+            return
+
+        with job_timings_lock:
+            timing = job_timings[job_id][-1] if job_timings.get(job_id) else None
+        if timing is not None and self.sent_timings.get(job_id) != timing.finished_at:
+            self.sent_timings[job_id] = timing.finished_at
+        else:
+            timing = None
+
+        self.events.put(('job', self.shard_index, job_id, state.scheduled, state.next_run_time, state.message,
+                         [tuple(outcome) for outcome in state.outcomes], tuple(timing) if timing else None))
+
+    def close(self):
+        self.unsubscribe()
+
+
+def run_shard(shard_index, site, accounts, events, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # ctrl-c reaches the whole process group, let the parent decide
+    status = ['starting']
+    drivers_info = {}
+
+    def heartbeat():
+        # own thread so starting a shard's browsers, which takes a while, doesn't read as wedged
+        while True:
+            events.put(('heartbeat', shard_index, time.time(), status[0], len(drivers_info)))
+            if stop.wait(SHARD_HEARTBEAT_INTERVAL):
+                return
+
+    threading.Thread(target=heartbeat, name='shard_heartbeat', daemon=True).start()
+    forwarder = ShardForwarder(shard_index, events)
+    try:
+        drivers_info = start_accounts(site, accounts)
+        load_village_states(drivers_info)
+        check_gold_club_memberships(drivers_info)
+        job_store = JobFileStore(drivers_info)
+
+        with managed_scheduler(executors={'default': DriverQueueExecutor(max_workers=max(len(drivers_info), 1))}) \
+                as scheduler:
+            supervisor = start_account_jobs(scheduler, drivers_info, job_store, site)
+            status[0] = 'running'
+            stop.wait()
+            status[0] = 'stopping'
+            supervisor.stop()
+            job_store.flush()
+    except Exception as e:
+        events.put(('error', shard_index, f'{type(e).__name__}: {e}'))
+        raise
+    finally:
+        forwarder.close()
+        stop_accounts(drivers_info)
+
+
+def start_shard(context, shard, site, events):
+    shard.stop = context.Event()
+    shard.process = context.Process(target=run_shard, name=f'shard{shard.index}',
+                                    args=(shard.index, site, shard.accounts, events, shard.stop))
+    shard.status = 'starting'
+    shard.last_heartbeat = time.time() # give it a full timeout to send its first heartbeat
+    shard.process.start()
+
+
+def kill_shard(shard):
+    # a wedged worker won't clean up after itself, take its chromedriver and chrome processes down with it
+    try:
+        processes = psutil.Process(shard.process.pid).children(recursive=True)
+    except psutil.Error:
+        processes = []
+    shard.process.kill()
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
             pass
-'''
+    shard.process.join(5)
+
+
+def drain_shard_events(events, shards, states):
+    while True:
+        try:
+            event = events.get_nowait()
+        except queue.Empty:
+            return
+
+        kind, shard = event[0], shards[event[1]]
+        if kind == 'heartbeat':
+            _, _, shard.last_heartbeat, shard.status, shard.running_accounts = event
+        elif kind == 'error':
+            shard.error = event[2]
+        elif kind == 'job':
+            _, _, job_id, scheduled, next_run_time, message, outcomes, timing = event
+            if timing is not None: # so the dashboard's timing columns work for jobs run in other processes
+                with job_timings_lock:
+                    job_timings.setdefault(job_id, deque(maxlen=JOB_TIMING_HISTORY)).append(JobTiming(*timing))
+            states.mirror(job_id, scheduled, next_run_time, message, [JobOutcome(*outcome) for outcome in outcomes])
+
+
+def check_shards(context, shards, site, events):
+    now = time.time()
+    for shard in shards:
+        dead = not shard.process.is_alive()
+        wedged = not dead and now - shard.last_heartbeat > SHARD_HEARTBEAT_TIMEOUT
+        if not (dead or wedged) or shard.status == 'failed':
+            continue
+
+        if wedged:
+            kill_shard(shard)
+        if shard.restarts >= MAX_SHARD_RESTARTS:
+            shard.status = 'failed'
+            continue
+
+        shard.restarts += 1
+        shard.error = shard.error or ('wedged' if wedged else f'exited with {shard.process.exitcode}')
+        start_shard(context, shard, site, events)
+
+
+def build_shard_table(shards):
+    table = Table(title="Shards", box=box.DOUBLE, safe_box=False)
+    table.add_column("Shard", style="cyan")
+    table.add_column("PID", style="magenta")
+    table.add_column("Status", style="green")
+    table.add_column("Accounts", style="blue")
+    table.add_column("Heartbeat (s ago)", style="yellow")
+    table.add_column("Restarts", style="red")
+    table.add_column("Last Error", style="red")
+
+    now = time.time()
+    for shard in shards:
+        table.add_row(str(shard.index), str(shard.process.pid), shard.status,
+                      f"{shard.running_accounts}/{len(shard.accounts)}",
+                      f"{now - shard.last_heartbeat:.0f}" if shard.last_heartbeat else "-",
+                      str(shard.restarts), shard.error or "-")
+    return table
+
+
+def run_sharded(site, accounts, shard_count=SHARD_COUNT):
+    # resolve the shared dependencies once up front, same as start_accounts, so the workers don't race to do it
+    chromedriver_path()
+    if any(account['Port'] for account in accounts):
+        ensure_proxy_manager()
+
+    context = multiprocessing.get_context('spawn')
+    events = context.Queue()
+    shards = [Shard(index, dealt) for index, dealt in enumerate(shard_accounts(accounts, shard_count))]
+    for shard in shards:
+        start_shard(context, shard, site, events)
+
+    states = JobStateStore()
+    dashboard = JobDashboard({account['Username']: account for account in accounts}, states)
+    layout = Layout()
+    layout.split_column(Layout(build_shard_table(shards), name='shards', size=len(shards) + 6),
+                        Layout(dashboard.update(), name='accounts'))
+    try:
+        with Live(layout, refresh_per_second=1, console=console, vertical_overflow='visible', screen=True) as live:
+            while True:
+                drain_shard_events(events, shards, states)
+                check_shards(context, shards, site, events)
+                layout['shards'].update(build_shard_table(shards))
+                dashboard.update()
+                live.refresh()
+
+                time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        dashboard.close()
+        for shard in shards:
+            shard.stop.set()
+        for shard in shards:
+            shard.process.join(SHARD_STOP_TIMEOUT)
+            if shard.process.is_alive():
+                kill_shard(shard)
+
+    return shards
+
+# %%
+''' fake travian server and job benchmark '''
+
+# a local stand-in for the game so jobs can be measured without a live account. it serves a login and the pages the
+# jobs read and click through, generated once from a seeded config so every run sees exactly the same village, with
+# optional per-request latency to mimic a proxy. the jobs drive the fake WebDriver below against it, or a real
+# headless chrome to check the fake's css/xpath engine and page scripts still behave like the browser's
+FakeServerConfig = namedtuple('FakeServerConfig', [
+    'fields', # resource fields on dorf1, laid out 4 wood / 4 clay / 4 iron / rest crop like a normal village
+    'field_level', # fields below this level are affordable
+    'build_queue', # buildings already under construction
+    'farm_lists', # the last one is named 'Oases' once there's more than one
+    'farm_rows', # targets per farm list
+    'incoming_attacks',
+    'adventures',
+    'hero_level_up',
+    'trainable', # troops the barracks can afford, 0 hides the amount input like the game does
+    'troop_name',
+    'latency', # seconds added to every request
+    'seed',
+], defaults=[18, 5, 0, 2, 50, 3, 2, True, 57, 'Clubswinger', 0.0, 1])
+
+FAKE_RALLY_POINT_SLOT = 39
+FAKE_BARRACKS_SLOT = 30
+
+# the start button sends the ticked rows like the game's farm list does, without leaving the page. the request is
+# synchronous so the raids are in by the time the click returns
+FAKE_SEND_RAIDS_SCRIPT = """<script>
+function sendRaids(button) {
+    const slots = button.closest('.farmListWrapper').querySelectorAll('.selection input:checked');
+    const request = new XMLHttpRequest();
+    request.open('POST', '/api/v1/farm-list/send', false);
+    request.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded');
+    request.send(Array.from(slots, (slot) => 'slot=' + slot.id).join('&'));
+}
+</script>"""
+
+
+def fake_timer(seconds):
+    return f'<span class="timer" value="{seconds}">{seconds // 3600}:{seconds // 60 % 60:02}:{seconds % 60:02}</span>'
+
+
+class FakeTravianServer:
+    '''
+    Serves dorf1/dorf2, field and building pages, the rally point with its incoming overview (tt=1) and farm lists
+    (tt=99), the barracks, hero inventory and adventures, and oasis pages for the farm list's oasis checks. Pages
+    need a session cookie from the login form, same as the game, so the http fast path is exercised too. What the
+    jobs did is recorded: fields upgraded, troops trained and farm list rows sent.
+    '''
+
+    def __init__(self, config=None):
+        self.config = FakeServerConfig() if config is None else config
+        self.sessions = set()
+        self.requests = {} # page name -> requests served
+        self.lock = threading.Lock()
+        self.server = None
+        self.base_url = None
+        self.build_village(random.Random(self.config.seed))
+        self.reset()
+
+    def build_village(self, rng):
+        config = self.config
+        gids = [WOOD] * 4 + [CLAY] * 4 + [IRON] * 4 + [WHEAT] * max(config.fields - 12, 0)
+        self.fields = [(slot, gid, rng.randint(max(config.field_level - 2, 0), config.field_level))
+                       for slot, gid in enumerate(gids[:config.fields], start=1)]
+        self.attack_timers = sorted(rng.randint(600, 7200) for _ in range(config.incoming_attacks))
+
+        self.farm_lists = []
+        for list_index in range(config.farm_lists):
+            oases = config.farm_lists > 1 and list_index == config.farm_lists - 1
+            rows = []
+            for row_index in range(config.farm_rows):
+                rows.append({
+                    'coordinates': (rng.randint(-200, 200), rng.randint(-200, 200)),
+                    'distance': round(rng.uniform(1, 12), 1),
+                    'troops': rng.randint(2, 10),
+                    'attacking': rng.random() < 0.2,
+                    'losses': rng.random() < (0.5 if oases else 0.1),
+                })
+            rows.sort(key=lambda row: row['distance']) # the game lists targets nearest first
+            self.farm_lists.append(('Oases' if oases else f'Farms {list_index + 1}', rows))
+        self.oases_with_troops = {row['coordinates'] for _, rows in self.farm_lists for row in rows
+                                  if rng.random() < 0.5}
+
+    def reset(self):
+        # forget what the jobs did, the village goes back to how the config built it
+        with self.lock:
+            self.upgraded = [] # slots whose upgrade was started, in order
+            self.trained = [] # troop amounts sent from the barracks
+            self.raids = [] # checkbox ids of the rows each start button sent
+
+    def build_queue_slots(self):
+        with self.lock:
+            return [slot for slot, _, _ in self.fields[:self.config.build_queue]] + self.upgraded
+
+    def start(self, port=0):
+        fake = self
+
+        class FakeTravianHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                fake.handle(self, self.rfile.read(length).decode('utf-8'))
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), FakeTravianHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        return self.base_url
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def request_count(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def count(self, name):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def handle(self, request, form):
+        if self.config.latency:
+            time.sleep(self.config.latency)
+
+        url = urlparse(request.path)
+        if url.path == '/login.php' and form is not None:
+            self.count('login')
+            session_id = f'{len(self.sessions) + 1:08x}'
+            with self.lock:
+                self.sessions.add(session_id)
+            request.send_response(302)
+            request.send_header('Set-Cookie', f'sess_id={session_id}; Path=/')
+            request.send_header('Location', '/dorf1.php')
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+
+        cookies = dict(part.strip().split('=', 1) for part in request.headers.get('Cookie', '').split(';') if '=' in part)
+        with self.lock:
+            logged_in = cookies.get('sess_id') in self.sessions
+        name, html = ('login', self.login_page()) if not logged_in else \
+            self.route(url.path, parse_qs(url.query), parse_qs(form) if form is not None else None)
+        self.count(name)
+
+        if html is None:
+            request.send_error(404)
+            return
+        body = html.encode('utf-8')
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/html; charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def route(self, path, query, form=None):
+        slot = int(query.get('id', ['0'])[0] or 0)
+        if path == '/dorf1.php':
+            if 'build' in query: # the field page's upgrade button lands here, like the game's build link
+                with self.lock:
+                    self.upgraded.append(int(query['build'][0]))
+            return 'dorf1', self.layout(self.dorf1())
+        if path == '/dorf2.php':
+            return 'dorf2', self.layout(self.dorf2())
+        if path == '/build.php' and slot == FAKE_RALLY_POINT_SLOT:
+            if query.get('tt') == ['99']:
+                return 'farm_lists', self.layout(self.farm_list_page())
+            return 'rally_point', self.layout(self.rally_point())
+        if path == '/build.php' and slot == FAKE_BARRACKS_SLOT:
+            if form is not None:
+                with self.lock:
+                    self.trained.append(int(form.get('t1', ['0'])[0] or 0))
+            return 'barracks', self.layout(self.barracks())
+        if path == '/api/v1/farm-list/send' and form is not None:
+            with self.lock:
+                self.raids.append(form.get('slot', []))
+            return 'send_raids', ''
+        if path == '/build.php' and 1 <= slot <= len(self.fields):
+            return 'field', self.layout(self.field_page(slot))
+        if path in ('/hero/inventory', '/hero/attributes'):
+            return 'hero_inventory', self.layout(self.hero_inventory())
+        if path == '/hero/adventures':
+            return 'adventures', self.layout(self.adventures())
+        if path == '/karte.php':
+            return 'oasis', self.layout(self.oasis(int(query.get('x', ['0'])[0]), int(query.get('y', ['0'])[0])))
+        return 'not_found', None
+
+    def login_page(self):
+        return """<!DOCTYPE html><html><head><title>Travian</title></head><body>
+<form method="post" action="/login.php"><table id="loginForm"><tbody>
+<tr><td>Name</td><td><input type="text" name="name"></td></tr>
+<tr><td>Password</td><td><input type="password" name="password"></td></tr>
+</tbody></table><button type="submit" value="Login" class="textButtonV1 green">Login</button></form>
+</body></html>"""
+
+    def layout(self, content):
+        # top bar, navigation and stock bar every page has
+        config = self.config
+        hero_state = 'heroHome'
+        level_up = 'levelUp show' if config.hero_level_up else 'levelUp'
+        stock = ''.join(f'<div class="stockBarButton"><span id="l{resource_id}">{12000 + resource_id * 1000:,}</span></div>'
+                        for resource_id in resource_ids)
+        return f"""<!DOCTYPE html><html><head><title>Travian</title></head><body>
+<div id="header">
+<a id="heroImageButton" href="/hero/inventory">Hero</a>
+<div id="topBarHero"><div class="heroStatus"><a href="/hero/inventory"><i class="{hero_state}"></i></a></div><i class="{level_up}"></i></div>
+<a class="adventure" href="/hero/adventures"><div class="content">{config.adventures}</div></a>
+<div id="navigation"><a class="village resourceView" href="/dorf1.php">Resources</a><a class="village buildingView" href="/dorf2.php">Buildings</a><a class="map" href="/karte.php">Map</a><a class="statistics" href="/statistics">Statistics</a><a class="reports" href="/report">Reports</a><a class="messages" href="/messages">Messages</a><a class="dailyQuests" href="/tasks">Daily Quests</a></div>
+<a id="questmasterButton" href="/tasks">Tasks</a>
+<a href="/options">Options</a>
+</div>
+<div id="stockBar">
+<div class="warehouse"><div class="capacity"><div class="value">80,000</div></div></div>
+<div class="granary"><div class="capacity"><div class="value">80,000</div></div></div>
+{stock}
+</div>
+<div id="content">{content}</div>
+</body></html>"""
+
+    def dorf1(self):
+        config = self.config
+        queued = self.build_queue_slots()
+        fields = []
+        for slot, gid, level in self.fields:
+            classes = ['level', 'colorLayer', f'gid{gid}', f'buildingSlot{slot}', f'level{level}']
+            if slot in queued:
+                classes.append('underConstruction')
+            elif level < config.field_level:
+                classes.append('good')
+            fields.append(f'<a href="/build.php?id={slot}" class="{" ".join(classes)}"><div class="labelLayer">{level}</div></a>')
+
+        production = ''.join(f'<tr><td class="res">{FIELD_NAMES[resource_id]}:</td><td class="num">{amount:,}</td></tr>'
+                             for resource_id, amount in zip(resource_ids, (900, 850, 800, 450)))
+
+        queue = ''
+        if queued:
+            items = ''.join(f'<li><div class="name">{FIELD_NAMES[self.fields[slot - 1][1]]}</div><div class="buildDuration">'
+                            f'{fake_timer(600 * (index + 1))}</div></li>'
+                            for index, slot in enumerate(queued))
+            queue = f'<div class="buildingList"><ul>{items}</ul></div>'
+
+        movements = ''
+        if self.attack_timers:
+            count = len(self.attack_timers)
+            movements = (f'<tr><th colspan="2">Incoming troops:</th></tr><tr><td class="typ"><a href="/build.php?id='
+                         f'{FAKE_RALLY_POINT_SLOT}&amp;gid=16&amp;tt=1"><img class="att1" src="img/x.gif" alt=""></a></td>'
+                         f'<td><div class="mov"><span class="a1">{count} Attack{"s" if count > 1 else ""}</span></div>'
+                         f'<div class="dur_r">in {fake_timer(self.attack_timers[0])}</div></td></tr>')
+
+        return f"""<div id="resourceFieldContainer" class="village1"><a href="/dorf2.php" class="villageCenter"></a>{''.join(fields)}</div>
+<table id="production"><tbody>{production}</tbody></table>
+{queue}
+<table id="movements"><tbody>{movements}</tbody></table>"""
+
+    def field_page(self, slot):
+        _, gid, level = self.fields[slot - 1]
+        return f"""<div id="build" class="gid{gid}"><h1>{FIELD_NAMES[gid]} Level {level}</h1>
+<button type="button" class="textButtonV1 green build" onclick="window.location.href='/dorf1.php?build={slot}'">Upgrade to level {level + 1}</button></div>"""
+
+    def dorf2(self):
+        return f"""<div id="villageContent">
+<a data-name="Rally Point" href="/build.php?id={FAKE_RALLY_POINT_SLOT}&amp;gid=16">Rally Point</a>
+<a data-name="Barracks" href="/build.php?id={FAKE_BARRACKS_SLOT}&amp;gid=19">Barracks</a>
+<div class="buildingSlot a40 g0" data-aid="40" data-name=""><a href="/build.php?id=40">Construction site</a></div>
+</div>"""
+
+    def rally_point(self):
+        attacks = ''.join(f'<table class="troop_details inAttack"><tbody class="infos"><tr><th>Arrival</th><td>'
+                          f'<div class="in">in {fake_timer(seconds)}</div></td></tr></tbody></table>'
+                          for seconds in self.attack_timers)
+        return f"""<h1>Rally Point</h1>
+<div class="contentNavi"><a href="/build.php?id={FAKE_RALLY_POINT_SLOT}&amp;gid=16&amp;tt=1">Overview</a><a href="/build.php?id={FAKE_RALLY_POINT_SLOT}&amp;gid=16&amp;tt=99">Farm List</a></div>
+{attacks}"""
+
+    def farm_list_page(self):
+        lists = []
+        for list_index, (name, rows) in enumerate(self.farm_lists):
+            cells = []
+            for row_index, row in enumerate(rows):
+                state = '<i class="attack_small"></i>' if row['attacking'] else ''
+                last_raid = 'attack_won_withLosses_small' if row['losses'] else 'attack_won_withoutLosses_small'
+                x, y = row['coordinates']
+                cells.append(f'<tr class="slot"><td class="selection"><label class="checkbox"><input type="checkbox" class="markSlot" id="slot{list_index}_{row_index}"></label></td>'
+                             f'<td class="target"><a href="/karte.php?x={x}&amp;y={y}">Target {row_index + 1}</a></td>'
+                             f'<td class="state">{state}</td><td class="troops"><div class="units"><span class="unit"><span class="value">{row["troops"]}</span></span></div></td>'
+                             f'<td class="distance"><span class="value">{row["distance"]}</span></td>'
+                             f'<td class="lastRaid"><i class="lastRaidState {last_raid}"></i></td></tr>')
+            cells.append('<tr class="addSlot"><td colspan="6"><button type="button">Add target</button></td></tr>')
+            troops = sum(row['troops'] for row in rows)
+            lists.append(f"""<div class="dropContainer"><div class="farmListWrapper">
+<div class="farmListHeader"><div class="expandCollapse"></div><div class="farmListName"><div class="name">{name}</div></div><button type="button" class="textButtonV2 startButton" onclick="sendRaids(this)">Start</button></div>
+<div class="farmListContent"><table class="slots"><tbody>{''.join(cells)}</tbody>
+<tfoot><tr><td></td><td class="troopsSummary"><div class="troops"><div class="value">{troops // 3}/{troops}</div></div></td></tr></tfoot></table></div>
+</div></div>""")
+        return f'<div id="rallyPointFarmList"><div class="villageWrapper">{"".join(lists)}</div></div>{FAKE_SEND_RAIDS_SCRIPT}'
+
+    def barracks(self):
+        config = self.config
+        amount = f'<input type="text" name="t1" value="0"><a href="#" onclick="return false;">{config.trainable}</a>' \
+            if config.trainable else ''
+        return f"""<div id="build" class="gid19"><h1>Barracks</h1>
+<form method="post" action="/build.php?id={FAKE_BARRACKS_SLOT}&amp;gid=19">
+<div class="buildActionOverview trainUnits">
+<div class="action troop troop1"><div class="innerTroopWrapper"><div class="tit"><a href="#" onclick="return false;">{config.troop_name}</a></div></div>
+<div class="details"><div class="tit"></div><div class="resourceWrapper"></div><div class="duration"></div><div class="cta">{amount}</div></div></div>
+</div>
+<button type="button" class="textButtonV1 gold">Exchange resources</button>
+<button type="button" class="textButtonV1 gold">Distribute remaining resources</button>
+<button type="button" class="textButtonV1 green">Redeem</button>
+<button type="submit" id="s1" class="textButtonV1 green startTraining">Train</button>
+</form>
+<table class="under_progress"><tbody><tr><td class="desc">5 {config.troop_name}</td><td class="dur">{fake_timer(900)}</td></tr></tbody></table>
+</div>"""
+
+    def hero_inventory(self):
+        return """<div id="heroV2"><div class="heroTabs"><div class="tabBar"><div class="tabs"><a class="tabItem" href="/hero/inventory">Inventory</a><a class="tabItem" href="/hero/attributes">Attributes</a></div></div></div>
+<div class="attributes">
+<input type="number" name="fightingStrength" value="0"><input type="number" name="offBonus" value="0">
+<input type="number" name="defBonus" value="0"><input type="number" name="resourceProduction" value="10">
+<button type="button" id="savePoints" onclick="window.location.href='/hero/inventory'">Save</button>
+</div></div>"""
+
+    def adventures(self):
+        rows = ''.join(f'<tr><td>Adventure {index + 1}</td><td></td><td></td><td></td><td><button type="button" class="textButtonV2">Explore</button></td></tr>'
+                       for index in range(self.config.adventures))
+        return f"""<div id="heroAdventure"><table><tbody>{rows}</tbody></table>
+<div class="footer"><button type="button" onclick="window.location.href='/dorf1.php'">Continue</button></div></div>"""
+
+    def oasis(self, x, y):
+        troops = '<td class="ico"></td><td class="val">12</td><td class="desc">Rats</td>' \
+            if (x, y) in self.oases_with_troops else '<td>none</td>'
+        return f'<h1>Unoccupied oasis ({x}|{y})</h1><table id="troop_info"><tbody><tr>{troops}</tr></tbody></table>'
+
+
+@contextmanager
+def managed_fake_travian(config=None, port=0):
+    server = FakeTravianServer(config)
+    server.start(port)
+    try:
+        yield server
+    finally:
+        server.shutdown()
+
+
+# the fake WebDriver. webdriver.Remote sends its commands to FakeChromedriver in-process instead of to a chromedriver,
+# so the jobs run unchanged without a browser. there's no javascript engine behind it: lookups go through a small
+# css/xpath engine that covers the locator registry, and the scripts the jobs run are answered in python
+FAKE_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) FakeChromedriver'
+WEB_ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf' # how the wire protocol marks an element reference
+
+CSS_COMPOUND_PART = re.compile(r'''
+    (?P<tag>^[\w-]+|^\*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[(?P<attr>[\w-]+)(?:(?P<op>[\^*$]?=)(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\]]*)))?\]
+  | :(?P<pseudo>scope|first-child|last-child|nth-child|nth-of-type)(?:\((?P<n>\d+)\))?
+''', re.VERBOSE)
+XPATH_PARENTS = re.compile(r'\.\.(?:/\.\.)*')
+XPATH_BY_TEXT = re.compile(r'''//([\w*-]+)\[(?:contains\(text\(\),\s*(["'])(.*?)\2\)|text\(\)\s*=\s*(["'])(.*?)\4)\]''')
+
+
+class FakeDriverError(Exception):
+    # status is the wire protocol's error name, selenium turns it into the matching exception
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@functools.lru_cache(maxsize=None)
+def css_steps(selector):
+    # 'a > b c' -> ((None, compound a), ('>', compound b), (' ', compound c)), each compound a tuple of tests
+    steps, current, combinator, quote, depth = [], '', None, None, 0
+    for char in selector.strip() + ' ':
+        if quote:
+            quote = None if char == quote else quote
+        elif char in '"\'':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+        elif not depth and (char.isspace() or char == '>'):
+            if current:
+                steps.append((combinator, css_compound(current)))
+                current, combinator = '', ' '
+            if char == '>':
+                combinator = '>'
+            continue
+        current += char
+    return tuple(steps)
+
+
+def css_compound(text):
+    tests, position = [], 0
+    while position < len(text):
+        match = CSS_COMPOUND_PART.match(text, position)
+        if match is None or not match.group(0):
+            raise FakeDriverError('invalid selector', f"the fake driver can't parse '{text}'")
+        position = match.end()
+        if match.group('tag'):
+            tests.append(('tag', match.group('tag')))
+        elif match.group('id'):
+            tests.append(('id', match.group('id')))
+        elif match.group('cls'):
+            tests.append(('class', match.group('cls')))
+        elif match.group('attr'):
+            value = next((group for group in match.group('dq', 'sq', 'bare') if group is not None), None)
+            tests.append(('attr', match.group('attr'), match.group('op'), value))
+        else:
+            pseudo = match.group('pseudo')
+            tests.append((pseudo, int(match.group('n') or 1)))
+    return tuple(tests)
+
+
+def css_compound_matches(node, tests, scope):
+    siblings = node.parent.elements if node.parent is not None else [node]
+    for test in tests:
+        kind = test[0]
+        if kind == 'tag':
+            matched = test[1] in ('*', node.tag)
+        elif kind == 'id':
+            matched = node.attrs.get('id') == test[1]
+        elif kind == 'class':
+            matched = test[1] in node.classes
+        elif kind == 'attr':
+            _, name, op, value = test
+            actual = node.attrs.get(name)
+            matched = actual is not None and (
+                op is None or
+                (op == '=' and actual == value) or
+                (op == '^=' and bool(value) and actual.startswith(value)) or
+                (op == '*=' and bool(value) and value in actual) or
+                (op == '$=' and bool(value) and actual.endswith(value)))
+        elif kind == 'scope':
+            matched = node is scope
+        elif kind == 'first-child':
+            matched = siblings[0] is node
+        elif kind == 'last-child':
+            matched = siblings[-1] is node
+        elif kind == 'nth-child':
+            matched = siblings.index(node) + 1 == test[1]
+        else: # nth-of-type
+            matched = [sibling for sibling in siblings if sibling.tag == node.tag].index(node) + 1 == test[1]
+        if not matched:
+            return False
+    return True
+
+
+def css_matches(node, steps, scope, i=None):
+    # right to left, the way browsers match: the last compound against the node, the rest against its ancestors
+    i = len(steps) - 1 if i is None else i
+    combinator, tests = steps[i]
+    if node.tag == '#document' or not css_compound_matches(node, tests, scope):
+        return False
+    if i == 0:
+        return True
+    if combinator == '>':
+        return node.parent is not None and css_matches(node.parent, steps, scope, i - 1)
+    ancestor = node.parent
+    while ancestor is not None:
+        if css_matches(ancestor, steps, scope, i - 1):
+            return True
+        ancestor = ancestor.parent
+    return False
+
+
+def css_select(scope, selector):
+    # querySelectorAll: matching descendants of scope in document order, compounds may match above scope
+    steps = css_steps(selector)
+    return [node for node in scope.iter() if node is not scope and css_matches(node, steps, scope)]
+
+
+def xpath_select(context, document, xpath):
+    # only the two shapes the locator registry uses, parent steps and elements found by their own text
+    if XPATH_PARENTS.fullmatch(xpath):
+        node = context
+        for _ in range(xpath.count('..')):
+            node = node.parent if node is not None and node.parent is not None else None
+        return [node] if node is not None and node.tag != '#document' else []
+
+    match = XPATH_BY_TEXT.fullmatch(xpath)
+    if match is None:
+        raise FakeDriverError('invalid selector', f"the fake driver can't evaluate '{xpath}'")
+    tag, contains, equals = match.group(1), match.group(3), match.group(5)
+    found = []
+    for node in document.iter():
+        if node is document or tag not in ('*', node.tag):
+            continue
+        texts = [child for child in node.children if isinstance(child, str)]
+        if (contains is not None and texts and contains in texts[0]) or (equals is not None and equals in texts):
+            found.append(node)
+    return found
+
+
+def closest(node, cls=None, tag=None):
+    while node is not None and not ((cls is None or cls in node.classes) and (tag is None or node.tag == tag)):
+        node = node.parent
+    return node
+
+
+class FakeChromedriver:
+    '''
+    Command executor for webdriver.Remote that stands in for chromedriver and chrome. Pages are loaded with a
+    requests session, cookies included, and kept as parsed snapshots. Clicks follow links, onclick navigations and
+    form submits, tick checkboxes and send the fake server's farm lists. Element references go stale once the page
+    changes, same as in chrome. A script the fake doesn't know is a javascript error.
+    '''
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = FAKE_USER_AGENT
+        self.session_id = None
+        self.lock = threading.Lock() # chromedriver runs one command at a time per session too
+        self.show('about:blank', '<html><head></head><body></body></html>')
+
+        self.commands = {
+            Command.NEW_SESSION: self.new_session,
+            Command.QUIT: self.quit,
+            Command.GET: lambda params: self.load('GET', params['url']),
+            Command.REFRESH: lambda params: self.load('GET', self.url),
+            Command.GET_CURRENT_URL: lambda params: self.url,
+            Command.GET_PAGE_SOURCE: lambda params: self.html,
+            Command.GET_TITLE: lambda params: next((node.text for node in self.document.find_all('title')), ''),
+            Command.FIND_ELEMENT: lambda params: self.wrap(self.find_first(self.document, params)),
+            Command.FIND_ELEMENTS: lambda params: self.wrap(self.find(self.document, params)),
+            Command.FIND_CHILD_ELEMENT: lambda params: self.wrap(self.find_first(self.node(params['id']), params)),
+            Command.FIND_CHILD_ELEMENTS: lambda params: self.wrap(self.find(self.node(params['id']), params)),
+            Command.W3C_EXECUTE_SCRIPT: lambda params: self.wrap(self.run_script(params['script'],
+                                                                                 self.unwrap(params['args']))),
+            Command.CLICK_ELEMENT: lambda params: self.click(self.node(params['id'])),
+            Command.CLEAR_ELEMENT: lambda params: self.set_value(self.node(params['id']), ''),
+            Command.SEND_KEYS_TO_ELEMENT: lambda params: self.set_value(
+                self.node(params['id']), self.node(params['id']).attrs.get('value', '') + params['text']),
+            Command.GET_ELEMENT_TEXT: lambda params: self.node(params['id']).text,
+            Command.GET_ELEMENT_TAG_NAME: lambda params: self.node(params['id']).tag,
+            Command.IS_ELEMENT_ENABLED: lambda params: 'disabled' not in self.node(params['id']).attrs,
+            Command.IS_ELEMENT_SELECTED: lambda params: 'checked' in self.node(params['id']).attrs,
+            Command.GET_ELEMENT_PROPERTY: lambda params: self.attribute(self.node(params['id']), params['name']),
+            Command.GET_ALL_COOKIES: lambda params: [{'name': cookie.name, 'value': cookie.value,
+                                                      'domain': cookie.domain, 'path': cookie.path}
+                                                     for cookie in self.session.cookies],
+        }
+        # keyed by the exact script text the jobs send
+        self.scripts = {
+            JS_CLICK: self.click,
+            JS_SCROLL_INTO_VIEW: lambda element: None,
+            JS_IS_CLICKABLE: lambda element: 'disabled' not in element.attrs and 'disabled' not in element.classes,
+            JS_MS_SINCE_LAST_MUTATION: lambda: (time.perf_counter() - self.mutated_at) * 1000,
+            JS_CHILD_INDEX: lambda element: element.parent.elements.index(element),
+            JS_READ_FARM_LIST: self.read_farm_list,
+            JS_TICK_FARM_LIST_ROWS: self.tick_farm_list_rows,
+            "return arguments[0].value;": lambda element: element.attrs.get('value', ''),
+            "arguments[0].value = arguments[1];": self.set_value,
+            "return navigator.userAgent;": lambda: self.session.headers['User-Agent'],
+            "return 1;": lambda: 1,
+        }
+
+    def execute(self, command, params):
+        with self.lock:
+            try:
+                handler = self.commands.get(command)
+                if handler is None:
+                    raise FakeDriverError('unknown command', f"the fake driver doesn't support {command}")
+                if self.session_id is None and command != Command.NEW_SESSION:
+                    raise FakeDriverError('invalid session id', 'session deleted because of page crash')
+                return {'status': 0, 'value': handler(params or {})}
+            except FakeDriverError as e:
+                return {'status': e.status, 'value': {'error': e.status, 'message': e.message}}
+
+    def close(self):
+        self.session.close()
+
+    def new_session(self, params):
+        self.session_id = f'fake{id(self):x}'
+        return {'sessionId': self.session_id, 'capabilities': {'browserName': 'chrome'}}
+
+    def quit(self, params):
+        self.session_id = None
+
+    def show(self, url, html):
+        # a new page, every element reference handed out so far is stale from here on
+        self.url = url
+        self.html = html
+        self.document = parse_snapshot(html)
+        self.elements = {} # element id -> node
+        self.element_ids = {} # node -> element id
+        self.mutated_at = time.perf_counter()
+
+    def load(self, method, url, data=None):
+        try:
+            response = self.session.request(method, url, data=data if method == 'POST' else None,
+                                            params=data if method != 'POST' else None, timeout=10)
+        except requests.RequestException as e:
+            raise FakeDriverError('unknown error', f'net::ERR_CONNECTION_FAILED ({e})')
+        self.show(response.url, response.text)
+
+    def node(self, element_id):
+        node = self.elements.get(element_id)
+        if node is None:
+            raise FakeDriverError('stale element reference', 'element is not attached to the page document')
+        return node
+
+    def wrap(self, value):
+        if isinstance(value, SnapshotNode):
+            if value not in self.element_ids:
+                self.element_ids[value] = f'{id(self.document):x}.{len(self.elements)}'
+                self.elements[self.element_ids[value]] = value
+            return {WEB_ELEMENT_KEY: self.element_ids[value]}
+        if isinstance(value, (list, tuple)):
+            return [self.wrap(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.wrap(item) for key, item in value.items()}
+        return value
+
+    def unwrap(self, value):
+        if isinstance(value, dict) and WEB_ELEMENT_KEY in value:
+            return self.node(value[WEB_ELEMENT_KEY])
+        if isinstance(value, list):
+            return [self.unwrap(item) for item in value]
+        return value
+
+    def find(self, context, params):
+        using, value = params['using'], params['value']
+        if using == By.CSS_SELECTOR:
+            return css_select(context, value)
+        if using == By.XPATH:
+            return xpath_select(context, self.document, value)
+        if using == By.TAG_NAME:
+            return context.find_all(value)
+        raise FakeDriverError('invalid argument', f"the fake driver doesn't support finding by {using}")
+
+    def find_first(self, context, params):
+        found = self.find(context, params)
+        if not found:
+            raise FakeDriverError('no such element', f'Unable to locate element: {params["value"]}')
+        return found[0]
+
+    def attribute(self, node, name):
+        if name == 'checked':
+            return 'true' if 'checked' in node.attrs else None
+        if name == 'value' and node.tag == 'input':
+            return node.attrs.get('value', '')
+        return node.attrs.get(name)
+
+    def set_value(self, node, value):
+        node.attrs['value'] = str(value)
+        self.mutated_at = time.perf_counter()
+
+    def run_script(self, script, args):
+        # selenium's get_attribute and is_displayed send their atoms with a marker comment in front
+        if script.startswith('/* getAttribute */'):
+            return self.attribute(*args)
+        if script.startswith('/* isDisplayed */'):
+            return 'hidden' not in args[0].attrs and 'display: none' not in args[0].attrs.get('style', '')
+
+        handler = self.scripts.get(script)
+        if handler is None:
+            raise FakeDriverError('javascript error', 'the fake driver has no stand-in for this script')
+        return handler(*args)
+
+    def click(self, node):
+        # handled by the nearest element that does something with a click, like the event bubbling up the page
+        while node is not None and node.tag != '#document':
+            attrs = node.attrs
+            onclick = attrs.get('onclick', '')
+            if node.tag == 'input' and attrs.get('type') == 'checkbox':
+                if 'checked' in attrs:
+                    del attrs['checked']
+                else:
+                    attrs['checked'] = ''
+                self.mutated_at = time.perf_counter()
+                return
+            if 'sendRaids(this)' in onclick: # FAKE_SEND_RAIDS_SCRIPT
+                self.send_raids(node)
+                return
+            navigation = re.search(r"window\.location\.href\s*=\s*'([^']*)'", onclick)
+            if navigation:
+                self.load('GET', urljoin(self.url, navigation.group(1)))
+                return
+            if 'return false' in onclick:
+                return
+            if node.tag == 'a' and attrs.get('href') and not attrs['href'].startswith('#'):
+                self.load('GET', urljoin(self.url, attrs['href']))
+                return
+            if (node.tag == 'button' and attrs.get('type', 'submit') == 'submit') or \
+               (node.tag == 'input' and attrs.get('type') == 'submit'):
+                form = closest(node, tag='form')
+                if form is not None:
+                    self.submit(form)
+                return
+            node = node.parent
+
+    def submit(self, form):
+        data = [(field.attrs['name'], field.attrs.get('value', ''))
+                for field in form.iter() if field.tag in ('input', 'select', 'textarea') and field.attrs.get('name')
+                and (field.attrs.get('type') not in ('checkbox', 'radio') or 'checked' in field.attrs)]
+        self.load(form.attrs.get('method', 'get').upper(), urljoin(self.url, form.attrs.get('action') or self.url), data)
+
+    def send_raids(self, button):
+        slots = [checkbox.attrs.get('id') for checkbox in css_select(closest(button, cls='farmListWrapper'),
+                                                                      '.selection input') if 'checked' in checkbox.attrs]
+        try:
+            self.session.post(urljoin(self.url, '/api/v1/farm-list/send'), data=[('slot', slot) for slot in slots],
+                              timeout=10)
+        except requests.RequestException as e:
+            raise FakeDriverError('javascript error', f'NetworkError: {e}')
+
+    def read_farm_list(self, farm_list):
+        def first(node, selector):
+            found = css_select(node, selector) if node is not None else []
+            return found[0] if found else None
+
+        def class_of(node):
+            return (node.attrs.get('class') or '') if node is not None else None
+
+        table = first(farm_list, 'table.slots')
+        name = first(farm_list, '.farmListName .name')
+        totals = first(table, 'tfoot .troopsSummary .value')
+        rows = []
+        for i, row in enumerate(css_select(table, ':scope > tbody > tr') if table is not None else []):
+            checkbox = first(row, '.selection .checkbox input')
+            if checkbox is None:
+                continue
+            target = first(row, '.target a')
+            distance, troops = first(row, '.distance .value'), first(row, '.troops .value')
+            rows.append([i + 1, checkbox.attrs.get('id') or None, class_of(first(row, '.state i')),
+                         distance.text if distance is not None else None, troops.text if troops is not None else None,
+                         target.attrs.get('href') if target is not None else None, class_of(first(row, '.lastRaid i'))])
+        return {'name': name.text if name is not None else '', 'totals': totals.text if totals is not None else '',
+                'rows': rows}
+
+    def tick_farm_list_rows(self, farm_list, row_indexes):
+        rows = css_select(farm_list, 'table.slots > tbody > tr')
+        for index in row_indexes:
+            checkboxes = css_select(rows[index - 1], '.selection .checkbox input') if 0 < index <= len(rows) else []
+            if checkboxes and 'checked' not in checkboxes[0].attrs:
+                self.click(checkboxes[0])
+
+
+def init_fake_webdriver():
+    # a Remote driver wired to FakeChromedriver, instrumented like init_webdriver's so the job reports still count
+    driver = webdriver.Remote(command_executor=FakeChromedriver(), options=webdriver.ChromeOptions(),
+                              file_detector=UselessFileDetector())
+    driver_started_at[driver] = time.time()
+    instrument_commands(driver)
+    return driver
+
+
+def init_benchmark_driver(browser='fake', lean=True):
+    # 'fake' runs offline and deterministically, 'chrome' drives a real headless chrome against the fake server
+    return init_fake_webdriver() if browser == 'fake' else init_webdriver(lean=lean)
+
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def benchmark_job_calls(drivers_info, driver, scheduler):
+    # job type -> call of the job as the scheduler would make it
+    account = drivers_info[driver]
+    return {
+        RESOURCE_FIELDS: lambda: attempt_to_upgrade_lowest_level_field(drivers_info, driver, scheduler),
+        CHECK_FOR_INCOMING_ATTACKS: lambda: incoming_attack(drivers_info, driver, scheduler),
+        TRAIN_TROOPS: lambda: train_troops(drivers_info, driver, account['Troop Building'], account['Troop Name'],
+                                           False, scheduler),
+        SPEND_ALL_RESOURCES: lambda: spend_all_resources_on_troop_production(drivers_info, driver),
+        RAIDS: lambda: send_troops_to_farm(drivers_info, driver, scheduler),
+        ADVENTURES: lambda: attempt_to_start_adventure(drivers_info, driver, scheduler),
+        HERO_UPGRADE: lambda: upgrade_hero(drivers_info, driver, scheduler),
+        GOLD_CLUB_CHECK: lambda: has_gold_club_membership(drivers_info, driver, scheduler),
+    }
+
+
+def reset_benchmark_state(server, driver, username=BENCHMARK_USERNAME):
+    # every run starts cold on dorf1, with nothing remembered from the previous run
+    server.reset()
+    with village_states_lock:
+        village_states.pop(driver, None)
+    for key in [key for key in list(building_urls) if key[0] is driver]:
+        building_urls.pop(key, None)
+    release_driver(driver)
+    with attack_deadlines_lock:
+        attack_deadlines.pop(username, None)
+        spends_scheduled.pop(username, None)
+    with oasis_troops_cache_lock:
+        for _, rows in server.farm_lists:
+            for row in rows:
+                oasis_troops_cache.pop(row['coordinates'], None)
+    driver.get(urljoin(server.base_url, 'dorf1.php'))
+
+
+def benchmark_jobs(config=None, runs=3, job_types=None, browser='fake', lean=True):
+    '''
+    Runs each job against the fake server `runs` times from a cold start and records wall time, WebDriver round
+    trips and requests the server saw (page loads plus http fast path reads). Jobs reschedule themselves into a
+    scheduler that's never started, so their rescheduling logic runs without anything actually running later.
+    browser='chrome' runs them in a real headless chrome instead of the fake WebDriver.
+    '''
+    results = []
+    with managed_fake_travian(config) as server:
+        driver = init_benchmark_driver(browser, lean)
+        driver_accounts[driver] = BENCHMARK_USERNAME
+        try:
+            attempt_login(urljoin(server.base_url, 'dorf1.php'), BENCHMARK_USERNAME, 'benchmark', driver)
+            drivers_info = {driver: AccountRecord(username=BENCHMARK_USERNAME, gold_club=True, troop_building='Barracks',
+                                                  troop_name=server.config.troop_name)}
+            scheduler = BackgroundScheduler()
+            calls = benchmark_job_calls(drivers_info, driver, scheduler)
+
+            for job_type in job_types or calls:
+                durations, round_trips, requests_served, errors = [], [], [], []
+                for _ in range(runs):
+                    reset_benchmark_state(server, driver)
+                    requests_before = server.request_count()
+                    current_job.id = f'{BENCHMARK_USERNAME}_{job_type}'
+                    current_job.round_trips = 0
+                    current_job.wait_seconds = 0.0
+                    start = time.perf_counter()
+                    try:
+                        calls[job_type]()
+                    except Exception as e: # keep measuring the other jobs, the error shows in the report
+                        errors.append(type(e).__name__)
+                    durations.append(time.perf_counter() - start)
+                    round_trips.append(current_job.round_trips)
+                    requests_served.append(server.request_count() - requests_before)
+                    current_job.id = None
+                    current_job.round_trips = None
+                    current_job.wait_seconds = None
+
+                results.append({'job_type': job_type, 'runs': runs,
+                                'wall_p50': float(np.percentile(durations, 50)), 'wall_max': max(durations),
+                                'round_trips': float(np.mean(round_trips)),
+                                'requests': float(np.mean(requests_served)),
+                                'errors': errors})
+        finally:
+            quit_driver(driver)
+            forget_driver(driver)
+
+    table = Table(title=f"Job Benchmark (fake server, {browser})", box=box.DOUBLE, safe_box=False)
+    table.add_column("Job", style="cyan", no_wrap=True)
+    table.add_column("Runs", style="magenta")
+    table.add_column("Wall p50 (s)", style="green")
+    table.add_column("Wall max (s)", style="green")
+    table.add_column("WebDriver Calls", style="yellow")
+    table.add_column("Server Requests", style="blue")
+    table.add_column("Errors", style="red")
+    for result in results:
+        table.add_row(result['job_type'], str(result['runs']), f"{result['wall_p50']:.3f}", f"{result['wall_max']:.3f}",
+                      f"{result['round_trips']:.1f}", f"{result['requests']:.1f}",
+                      ', '.join(sorted(set(result['errors']))) or "-")
+    console.print(table)
+
+    return results
+
+
+ORCHESTRATION_JOB_TYPES = tuple(job_funcs()) # the full job mix, as an account runs it
+
+
+def orchestration_job_args(drivers_info, driver, job_type):
+    # one-shot args, without a scheduler the jobs run once instead of rescheduling themselves
+    account = drivers_info[driver]
+    if job_type == TRAIN_TROOPS:
+        return [drivers_info, driver, account['Troop Building'], account['Troop Name'], False, None]
+    return [drivers_info, driver]
+
+
+def measure_orchestration(mode, drivers_info, jobs):
+    # schedules every job at once on the mode's real scheduler and executor and waits for the last one to finish
+    finished = threading.Event()
+    remaining = [len(jobs)]
+    errors = []
+    remaining_lock = threading.Lock()
+
+    def job_done(event):
+        with remaining_lock:
+            if event.exception is not None:
+                errors.append(type(event.exception).__name__)
+            remaining[0] -= 1
+            if not remaining[0]:
+                finished.set()
+
+    # the bridge pool outlives a run, so count the mode's own worker threads rather than a before/after delta
+    thread_prefixes = (DriverQueueExecutor.thread_name_prefix,) if mode == 'threaded' else \
+        ('async_bridge', AsyncDriverQueueExecutor.thread_name_prefix)
+    peak = [0]
+    sampler_stop = threading.Event()
+
+    def sample_threads():
+        while not sampler_stop.wait(0.01):
+            peak[0] = max(peak[0], sum(thread.name.startswith(thread_prefixes) for thread in threading.enumerate()))
+
+    def add_jobs(scheduler, funcs):
+        scheduler.add_listener(job_done, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        for job_id, driver, job_type in jobs:
+            scheduler.add_job(funcs[job_type], 'date', id=job_id,
+                              args=orchestration_job_args(drivers_info, driver, job_type))
+
+    def run_threaded():
+        # sized the way the main block sizes it
+        scheduler = BackgroundScheduler(executors={'default': DriverQueueExecutor(max_workers=len(drivers_info))},
+                                        job_defaults={'misfire_grace_time': None})
+        scheduler.start()
+        add_jobs(scheduler, job_funcs())
+        finished.wait()
+        scheduler.shutdown(wait=True)
+
+    async def run_async():
+        scheduler = AsyncIOScheduler(event_loop=asyncio.get_running_loop(),
+                                     executors={'default': AsyncDriverQueueExecutor(max_workers=ASYNC_BLOCKING_WORKERS)},
+                                     job_defaults={'misfire_grace_time': None})
+        scheduler.start()
+        add_jobs(scheduler, async_job_funcs())
+        while not finished.is_set():
+            await asyncio.sleep(0.01)
+        scheduler.shutdown(wait=False)
+        await asyncio.sleep(0)
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    if mode == 'threaded':
+        run_threaded()
+    else:
+        asyncio.run(run_async())
+    seconds = time.perf_counter() - start
+    sampler_stop.set()
+    sampler.join()
+    return seconds, peak[0], errors
+
+
+def benchmark_orchestration(account_counts=(2, 5, 10), config=None, job_types=ORCHESTRATION_JOB_TYPES, browser='fake',
+                            lean=True):
+    '''
+    Runs the same jobs for every account through thread mode's scheduler and executor and then async mode's, against
+    the fake server with one fake WebDriver (or headless chrome) per account, and reports wall time, the worker
+    threads each mode needed and how late jobs started. The server adds latency by default so the round trips weigh
+    like a proxied account's.
+    '''
+    config = FakeServerConfig(latency=0.05) if config is None else config
+    results = []
+    with managed_fake_travian(config) as server:
+        drivers = []
+        try:
+            for i in range(max(account_counts)):
+                driver = init_benchmark_driver(browser, lean)
+                drivers.append(driver)
+                driver_accounts[driver] = f'{BENCHMARK_USERNAME}{i}'
+                attempt_login(urljoin(server.base_url, 'dorf1.php'), f'{BENCHMARK_USERNAME}{i}', 'benchmark', driver)
+
+            with visits_lock:
+                saved_visits = list(visits)
+
+            for account_count in account_counts:
+                drivers_info = {driver: AccountRecord(username=f'{BENCHMARK_USERNAME}{i}', gold_club=True,
+                                                      troop_building='Barracks', troop_name=server.config.troop_name)
+                                for i, driver in enumerate(drivers[:account_count])}
+                jobs = [(f'{account["Username"]}_{job_type}', driver, job_type)
+                        for driver, account in drivers_info.items() for job_type in job_types]
+
+                result = {'accounts': account_count, 'jobs': len(jobs)}
+                for mode in ('threaded', 'async'):
+                    for driver, account in drivers_info.items():
+                        reset_benchmark_state(server, driver, account['Username'])
+                    seconds, threads, errors = measure_orchestration(mode, drivers_info, jobs)
+                    with job_timings_lock:
+                        lateness = [timing.lateness for job_id, _, _ in jobs for timing in job_timings.pop(job_id, [])]
+                    with wait_stats_lock:
+                        for job_id, _, _ in jobs:
+                            wait_savings.pop(job_id, None)
+                    result[mode] = {'seconds': seconds, 'threads': threads, 'errors': errors,
+                                    'lateness_p95': float(np.percentile(lateness, 95)) if lateness else None}
+                results.append(result)
+
+            with visits_lock: # the benchmark's page visits shouldn't show up in the real visit report
+                visits.clear()
+                visits.extend(saved_visits)
+        finally:
+            for driver in drivers:
+                quit_driver(driver)
+                forget_driver(driver)
+
+    table = Table(title=f"Thread vs Async Orchestration (fake server, {browser})", box=box.DOUBLE, safe_box=False)
+    table.add_column("Accounts", style="cyan")
+    table.add_column("Jobs", style="magenta")
+    table.add_column("Mode", style="blue")
+    table.add_column("Wall (s)", style="green")
+    table.add_column("Threads", style="yellow")
+    table.add_column("Lateness p95 (s)", style="red")
+    table.add_column("Errors", style="red")
+    for result in results:
+        for mode in ('threaded', 'async'):
+            stats = result[mode]
+            table.add_row(str(result['accounts']), str(result['jobs']), mode, f"{stats['seconds']:.2f}",
+                          str(stats['threads']),
+                          f"{stats['lateness_p95']:.2f}" if stats['lateness_p95'] is not None else "-",
+                          ', '.join(sorted(set(stats['errors']))) or "-")
+    console.print(table)
+
+    return results
 
 # %%
 ''' init. and login to server (single account)
@@ -1245,17 +6015,6 @@ input_site = 'https://ts2.x1.international.travian.com/dorf1.php'
 drivers_info = {}
 user_info = {}
 
-user_info = pd.read_excel('~/Dropbox/TravianAccounts.xlsx')
-for index, row in user_info.iterrows():
-    driver = init_webdriver(int(row['Port']) if not pd.isna(row['Port']) else None)
-    attempt_login(input_site, row['Username'], row['Password'], driver)
-
-    # !!! STILL IN TESTING, will fail without restarting once building queue is full
-    #if not wall_built(driver):
-    #    run_missions_and_disable_contextual_helpers(driver)
-
-    drivers_info[driver] = row
-
 
 '''
 proxy_ports = [[None, 'enforcer'], [24000, 'leader'], [24001, 'enforcer'], [24002, 'enforcer'], [24003, 'sourcer'], [24004, 'defender']]
@@ -1282,50 +6041,45 @@ for proxy_port in proxy_ports:
 
 
 ''' begin scheduler tasks '''
-with managed_scheduler() as scheduler:
-    for driver in drivers_info.keys():
-        drivers_info[driver]['Gold Club'] = has_gold_club_membership(drivers_info, driver, scheduler=None)
-
-        scheduler.add_job(attempt_to_start_adventure, 'interval', seconds=7,
-                          id=f'{drivers_info[driver]["Username"]}_{ADVENTURES}', args=[drivers_info, driver, scheduler])
-        scheduler.add_job(upgrade_hero, 'interval', seconds=14,
-                          id=f'{drivers_info[driver]["Username"]}_{HERO_UPGRADE}', args=[drivers_info, driver, scheduler])
-        scheduler.add_job(collect_mission_resources, 'interval', seconds=21,
-                          id=f'{drivers_info[driver]["Username"]}_{COLLECT_MISSION_RESOURCES}', args=[drivers_info, driver, scheduler])
-        scheduler.add_job(collect_daily_quests_rewards, 'interval', seconds=28,
-                          id=f'{drivers_info[driver]["Username"]}_{COLLECT_DAILY_QUEST_REWARDS}', args=[drivers_info, driver, scheduler])
-        scheduler.add_job(incoming_attack, 'interval', seconds=35,
-                          id=f'{drivers_info[driver]["Username"]}_{CHECK_FOR_INCOMING_ATTACKS}', args=[drivers_info, driver, scheduler])
-        if drivers_info[driver]['Upgrade Fields']:
-            scheduler.add_job(attempt_to_upgrade_lowest_level_field, 'interval', seconds=42,
-                              id=f'{drivers_info[driver]["Username"]}_{RESOURCE_FIELDS}', args=[drivers_info, driver, scheduler])
-        if drivers_info[driver]['Type'].lower() == 'enforcer' and drivers_info[driver]['Train Troops']:
-            scheduler.add_job(train_troops, 'interval', seconds=70,
-                              id=f'{drivers_info[driver]["Username"]}_{TRAIN_TROOPS}',
-                              args=[drivers_info, driver,
-                                    drivers_info[driver]['Troop Building'], drivers_info[driver]['Troop Name'],
-                                    False, scheduler])
-        if drivers_info[driver]['Gold Club'] and drivers_info[driver]['Raid']:
-            scheduler.add_job(send_troops_to_farm, 'interval', seconds=90,
-                              id=f'{drivers_info[driver]["Username"]}_{RAIDS}', args=[drivers_info, driver, scheduler])
-
-        # for any uncaught server errors, refresh page every hour to ensure continued job executions
-        scheduler.add_job(refresh_page, 'interval', seconds=600,
-                              id=f"{drivers_info[driver]['Username']}_{REFRESH}", args=[drivers_info, driver, scheduler])
-    
-    with Live(generate_job_scheduler_table_from(drivers_info, scheduler), refresh_per_second=1, console=console, vertical_overflow='visible', screen=True) as live:
-        try:
-            while True:
-                live.update(generate_job_scheduler_table_from(drivers_info, scheduler), refresh=True)
-
-                time.sleep(1)
-        except (KeyboardInterrupt, SystemExit):
-            pass
+# shard workers import this file, only the process that was actually started runs the accounts
+if __name__ == '__main__':
+    accounts = read_accounts(ACCOUNTS_PATH)
 
-for driver in drivers_info.keys():
-    driver.quit()
+    if SHARD_COUNT > 1:
+        run_sharded(input_site, accounts)
+    else:
+        drivers_info = start_accounts(input_site, accounts)
+        load_village_states(drivers_info) # warm start, anything too old is simply ignored
+        job_store = JobFileStore(drivers_info)
+        check_gold_club_memberships(drivers_info)
 
-run_command_in_background('curl -X POST "http://127.0.0.1:22999/api/shutdown"')
+        if ASYNC_MODE:
+            try:
+                asyncio.run(run_accounts_async(drivers_info, job_store, input_site, accounts_path=ACCOUNTS_PATH))
+            except (KeyboardInterrupt, SystemExit):
+                pass
+        else:
+            with managed_scheduler(executors={'default': DriverQueueExecutor(max_workers=max(len(drivers_info), 1))}) as scheduler:
+                supervisor = start_account_jobs(scheduler, drivers_info, job_store, input_site)
+                watcher = watch_accounts(ACCOUNTS_PATH, drivers_info, scheduler, job_store, input_site)
+
+                dashboard = JobDashboard(drivers_info)
+                with Live(dashboard.update(), refresh_per_second=1, console=console, vertical_overflow='visible', screen=True) as live:
+                    try:
+                        while True:
+                            live.update(dashboard.update(), refresh=True)
+
+                            time.sleep(1)
+                    except (KeyboardInterrupt, SystemExit):
+                        pass
+
+                watcher.stop()
+                supervisor.stop()
+                job_store.flush()
+
+        stop_accounts(drivers_info)
+
+    run_command_in_background('curl -X POST "http://127.0.0.1:22999/api/shutdown"')
 
 # %% [markdown]
 # %%bash
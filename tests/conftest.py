@@ -0,0 +1,62 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TravianAuto  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+@pytest.fixture(scope='session')
+def pages():
+    # saved game pages, {path: html}, in the layout capture_pages writes
+    return TravianAuto.load_captured_pages(PAGES_DIR)
+
+
+@pytest.fixture
+def snapshot_of(pages):
+    return lambda path: TravianAuto.parse_snapshot(pages[path])
+
+
+def chrome_installed():
+    return any(shutil.which(name) for name in ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser'))
+
+
+@pytest.fixture
+def chrome():
+    # a real headless chrome, the locators and jobs lean on its css/xpath engines
+    if not chrome_installed():
+        pytest.skip('chrome is not installed')
+    driver = TravianAuto.init_webdriver(lean=True)
+    try:
+        yield driver
+    finally:
+        TravianAuto.quit_driver(driver)
+        TravianAuto.forget_driver(driver)
+
+
+@pytest.fixture
+def fake_browser():
+    # the fake WebDriver, runs anywhere without a browser
+    driver = TravianAuto.init_fake_webdriver()
+    try:
+        yield driver
+    finally:
+        TravianAuto.quit_driver(driver)
+        TravianAuto.forget_driver(driver)
+
+
+@pytest.fixture(params=['fake', 'chrome'])
+def browser(request):
+    # the fake always, real chrome as well where it's installed
+    return request.getfixturevalue('fake_browser' if request.param == 'fake' else 'chrome')
+
+
+@pytest.fixture
+def fake_travian():
+    with TravianAuto.managed_fake_travian() as server:
+        yield server
@@ -0,0 +1,90 @@
+<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="utf-8"><title>Travian Resources</title><script>window.Travian = {};</script></head>
+<body class="v35 webkit chrome resources">
+<div id="background"><div id="bodyWrapper">
+<div id="header">
+ <div id="topBarHero">
+  <div class="heroStatus"><a href="/hero/attributes" title="Hero status"><i class="heroRunning"></i></a></div>
+  <a id="heroImageButton" class="heroImageButton" href="/hero/inventory"><img class="heroImage" src="/hero/body/head.png" alt=""></a>
+  <a class="layoutButton buttonFramed withIcon round adventure green attention" href="/hero/adventures"><div class="content">2</div></a>
+  <i class="levelUp show"></i>
+ </div>
+ <div id="navigation">
+  <a class="village resourceView active" href="/dorf1.php" accesskey="1" title="Resources"></a>
+  <a class="village buildingView" href="/dorf2.php" accesskey="2" title="Buildings"></a>
+  <a class="map" href="/karte.php" accesskey="3" title="Map"></a>
+  <a class="statistics" href="/statistics" accesskey="4" title="Statistics"></a>
+  <a class="reports" href="/report" accesskey="5" title="Reports"></a>
+  <a class="messages" href="/messages" accesskey="6" title="Messages"></a>
+  <a class="dailyQuests" href="#" accesskey="7" title="Daily Quests"><div class="indicator">!</div></a>
+ </div>
+ <div id="questmasterButton" class="questMaster"><div class="bigSpeechBubble rewardReady"></div></div>
+ <a class="options" href="/options" title="Options"></a>
+</div>
+<div id="stockBar">
+ <div class="warehouse"><div class="capacity"><div class="value">&#x202d;80.000&#x202c;</div></div></div>
+ <div class="granary"><div class="capacity"><div class="value">&#x202d;64.000&#x202c;</div></div></div>
+ <div class="stockBarButton"><div class="value" id="l1">&#x202d;12.345&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l2">&#x202d;23.456&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l3">&#x202d;34.567&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l4">&#x202d;4.321&#x202c;</div></div>
+</div>
+<div id="center"><div id="contentOuterContainer"><div class="contentContainer">
+<div id="content" class="resources">
+<div class="village1">
+<div id="resourceFieldContainer" class="resourceField resourceWrapper">
+  <a href="/dorf2.php" class="villageCenter"></a>
+  <a href="/build.php?id=1" class="level colorLayer underConstruction gid1 buildingSlot1 level3" data-aid="1" data-gid="1"><div class="labelLayer">3</div></a>
+  <a href="/build.php?id=2" class="level colorLayer gid1 buildingSlot2 level5" data-aid="2" data-gid="1"><div class="labelLayer">5</div></a>
+  <a href="/build.php?id=3" class="level colorLayer good gid1 buildingSlot3 level3" data-aid="3" data-gid="1"><div class="labelLayer">3</div></a>
+  <a href="/build.php?id=4" class="level colorLayer gid1 buildingSlot4 level4" data-aid="4" data-gid="1"><div class="labelLayer">4</div></a>
+  <a href="/build.php?id=5" class="level colorLayer good gid2 buildingSlot5 level2" data-aid="5" data-gid="2"><div class="labelLayer">2</div></a>
+  <a href="/build.php?id=6" class="level colorLayer gid2 buildingSlot6 level4" data-aid="6" data-gid="2"><div class="labelLayer">4</div></a>
+  <a href="/build.php?id=7" class="level colorLayer gid2 buildingSlot7 level4" data-aid="7" data-gid="2"><div class="labelLayer">4</div></a>
+  <a href="/build.php?id=8" class="level colorLayer gid2 buildingSlot8 level5" data-aid="8" data-gid="2"><div class="labelLayer">5</div></a>
+  <a href="/build.php?id=9" class="level colorLayer gid3 buildingSlot9 level6" data-aid="9" data-gid="3"><div class="labelLayer">6</div></a>
+  <a href="/build.php?id=10" class="level colorLayer gid3 buildingSlot10 level5" data-aid="10" data-gid="3"><div class="labelLayer">5</div></a>
+  <a href="/build.php?id=11" class="level colorLayer gid3 buildingSlot11 level6" data-aid="11" data-gid="3"><div class="labelLayer">6</div></a>
+  <a href="/build.php?id=12" class="level colorLayer gid3 buildingSlot12 level6" data-aid="12" data-gid="3"><div class="labelLayer">6</div></a>
+  <a href="/build.php?id=13" class="level colorLayer good gid4 buildingSlot13 level2" data-aid="13" data-gid="4"><div class="labelLayer">2</div></a>
+  <a href="/build.php?id=14" class="level colorLayer good gid4 buildingSlot14 level3" data-aid="14" data-gid="4"><div class="labelLayer">3</div></a>
+  <a href="/build.php?id=15" class="level colorLayer good gid4 buildingSlot15 level3" data-aid="15" data-gid="4"><div class="labelLayer">3</div></a>
+  <a href="/build.php?id=16" class="level colorLayer gid4 buildingSlot16 level5" data-aid="16" data-gid="4"><div class="labelLayer">5</div></a>
+  <a href="/build.php?id=17" class="level colorLayer gid4 buildingSlot17 level5" data-aid="17" data-gid="4"><div class="labelLayer">5</div></a>
+  <a href="/build.php?id=18" class="level colorLayer gid4 buildingSlot18 level6" data-aid="18" data-gid="4"><div class="labelLayer">6</div></a>
+</div>
+<div class="villageInfobox production">
+<table id="production" class="transparent">
+ <thead><tr><th colspan="4">Production per hour:</th></tr></thead>
+ <tbody>
+  <tr><td class="ico"><i class="r1"></i></td><td class="res">Lumber:</td><td class="num">&#x202d;&#x202d;1,120&#x202c;&#x202c;</td></tr>
+  <tr><td class="ico"><i class="r2"></i></td><td class="res">Clay:</td><td class="num">&#x202d;&#x202d;1,040&#x202c;&#x202c;</td></tr>
+  <tr><td class="ico"><i class="r3"></i></td><td class="res">Iron:</td><td class="num">&#x202d;&#x202d;960&#x202c;&#x202c;</td></tr>
+  <tr><td class="ico"><i class="r4"></i></td><td class="res">Crop:</td><td class="num">&#x202d;&#x202d;&#x2212;&#x202d;35&#x202c;&#x202c;&#x202c;</td></tr>
+ </tbody>
+</table>
+</div>
+<div class="buildingList">
+ <h5>Construction:</h5>
+ <ul>
+  <li><div class="name">Woodcutter <span class="lvl">Level 4</span></div><div class="buildDuration"><span class="timer" counting="down" value="1843">0:30:43</span> hrs.</div><div class="doneAt">done at 14:02</div></li>
+ </ul>
+</div>
+<div class="villageInfobox movements">
+<table id="movements" class="transparent">
+ <thead><tr><th colspan="3">Troop movements:</th></tr></thead>
+ <tbody>
+  <tr><th colspan="3">Incoming troops:</th></tr>
+  <tr><td class="typ"><a href="/build.php?gid=16&amp;tt=1&amp;filter=1&amp;subfilters=1"><img src="/img/x.gif" class="att1" alt="att1"></a><span class="a1">&raquo;</span></td><td><div class="mov"><span class="a1">3&nbsp;Attacks</span></div><div class="dur_r">in&nbsp;<span class="timer" counting="down" value="2781">0:46:21</span>&nbsp;hrs.</div></td></tr>
+  <tr><th colspan="3">Outgoing troops:</th></tr>
+  <tr><td class="typ"><a href="/build.php?gid=16&amp;tt=1&amp;filter=2&amp;subfilters=5"><img src="/img/x.gif" class="def2" alt="def2"></a><span class="d2">&laquo;</span></td><td><div class="mov"><span class="d2">1&nbsp;Reinf.</span></div><div class="dur_r">in&nbsp;<span class="timer" counting="down" value="412">0:06:52</span>&nbsp;hrs.</div></td></tr>
+  <tr><td class="typ"><a href="/hero/adventures"><img src="/img/x.gif" class="adventure" alt="adventure"></a><span class="adventure">&laquo;</span></td><td><div class="mov"><span class="adventure">1&nbsp;Adventure</span></div><div class="dur_r">in&nbsp;<span class="timer" counting="down" value="905">0:15:05</span>&nbsp;hrs.</div></td></tr>
+ </tbody>
+</table>
+</div>
+</div>
+</div></div></div></div>
+</div></div>
+</body>
+</html>
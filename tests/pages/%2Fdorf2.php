@@ -0,0 +1,64 @@
+<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="utf-8"><title>Travian Buildings</title><script>window.Travian = {};</script></head>
+<body class="v35 webkit chrome buildings">
+<div id="background"><div id="bodyWrapper">
+<div id="header">
+ <div id="topBarHero">
+  <div class="heroStatus"><a href="/hero/attributes" title="Hero status"><i class="heroRunning"></i></a></div>
+  <a id="heroImageButton" class="heroImageButton" href="/hero/inventory"><img class="heroImage" src="/hero/body/head.png" alt=""></a>
+  <a class="layoutButton buttonFramed withIcon round adventure green attention" href="/hero/adventures"><div class="content">2</div></a>
+  <i class="levelUp show"></i>
+ </div>
+ <div id="navigation">
+  <a class="village resourceView active" href="/dorf1.php" accesskey="1" title="Resources"></a>
+  <a class="village buildingView" href="/dorf2.php" accesskey="2" title="Buildings"></a>
+  <a class="map" href="/karte.php" accesskey="3" title="Map"></a>
+  <a class="statistics" href="/statistics" accesskey="4" title="Statistics"></a>
+  <a class="reports" href="/report" accesskey="5" title="Reports"></a>
+  <a class="messages" href="/messages" accesskey="6" title="Messages"></a>
+  <a class="dailyQuests" href="#" accesskey="7" title="Daily Quests"><div class="indicator">!</div></a>
+ </div>
+ <div id="questmasterButton" class="questMaster"><div class="bigSpeechBubble rewardReady"></div></div>
+ <a class="options" href="/options" title="Options"></a>
+</div>
+<div id="stockBar">
+ <div class="warehouse"><div class="capacity"><div class="value">&#x202d;80.000&#x202c;</div></div></div>
+ <div class="granary"><div class="capacity"><div class="value">&#x202d;64.000&#x202c;</div></div></div>
+ <div class="stockBarButton"><div class="value" id="l1">&#x202d;12.345&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l2">&#x202d;23.456&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l3">&#x202d;34.567&#x202c;</div></div>
+ <div class="stockBarButton"><div class="value" id="l4">&#x202d;4.321&#x202c;</div></div>
+</div>
+<div id="center"><div id="contentOuterContainer"><div class="contentContainer">
+<div id="content" class="buildings">
+<div class="village2">
+<div id="villageContent" class="village2">
+  <div class="buildingSlot a19 g15" data-aid="19" data-gid="15" data-name="Main Building"><a href="/build.php?id=19&amp;gid=15" class="level colorLayer aid19" data-level="10"><div class="labelLayer">10</div></a></div>
+  <div class="buildingSlot a20 g0 emptyBuildingSlot" data-aid="20" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a21 g0 emptyBuildingSlot" data-aid="21" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a22 g0 emptyBuildingSlot" data-aid="22" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a23 g0 emptyBuildingSlot" data-aid="23" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a24 g0 emptyBuildingSlot" data-aid="24" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a25 g10" data-aid="25" data-gid="10" data-name="Warehouse"><a href="/build.php?id=25&amp;gid=10" class="level colorLayer aid25" data-level="12"><div class="labelLayer">12</div></a></div>
+  <div class="buildingSlot a26 g11" data-aid="26" data-gid="11" data-name="Granary"><a href="/build.php?id=26&amp;gid=11" class="level colorLayer aid26" data-level="10"><div class="labelLayer">10</div></a></div>
+  <div class="buildingSlot a27 g0 emptyBuildingSlot" data-aid="27" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a28 g0 emptyBuildingSlot" data-aid="28" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a29 g0 emptyBuildingSlot" data-aid="29" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a30 g19" data-aid="30" data-gid="19" data-name="Barracks"><a href="/build.php?id=30&amp;gid=19" class="level colorLayer aid30" data-level="5"><div class="labelLayer">5</div></a></div>
+  <div class="buildingSlot a31 g0 emptyBuildingSlot" data-aid="31" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a32 g0 emptyBuildingSlot" data-aid="32" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a33 g0 emptyBuildingSlot" data-aid="33" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a34 g0 emptyBuildingSlot" data-aid="34" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a35 g0 emptyBuildingSlot" data-aid="35" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a36 g0 emptyBuildingSlot" data-aid="36" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a37 g0 emptyBuildingSlot" data-aid="37" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a38 g0 emptyBuildingSlot" data-aid="38" data-gid="0" data-name="Building site"></div>
+  <div class="buildingSlot a39 g16" data-aid="39" data-gid="16" data-name="Rally Point"><a href="/build.php?id=39&amp;gid=16" class="level colorLayer aid39" data-level="3"><div class="labelLayer">3</div></a></div>
+  <div class="buildingSlot a40 g31" data-aid="40" data-gid="31" data-name="City Wall"><a href="/build.php?id=40&amp;gid=31" class="level colorLayer aid40" data-level="0"><div class="labelLayer">0</div></a></div>
+</div>
+</div>
+</div></div></div></div>
+</div></div>
+</body>
+</html>
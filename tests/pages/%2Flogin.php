@@ -0,0 +1,23 @@
+<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="utf-8"><title>Travian Login</title></head>
+<body class="v35 webkit chrome login">
+<div id="background"><div id="bodyWrapper">
+<div id="center"><div id="contentOuterContainer"><div class="contentContainer">
+<div id="content" class="login">
+<h1 class="titleInHeader">Login</h1>
+<form name="login" method="post" action="/login.php">
+ <table id="loginForm" class="transparent loginTable">
+  <tbody>
+   <tr class="account"><td class="accountNameOrEmailAddress">Account name or email address</td><td><input type="text" name="name" value="" class="text" autocomplete="username"></td></tr>
+   <tr class="pass"><td>Password</td><td><input type="password" name="password" value="" class="text" autocomplete="current-password"></td></tr>
+   <tr class="lowResOption"><td></td><td><label><input type="checkbox" class="check" name="lowRes" value="1"> Fewer animated graphics</label></td></tr>
+  </tbody>
+ </table>
+ <button type="submit" value="Login" class="textButtonV1 green">Login</button>
+</form>
+</div>
+</div></div></div>
+</div></div>
+</body>
+</html>
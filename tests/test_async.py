@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+import TravianAuto
+from TravianAuto import (AsyncDriverQueueExecutor, CHECK_FOR_INCOMING_ATTACKS, RAIDS, REFRESH, RESOURCE_FIELDS,
+                         SPEND_ALL_RESOURCES, TRAIN_TROOPS, count_navigation, release_driver, reserve_driver)
+
+
+class Driver:
+    pass
+
+
+def run_jobs(jobs, max_workers=2):
+    # jobs is a list of (job id, func, args, run at offset in seconds), returns once all of them have run
+    async def main():
+        done = asyncio.Event()
+        remaining = [len(jobs)]
+        errors = []
+
+        def job_done(event):
+            if event.exception is not None:
+                errors.append(event.exception)
+            remaining[0] -= 1
+            if not remaining[0]:
+                done.set()
+
+        scheduler = AsyncIOScheduler(event_loop=asyncio.get_running_loop(),
+                                     executors={'default': AsyncDriverQueueExecutor(max_workers=max_workers)},
+                                     job_defaults={'misfire_grace_time': None})
+        scheduler.add_listener(job_done, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        scheduler.start(paused=True) # so jobs due together are submitted in one pass
+        now = datetime.now(timezone.utc)
+        for job_id, func, args, offset in jobs:
+            scheduler.add_job(func, 'date', run_date=now + timedelta(seconds=offset), id=job_id, args=args)
+        scheduler.resume()
+        try:
+            await asyncio.wait_for(done.wait(), 10)
+        finally:
+            scheduler.shutdown(wait=False)
+            await asyncio.sleep(0)
+        return errors
+
+    errors = asyncio.run(main())
+    assert not errors
+
+
+@pytest.fixture
+def drivers():
+    drivers = [Driver(), Driver()]
+    yield drivers
+    for driver in drivers:
+        release_driver(driver)
+        TravianAuto.forget_driver(driver)
+    with TravianAuto.job_timings_lock: # expected job times would otherwise carry over into the next test
+        for job_id in [job_id for job_id in TravianAuto.job_timings if job_id.startswith('account')]:
+            TravianAuto.job_timings.pop(job_id)
+
+
+def test_one_job_at_a_time_per_driver(drivers):
+    drivers_info = {driver: {'Username': f'account{i}'} for i, driver in enumerate(drivers)}
+    running = {driver: 0 for driver in drivers}
+    peaks = {'driver': 0, 'total': 0}
+
+    async def job(drivers_info, driver):
+        running[driver] += 1
+        peaks['driver'] = max(peaks['driver'], running[driver])
+        peaks['total'] = max(peaks['total'], sum(running.values()))
+        await asyncio.sleep(0.05)
+        running[driver] -= 1
+
+    run_jobs([(f'{account["Username"]}_{job_type}', job, [drivers_info, driver], 0)
+              for driver, account in drivers_info.items() for job_type in (REFRESH, RAIDS, RESOURCE_FIELDS)])
+
+    assert peaks['driver'] == 1
+    assert peaks['total'] == 2 # different drivers still overlap
+
+
+def test_queue_runs_in_priority_order_and_batches_same_page_jobs(drivers):
+    driver = drivers[0]
+    drivers_info = {driver: {'Username': 'account', 'Troop Building': 'Barracks'}}
+    order = []
+
+    async def job(drivers_info, driver, *args):
+        order.append(TravianAuto.async_job_counters.get()['job_id'])
+        count_navigation(skipped=False)
+        await asyncio.sleep(0.01)
+
+    def blocking_job(drivers_info, driver):
+        order.append(f'account_{REFRESH}')
+        count_navigation(skipped=False) # plain jobs still count against the visit from the blocking pool
+
+    with TravianAuto.visits_lock:
+        visits_before = len(TravianAuto.visits)
+    run_jobs([(f'account_{RAIDS}', job, [drivers_info, driver], 0),
+              (f'account_{RESOURCE_FIELDS}', job, [drivers_info, driver], 0),
+              (f'account_{CHECK_FOR_INCOMING_ATTACKS}', job, [drivers_info, driver], 0),
+              (f'account_{REFRESH}', blocking_job, [drivers_info, driver], 0)])
+
+    # the attack check goes first, the field job needs the same page so it runs in the same visit
+    assert order == [f'account_{CHECK_FOR_INCOMING_ATTACKS}', f'account_{RESOURCE_FIELDS}', f'account_{REFRESH}',
+                     f'account_{RAIDS}']
+    with TravianAuto.visits_lock:
+        new_visits = list(TravianAuto.visits)[visits_before:]
+    assert [(visit.page, visit.jobs) for visit in new_visits] == [('dorf1.php', 2), (None, 1), ('Rally Point', 1)]
+    assert [visit.navigated for visit in new_visits] == [2, 1, 1]
+
+
+def test_reservation_holds_back_jobs_that_would_overlap_it(drivers):
+    driver = drivers[0]
+    drivers_info = {driver: {'Username': 'account', 'Troop Building': 'Barracks'}}
+    order = []
+
+    async def job(drivers_info, driver, *args):
+        order.append(TravianAuto.async_job_counters.get()['job_id'])
+
+    spend_job_id = f'account_{SPEND_ALL_RESOURCES}'
+    reserve_driver(driver, spend_job_id, datetime.now(timezone.utc) + timedelta(seconds=0.5))
+    run_jobs([(f'account_{TRAIN_TROOPS}', job, [drivers_info, driver, 'Barracks', 'Clubswinger'], 0),
+              (spend_job_id, job, [drivers_info, driver], 0.5)])
+
+    assert order == [spend_job_id, f'account_{TRAIN_TROOPS}']
+
+
+def test_plain_jobs_run_on_the_blocking_pool(drivers):
+    driver = drivers[0]
+    drivers_info = {driver: {'Username': 'account'}}
+    threads = []
+
+    def blocking_job(drivers_info, driver):
+        threads.append(threading.current_thread().name)
+
+    run_jobs([(f'account_{REFRESH}', blocking_job, [drivers_info, driver], 0)])
+
+    assert threads[0].startswith(AsyncDriverQueueExecutor.thread_name_prefix)
+
@@ -0,0 +1,57 @@
+import threading
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import TravianAuto
+from TravianAuto import AccountRecord, DriverQueueExecutor, REFRESH, add_account
+
+
+class Driver:
+    pass
+
+
+class JobStore:
+    def load(self):
+        return {}
+
+
+def test_added_accounts_get_workers_of_their_own(monkeypatch):
+    monkeypatch.setattr(TravianAuto, 'start_account', lambda site, account: Driver())
+    monkeypatch.setattr(TravianAuto, 'load_village_states', lambda drivers_info: None)
+    monkeypatch.setattr(TravianAuto, 'check_gold_club_memberships', lambda drivers_info: None)
+    monkeypatch.setattr(TravianAuto, 'warm_start', lambda *args, **kwargs: None)
+    drivers_info = {Driver(): AccountRecord(username='account0'), Driver(): AccountRecord(username='account1')}
+    executor = DriverQueueExecutor(max_workers=len(drivers_info)) # sized the way the main block sizes it
+    scheduler = BackgroundScheduler(executors={'default': executor}, job_defaults={'misfire_grace_time': None})
+    scheduler.start(paused=True)
+    try:
+        for i in range(2, 4):
+            add_account(drivers_info, AccountRecord(username=f'account{i}'), scheduler, JobStore(), 'site')
+
+        # every account's job has to be running at once to get past the barrier, a pool left at the startup size
+        # would only ever have two of them in it
+        all_running = threading.Barrier(len(drivers_info), timeout=5)
+        done = threading.Semaphore(0)
+        errors = []
+
+        def job_done(event):
+            if event.exception is not None:
+                errors.append(event.exception)
+            done.release()
+
+        def job(drivers_info, driver, scheduler=None):
+            all_running.wait()
+
+        scheduler.add_listener(job_done, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        for driver, account in drivers_info.items():
+            scheduler.add_job(job, id=f'{account["Username"]}_{REFRESH}', args=[drivers_info, driver])
+        scheduler.resume()
+        for _ in drivers_info:
+            assert done.acquire(timeout=10)
+
+        assert not errors
+    finally:
+        scheduler.shutdown()
+        for driver in drivers_info:
+            TravianAuto.forget_driver(driver)
@@ -0,0 +1,45 @@
+import TravianAuto
+from TravianAuto import instrument_commands, refresh_page, reset_command_stats, top_call_sites
+
+
+class CommandExecutor:
+    def execute(self, command, params=None):
+        return {'value': None}
+
+
+class Driver:
+    def __init__(self):
+        self.command_executor = CommandExecutor()
+
+    def refresh(self):
+        self.command_executor.execute('refresh')
+
+
+def refresh(times):
+    driver = Driver()
+    instrument_commands(driver)
+    reset_command_stats()
+    for _ in range(times):
+        refresh_page({driver: {'Username': 'account'}}, driver)
+    TravianAuto.forget_driver(driver)
+
+
+def test_call_sites_are_off_by_default():
+    refresh(5)
+
+    assert top_call_sites() == []
+    assert TravianAuto.merged_command_stats('account')['refresh'].count == 5
+
+
+def test_call_sites_are_sampled(monkeypatch):
+    monkeypatch.setattr(TravianAuto, 'COMMAND_CALL_SITES', True)
+    monkeypatch.setattr(TravianAuto, 'CALL_SITE_SAMPLE_RATE', 10)
+    monkeypatch.setattr(TravianAuto, 'call_site_samples', iter(range(100)))
+
+    refresh(20)
+
+    (call_site, stats, commands), = top_call_sites()
+    assert call_site[0].startswith('refresh_page:')
+    assert stats.count == 2
+    assert commands == [('refresh', 2)]
+    reset_command_stats()
@@ -0,0 +1,102 @@
+import asyncio
+from urllib.parse import urljoin
+
+import pytest
+from apscheduler.util import obj_to_ref, ref_to_obj
+from selenium.common.exceptions import StaleElementReferenceException
+
+import TravianAuto
+from TravianAuto import (AccountRecord, RAIDS, RESOURCE_FIELDS, SPEND_ALL_RESOURCES, TRAIN_TROOPS, async_job_funcs,
+                         index_resource_fields, job_funcs, locator, lowest_first, parse_snapshot)
+
+USERNAME = 'jobs'
+
+
+@pytest.fixture(params=['threaded', 'async'])
+def funcs(request):
+    # every job is checked as thread mode runs it and as async mode awaits the same body
+    return job_funcs() if request.param == 'threaded' else async_job_funcs()
+
+
+@pytest.fixture
+def drivers_info(browser, fake_travian):
+    TravianAuto.driver_accounts[browser] = USERNAME
+    TravianAuto.attempt_login(urljoin(fake_travian.base_url, 'dorf1.php'), USERNAME, 'jobs', browser)
+    return {browser: AccountRecord(username=USERNAME, gold_club=True, troop_building='Barracks',
+                                   troop_name=fake_travian.config.troop_name)}
+
+
+def run(funcs, job_type, *args):
+    # one-shot, without a scheduler the job doesn't reschedule itself
+    result = funcs[job_type](*args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+
+
+def test_field_job_upgrades_the_lowest_field(funcs, drivers_info, fake_travian):
+    driver, = drivers_info
+    expected = lowest_first(index_resource_fields(parse_snapshot(fake_travian.layout(fake_travian.dorf1()))))
+
+    run(funcs, RESOURCE_FIELDS, drivers_info, driver)
+
+    assert fake_travian.upgraded == [expected.slot]
+
+
+def test_troop_job_trains_everything_affordable(funcs, drivers_info, fake_travian):
+    driver, = drivers_info
+
+    run(funcs, TRAIN_TROOPS, drivers_info, driver, 'Barracks', fake_travian.config.troop_name)
+
+    assert fake_travian.trained == [fake_travian.config.trainable]
+
+
+def test_troop_job_stops_when_the_troop_is_missing(funcs, drivers_info, fake_travian):
+    driver, = drivers_info
+
+    run(funcs, TRAIN_TROOPS, drivers_info, driver, 'Barracks', 'Nobody')
+
+    assert fake_travian.trained == []
+
+
+def test_both_modes_run_the_same_job_bodies():
+    async_funcs = async_job_funcs()
+    for job_type, func in job_funcs().items():
+        assert async_funcs[job_type] is func.run_async
+        assert ref_to_obj(obj_to_ref(func.run_async)) is func.run_async # job stores find it again by name
+
+
+def test_spend_job_trains_everything_affordable(funcs, drivers_info, fake_travian):
+    driver, = drivers_info
+
+    run(funcs, SPEND_ALL_RESOURCES, drivers_info, driver)
+
+    assert fake_travian.trained == [fake_travian.config.trainable]
+
+
+def test_raid_job_only_sends_rows_worth_raiding(funcs, drivers_info, fake_travian):
+    driver, = drivers_info
+    rows = {f'slot{list_index}_{row_index}': (name, row)
+            for list_index, (name, list_rows) in enumerate(fake_travian.farm_lists)
+            for row_index, row in enumerate(list_rows)}
+
+    run(funcs, RAIDS, drivers_info, driver)
+
+    assert len(fake_travian.raids) == len(fake_travian.farm_lists) # every list had something in range
+    for slot in [slot for sent in fake_travian.raids for slot in sent]:
+        name, row = rows[slot]
+        assert row['distance'] <= 7
+        assert not row['attacking']
+        if row['losses']: # only unoccupied oases get raided again after losses
+            assert name == 'Oases' and row['coordinates'] not in fake_travian.oases_with_troops
+
+
+def test_fake_driver_elements_go_stale_with_the_page(fake_browser, fake_travian):
+    fake_browser.get(urljoin(fake_travian.base_url, 'dorf1.php')) # not logged in, so the login page
+    name = fake_browser.find_element(*locator('login_username_input'))
+    name.send_keys(USERNAME)
+    assert name.get_attribute('value') == USERNAME
+
+    fake_browser.refresh()
+
+    with pytest.raises(StaleElementReferenceException): # jobs re-find elements after the page changes for this
+        name.get_attribute('value')
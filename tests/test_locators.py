@@ -0,0 +1,72 @@
+import pytest
+
+from TravianAuto import LOCATORS, benchmark_locators, is_relative_locator, locator, serve_stub_pages
+
+# page -> locators the saved copy of that page must match
+EXPECTED_MATCHES = {
+    '/login.php': ['login_username_input', 'login_password_input', 'login_button'],
+    '/dorf1.php': ['hero_status_icon', 'adventures_button', 'reports_button', 'daily_quests_button',
+                   'resource_field', 'building_queue_items', 'quest_master_button', 'reward_ready_icon'],
+    '/dorf2.php': ['wall_slot', 'building', 'buildings_button'],
+    '/hero/adventures': ['first_adventure_button', 'adventure_continue_button'],
+    '/hero/inventory': ['hero_inventory_button', 'hero_attributes_tab', 'hero_item'],
+    '/build.php?id=39&gid=16&tt=99': ['farm_lists_wrapper', 'farm_list_containers', 'farm_list'],
+    '/build.php?id=30&gid=19': ['troop_name_link', 'start_training_button'],
+}
+
+
+def test_no_positional_chains():
+    # one index into a list the game renders (the nth item, the first row) is fine, chains of them aren't
+    for name, entry in LOCATORS.items():
+        assert entry.value.count('nth-') <= 1, name
+
+
+def test_relative_locators_are_scoped():
+    for name in ('troop_amount_input', 'troop_max_trainable_link', 'farm_list_name', 'farm_list_start_button'):
+        assert is_relative_locator(name)
+
+
+def test_locator_params():
+    assert locator('resource_field', slot=14) == ('css selector', '#resourceFieldContainer a.buildingSlot14')
+    assert locator('farm_list', n=2)[1].endswith('.dropContainer:nth-child(2)')
+
+
+def test_locators_match_saved_pages(chrome, pages):
+    results = benchmark_locators(chrome, pages, repeat=1)
+
+    matches = {(result['page'], result['locator']): result['matches'] for result in results}
+    for page, names in EXPECTED_MATCHES.items():
+        for name in names:
+            assert matches[page, name] >= 1, (page, name)
+    assert matches['/dorf2.php', 'wall_slot'] == 1
+    assert matches['/build.php?id=39&gid=16&tt=99', 'farm_list_containers'] == 2
+
+
+def test_fake_driver_matches_saved_pages(fake_browser, pages):
+    # the fake's css/xpath engine has to find on the real pages what chrome finds
+    server, base_url = serve_stub_pages(pages)
+    try:
+        for page, names in EXPECTED_MATCHES.items():
+            fake_browser.get(base_url + page.lstrip('/'))
+            for name in names:
+                assert fake_browser.find_elements(*locator(name, **(LOCATORS[name].example or {}))), (page, name)
+        fake_browser.get(base_url + 'dorf2.php')
+        assert len(fake_browser.find_elements(*locator('wall_slot'))) == 1
+        fake_browser.get(base_url + 'build.php?id=39&gid=16&tt=99')
+        assert len(fake_browser.find_elements(*locator('farm_list_containers'))) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize('name', ['troop_amount_input', 'troop_max_trainable_link'])
+def test_troop_locators_inside_container(browser, pages, name):
+    server, base_url = serve_stub_pages(pages)
+    try:
+        browser.get(base_url + 'build.php?id=30&gid=19')
+        container = browser.find_element(*locator('troop_name_link', troop_name='Clubswinger')) \
+            .find_element(*locator('troop_container'))
+        assert container.find_element(*locator(name)).tag_name in ('input', 'a')
+    finally:
+        server.shutdown()
+        server.server_close()
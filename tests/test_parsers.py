@@ -0,0 +1,104 @@
+from TravianAuto import (CLAY, IRON, WHEAT, WOOD, FarmListRow, HeroStatus, IncomingAttack, ResourceField,
+                         TroopMovement, VillageResources, hero_return_seconds, index_resource_fields,
+                         parse_build_queue, parse_farm_lists, parse_hero_status, parse_incoming_attacks,
+                         parse_oasis_has_troops, parse_resource_fields, parse_training_queue, parse_troop_movements,
+                         parse_village_resources)
+
+FARM_LIST_PAGE = '/build.php?id=39&gid=16&tt=99'
+
+
+def test_resource_fields(snapshot_of):
+    fields = parse_resource_fields(snapshot_of('/dorf1.php'))
+
+    assert len(fields) == 18
+    assert fields[0] == ResourceField(position=2, slot=1, gid=WOOD, level=3, upgradable=False, under_construction=True)
+    assert fields[2] == ResourceField(position=4, slot=3, gid=WOOD, level=3, upgradable=True, under_construction=False)
+    assert [field.gid for field in fields] == [WOOD] * 4 + [CLAY] * 4 + [IRON] * 4 + [WHEAT] * 6
+    assert [field.slot for field in fields if field.upgradable] == [3, 5, 13, 14, 15]
+
+
+def test_field_index_groups_lowest_level_first(snapshot_of):
+    index = index_resource_fields(snapshot_of('/dorf1.php'))
+
+    assert [field.level for field in index.by_gid[CLAY]] == [2, 4, 4, 5]
+    assert index.by_gid[WHEAT][0].slot == 13
+    assert index.resources.stock[WOOD] == 12345
+
+
+def test_village_resources(snapshot_of):
+    assert parse_village_resources(snapshot_of('/dorf1.php')) == VillageResources(
+        stock={WOOD: 12345, CLAY: 23456, IRON: 34567, WHEAT: 4321},
+        capacity={WOOD: 80000, CLAY: 80000, IRON: 80000, WHEAT: 64000},
+        production={WOOD: 1120, CLAY: 1040, IRON: 960, WHEAT: -35},
+    )
+
+
+def test_village_resources_away_from_dorf1_have_no_production(snapshot_of):
+    resources = parse_village_resources(snapshot_of('/dorf2.php'))
+
+    assert resources.stock[WHEAT] == 4321
+    assert resources.production == {}
+
+
+def test_build_queue(snapshot_of):
+    assert parse_build_queue(snapshot_of('/dorf1.php')) == [1843]
+    assert parse_build_queue(snapshot_of('/dorf2.php')) == []
+
+
+def test_troop_movements(snapshot_of):
+    movements = parse_troop_movements(snapshot_of('/dorf1.php'))
+
+    assert movements == [
+        TroopMovement(direction='incoming', kind='att1', count=3, seconds_left=2781),
+        TroopMovement(direction='outgoing', kind='def2', count=1, seconds_left=412),
+        TroopMovement(direction='outgoing', kind='adventure', count=1, seconds_left=905),
+    ]
+    assert hero_return_seconds(movements) == 905
+
+
+def test_troop_movements_missing_table(snapshot_of):
+    assert parse_troop_movements(snapshot_of('/dorf2.php')) is None
+
+
+def test_incoming_attacks(snapshot_of):
+    # outgoing movements on the same page aren't attacks
+    assert parse_incoming_attacks(snapshot_of('/build.php?id=39&gid=16&tt=1')) == [
+        IncomingAttack('inAttack', 2781),
+        IncomingAttack('inRaid', 4248),
+        IncomingAttack('inAttack', 6300),
+    ]
+
+
+def test_hero_status(snapshot_of):
+    assert parse_hero_status(snapshot_of('/dorf1.php')) == HeroStatus(home=False, running=True, adventures=2,
+                                                                      level_up=True)
+    assert parse_hero_status(snapshot_of('/hero/inventory')) == HeroStatus(home=True, running=False, adventures=0,
+                                                                           level_up=False)
+
+
+def test_farm_lists(snapshot_of):
+    farm_lists = parse_farm_lists(snapshot_of(FARM_LIST_PAGE))
+
+    assert [(farm_list.index, farm_list.name) for farm_list in farm_lists] == [(0, 'Farms 1'), (1, 'Oases')]
+    farms, oases = farm_lists
+    assert (farms.troops_used, farms.troops_available) == (16, 120)
+    assert (oases.troops_used, oases.troops_available) == (0, 48)
+    assert len(farms.rows) == 5  # the "Add target" row isn't a target
+    assert farms.rows[1] == FarmListRow(row_index=2, checkbox_id='slot14_-1', attacking=True, distance=2.2, troops=5,
+                                        target_href='/karte.php?x=14&y=-1', last_raid_had_losses=False)
+    assert [row.last_raid_had_losses for row in farms.rows] == [False, False, True, False, False]
+    assert [row.distance for row in oases.rows] == [1.0, 4.1, 5.5]
+
+
+def test_farm_lists_missing(snapshot_of):
+    assert parse_farm_lists(snapshot_of('/dorf1.php')) == []
+
+
+def test_training_queue(snapshot_of):
+    assert parse_training_queue(snapshot_of('/build.php?id=30&gid=19')) == [610, 3605]
+
+
+def test_oasis_troops(snapshot_of):
+    assert parse_oasis_has_troops(snapshot_of('/karte.php?x=10&y=-2')) is True
+    assert parse_oasis_has_troops(snapshot_of('/karte.php?x=16&y=2')) is False
+    assert parse_oasis_has_troops(snapshot_of('/dorf1.php')) is None
@@ -0,0 +1,45 @@
+import numpy as np
+
+from TravianAuto import (CLAY, IRON, MAX_FIELD_LEVEL, WHEAT, WOOD, FIELD_COSTS, ResourceField, VillageResources,
+                         field_upgrade_frame, forget_driver, observe_snapshot, parse_snapshot,
+                         predict_affordable_seconds, print_upgrade_projection_report)
+
+
+class Driver:
+    pass
+
+
+def test_field_costs_follow_the_game_table():
+    assert tuple(FIELD_COSTS[WOOD, 1]) == (40, 100, 50, 60)
+    assert tuple(FIELD_COSTS[CLAY, 10]) == (8080, 4040, 8080, 5050)
+    assert tuple(FIELD_COSTS[IRON, 5]) == (780, 620, 235, 465)
+    assert tuple(FIELD_COSTS[WHEAT, MAX_FIELD_LEVEL]) == (1193195, 1534105, 1193195, 340915)
+    assert not FIELD_COSTS[0].any() and not FIELD_COSTS[:, 0].any()
+
+
+def test_affordable_seconds():
+    fields = [ResourceField(2, 1, WOOD, 4, False, False), # 310/780/390/465, clay is 280 short at 560/h
+              ResourceField(3, 13, WHEAT, 0, True, False), # 70/90/70/20, affordable now
+              ResourceField(4, 14, WHEAT, 9, False, False), # crop is falling, never affordable
+              ResourceField(5, 15, WHEAT, MAX_FIELD_LEVEL, False, False)]
+    resources = VillageResources(stock={WOOD: 1000, CLAY: 500, IRON: 1000, WHEAT: 1000},
+                                 capacity={WOOD: 8000, CLAY: 8000, IRON: 8000, WHEAT: 8000},
+                                 production={WOOD: 100, CLAY: 560, IRON: 100, WHEAT: -10})
+
+    seconds = predict_affordable_seconds(field_upgrade_frame({'alice': (fields, resources, 1000)}, now=1000))['seconds']
+
+    assert list(seconds[:2]) == [1800, 0]
+    assert np.isinf(seconds[2]) and np.isinf(seconds[3])
+
+
+def test_projection_report_from_village_state(pages):
+    driver = Driver()
+    try:
+        observe_snapshot(driver, parse_snapshot(pages['/dorf1.php']))
+        projection = print_upgrade_projection_report({driver: {'Username': 'alice'}})
+    finally:
+        forget_driver(driver)
+
+    assert len(projection) == 17 # the field under construction isn't projected
+    assert set(projection['account']) == {'alice'}
+    assert (projection['seconds'] == 0).all()
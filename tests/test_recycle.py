@@ -0,0 +1,45 @@
+from TravianAuto import JobDashboard, JobStateStore, replace_driver
+
+
+class Driver:
+    pass
+
+
+class Scheduler:
+    def get_jobs(self):
+        return []
+
+
+def test_replace_driver_keeps_account_order():
+    drivers = [Driver() for _ in range(4)]
+    drivers_info = {driver: {'Username': f'account{i}'} for i, driver in enumerate(drivers)}
+    new_driver = Driver()
+
+    replace_driver(drivers_info, drivers[1], new_driver, Scheduler())
+
+    assert list(drivers_info) == [drivers[0], new_driver, drivers[2], drivers[3]]
+    assert [account['Username'] for account in drivers_info.values()] == ['account0', 'account1', 'account2',
+                                                                          'account3']
+
+
+def test_replace_last_driver():
+    drivers = [Driver() for _ in range(2)]
+    drivers_info = {driver: {'Username': f'account{i}'} for i, driver in enumerate(drivers)}
+    new_driver = Driver()
+
+    replace_driver(drivers_info, drivers[1], new_driver, Scheduler())
+
+    assert list(drivers_info) == [drivers[0], new_driver]
+
+
+def test_dashboard_layout_survives_a_recycle():
+    drivers = [Driver() for _ in range(3)]
+    drivers_info = {driver: {'Username': f'account{i}'} for i, driver in enumerate(drivers)}
+    dashboard = JobDashboard(drivers_info, JobStateStore())
+    dashboard.update()
+
+    replace_driver(drivers_info, drivers[0], Driver(), Scheduler())
+    dashboard.update()
+
+    assert [child.name for child in dashboard.layout.children] == ['account0', 'account1', 'account2']
+    dashboard.close()
@@ -0,0 +1,75 @@
+import pytest
+
+from TravianAuto import (WHEAT, fetch_page_snapshot, forget_driver, parse_farm_lists, parse_hero_status,
+                         parse_incoming_attacks, parse_oasis_has_troops, parse_resource_fields, parse_training_queue,
+                         read_snapshot, serve_stub_pages, start_http_session, village_of)
+
+
+class StubDriver:
+    # just enough of a webdriver for the http read path, page_source is what the tab would show
+    def __init__(self, page_source=''):
+        self.page_source = page_source
+        self.navigations = 0
+
+    def execute_script(self, script, *args):
+        return 'Mozilla/5.0 (stub)'
+
+    def get_cookies(self):
+        return [{'name': 'sess_id', 'value': 'stub', 'domain': '127.0.0.1', 'path': '/'}]
+
+
+@pytest.fixture
+def stub_site(pages):
+    server, base_url = serve_stub_pages(pages)
+    driver = StubDriver()
+    start_http_session(driver, base_url)
+    yield driver
+    forget_driver(driver)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('path, check', [
+    ('/dorf1.php', lambda snapshot: len(parse_resource_fields(snapshot)) == 18),
+    ('/build.php?id=39&gid=16&tt=99', lambda snapshot: [farm_list.name for farm_list in parse_farm_lists(snapshot)]
+     == ['Farms 1', 'Oases']),
+    ('/build.php?id=39&gid=16&tt=1', lambda snapshot: len(parse_incoming_attacks(snapshot)) == 3),
+    ('/hero/inventory', lambda snapshot: parse_hero_status(snapshot).home),
+    ('/build.php?id=30&gid=19', lambda snapshot: parse_training_queue(snapshot) == [610, 3605]),
+    ('/karte.php?x=10&y=-2', lambda snapshot: parse_oasis_has_troops(snapshot) is True),
+])
+def test_snapshot_types_over_http(stub_site, path, check):
+    snapshot = fetch_page_snapshot(stub_site, path)
+
+    assert snapshot is not None
+    assert check(snapshot)
+
+
+def test_http_read_feeds_village_state(stub_site):
+    read_snapshot(stub_site, '/dorf1.php')
+
+    village = village_of(stub_site)
+    assert village.values['resources'].production[WHEAT] == -35
+    assert village.values['build_queue']
+
+
+def test_read_snapshot_falls_back_to_the_tab(stub_site, pages):
+    stub_site.page_source = pages['/dorf2.php']
+
+    def navigate(driver):
+        driver.navigations += 1
+
+    # not in the captured set, so the stub server answers 404
+    snapshot = read_snapshot(stub_site, '/build.php?id=26', navigate)
+
+    assert stub_site.navigations == 1
+    assert snapshot.find(id='villageContent') is not None
+
+
+def test_read_snapshot_without_session_uses_the_tab(pages):
+    driver = StubDriver(pages['/hero/inventory'])
+    try:
+        assert fetch_page_snapshot(driver, '/hero/inventory') is None
+        assert parse_hero_status(read_snapshot(driver, '/hero/inventory')).home
+    finally:
+        forget_driver(driver)
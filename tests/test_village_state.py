@@ -0,0 +1,46 @@
+import json
+import time
+
+import TravianAuto
+from TravianAuto import VillageStateSaver, forget_driver, load_village_states, village_of
+
+
+class Driver:
+    pass
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def saved(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def test_changes_are_saved_shortly_after_they_happen(tmp_path, monkeypatch):
+    monkeypatch.setattr(TravianAuto, 'VILLAGE_STATE_SAVE_DELAY', 0.05)
+    path = str(tmp_path / 'village_state.json')
+    driver = Driver()
+    drivers_info = {driver: {'Username': 'alice'}}
+    saver = VillageStateSaver(drivers_info, path)
+    saver.attach()
+    try:
+        village_of(driver).update('gold_club', True)
+        village_of(driver).update('build_queue', [])
+
+        # without anyone stopping the accounts, as after a crash or a killed shard
+        wait_for(lambda: 'alice' in saved(path))
+        forget_driver(driver)
+        load_village_states(drivers_info, path)
+        assert village_of(driver).current('gold_club') is True
+    finally:
+        saver.detach()
+        forget_driver(driver)
+